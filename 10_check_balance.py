@@ -1,6 +1,9 @@
+import vibetrader  # 先装好按需加载的 ccxt，只导入用到的交易所
 import ccxt
 import os
 from dotenv import load_dotenv
+from vibetrader.ratelimit import install_rate_limiter
+from vibetrader.markets_cache import load_markets_cached
 
 # 1. 加载保险箱
 load_dotenv()
@@ -17,12 +20,14 @@ def check_balance():
         try:
             print("🎒 正在连接 Backpack...")
             # 注意：这里我们把 keys 传给了 ccxt
-            backpack = ccxt.backpack({
+            backpack = install_rate_limiter(ccxt.backpack({
                 'apiKey': bp_key,
                 'secret': bp_secret,
                 'enableRateLimit': True,
-            })
+            }))
             
+            load_markets_cached(backpack)  # 市场信息读磁盘缓存，不用每次都下载
+
             # 核心指令：查询余额
             balance = backpack.fetch_balance()
             
@@ -47,12 +52,13 @@ def check_balance():
     if hl_private and "0x" in str(hl_address):
         try:
             print("💧 正在连接 Hyperliquid...")
-            hyperliquid = ccxt.hyperliquid({
+            hyperliquid = install_rate_limiter(ccxt.hyperliquid({
                 'walletAddress': hl_address,
                 'privateKey': hl_private,
                 'enableRateLimit': True,
-            })
+            }))
             
+            load_markets_cached(hyperliquid)
             balance = hyperliquid.fetch_balance()
             
             print("✅ Hyperliquid 连接成功！")
@@ -1,7 +1,10 @@
+import vibetrader  # 先装好按需加载的 ccxt，只导入用到的交易所
 import ccxt
 import os
+import sys
 import time
 from dotenv import load_dotenv
+from vibetrader.ordertracker import TERMINAL, OrderTracker, new_client_order_id
 
 load_dotenv()
 
@@ -9,21 +12,31 @@ print("👻 准备执行“幽灵挂单”测试...")
 print("------------------------------------------------")
 
 def test_order():
+    tracker = None
     # 1. 连接 Backpack
     bp_key = os.getenv("BP_API_KEY")
     bp_secret = os.getenv("BP_SECRET")
+    use_mock = "--mock" in sys.argv  # python 11_ghost_order.py --mock 离线演练
     
-    if not bp_key:
+    if not bp_key and not use_mock:
         print("❌ 请先在 .env 文件配置 Backpack API Key")
         return
 
     try:
-        exchange = ccxt.backpack({
-            'apiKey': bp_key,
-            'secret': bp_secret,
-            'enableRateLimit': True,
-        })
+        if use_mock:
+            from vibetrader.mockexchange import mock_exchanges
+            exchange = mock_exchanges()['bp']
+            print("🧪 使用本地模拟交易所 (不需要 API Key，不动真实资金)")
+        else:
+            exchange = ccxt.backpack({
+                'apiKey': bp_key,
+                'secret': bp_secret,
+                'enableRateLimit': True,
+            })
         
+        # 订阅私有推送 (订单状态)，挂单 / 撤单都等推送确认，不再靠 sleep 猜
+        tracker = OrderTracker.from_exchanges({'bp': exchange}).start()
+
         # 2. 获取当前价格
         symbol = 'BTC/USDC' # 确保 Backpack 有这个交易对
         ticker = exchange.fetch_ticker(symbol)
@@ -46,26 +59,38 @@ def test_order():
         
         # 4. 发送限价买单 (Limit Buy)
         print("\n🚀 正在发送测试指令...")
+        client_id = new_client_order_id('bp')
+        tracker.track('bp', client_id, symbol, 'buy', amount)
         order = exchange.create_order(
             symbol=symbol,
             type='limit',
             side='buy',
             amount=amount,
-            price=safe_price
+            price=safe_price,
+            params={'clientOrderId': client_id}
         )
+        tracker.bind('bp', client_id, order)
         
         order_id = order['id']
         print(f"✅ 挂单成功！收到交易所回执 Order ID: {order_id}")
         print("   (这证明您的 API Key 拥有完整的交易权限)")
         
-        # 5. 停留 3 秒给您看一眼
-        print("⏳ 等待 3 秒后自动撤单...")
-        time.sleep(3)
+        # 5. 等交易所推送确认挂单已经在盘口上 (以前是写死等 3 秒)
+        print("⏳ 等待交易所推送确认挂单...")
+        try:
+            tracked = tracker.wait('bp', client_id, states=('open',) + TERMINAL, timeout=5, require_push=True)
+            print(f"📨 推送确认: 订单状态 {tracked.state} (发出后 {(time.perf_counter_ns() - tracked.sent_ns) / 1e6:.0f}ms)")
+        except TimeoutError:
+            print("⚠️ 5 秒内没有收到订单推送 (私有频道可能没连上)，直接撤单")
         
-        # 6. 撤销订单
+        # 6. 撤销订单，等推送确认撤单完成
         print(f"🔙 正在撤销订单 {order_id}...")
         exchange.cancel_order(order_id, symbol)
-        print("✅ 撤单成功！测试结束，资金未变动。")
+        try:
+            tracked = tracker.wait('bp', client_id, timeout=5)
+            print(f"✅ 撤单成功 (推送确认 {tracked.state}，成交 {tracked.filled})！测试结束，资金未变动。")
+        except TimeoutError:
+            print("✅ 撤单请求已受理 (5 秒内没收到撤单推送，请在网页端核对)。测试结束。")
 
     except ccxt.InsufficientFunds:
         print("\n💰 [验证成功] 交易所提示“余额不足”。")
@@ -79,5 +104,9 @@ def test_order():
     except Exception as e:
         print(f"\n❌ 发生其他错误: {e}")
 
+    finally:
+        if tracker is not None:
+            tracker.stop()
+
 if __name__ == "__main__":
     test_order()
\ No newline at end of file
@@ -1,10 +1,13 @@
 import streamlit as st
+import vibetrader  # 先装好按需加载的 ccxt，只导入用到的交易所
 import ccxt
 import time
-import os
-import pandas as pd
+import concurrent.futures
 from datetime import datetime
 from dotenv import load_dotenv
+from vibetrader.exchanges import init_exchanges
+from vibetrader.pairing import SnapshotGuard, StaleSnapshotError, fetch_paired
+from vibetrader.hub import MarketDataHub
 
 # === 0. 加载安全配置 ===
 load_dotenv()
@@ -27,43 +30,31 @@ st.markdown("""
 
 # === 2. 交易所连接与初始化 ===
 @st.cache_resource
-def init_exchanges():
+def connect_exchanges():
     """
-    初始化交易所连接。
+    初始化交易所连接 (vibetrader.exchanges.init_exchanges，限速器和市场信息缓存都装好了)。
     如果 .env 里有私钥，就建立真实连接；否则只建立公共连接用于看行情。
     """
-    exchanges = {}
-    
-    # --- 连接 Backpack ---
-    bp_key = os.getenv("BP_API_KEY")
-    bp_secret = os.getenv("BP_SECRET")
-    if bp_key and bp_secret:
-        exchanges['bp'] = ccxt.backpack({
-            'apiKey': bp_key, 'secret': bp_secret, 'enableRateLimit': True
-        })
-        bp_status = "🟢 已连接 (实盘)"
-    else:
-        exchanges['bp'] = ccxt.backpack({'enableRateLimit': True})
-        bp_status = "🟡 仅行情 (未配置Key)"
-
-    # --- 连接 Hyperliquid ---
-    hl_address = os.getenv("HL_WALLET_ADDRESS")
-    hl_private = os.getenv("HL_PRIVATE_KEY")
-    if hl_private:
-        exchanges['hl'] = ccxt.hyperliquid({
-            'walletAddress': hl_address, 'privateKey': hl_private, 'enableRateLimit': True
-        })
-        hl_status = "🟢 已连接 (实盘)"
-    else:
-        exchanges['hl'] = ccxt.hyperliquid({'enableRateLimit': True})
-        hl_status = "🟡 仅行情 (未配置Key)"
-        
+    exchanges = init_exchanges()
+    bp_status = "🟢 已连接 (实盘)" if exchanges['bp'].apiKey else "🟡 仅行情 (未配置Key)"
+    hl_status = "🟢 已连接 (实盘)" if exchanges['hl'].privateKey else "🟡 仅行情 (未配置Key)"
     return exchanges, bp_status, hl_status
 
+@st.cache_resource
+def init_quote_pool():
+    """取行情用的常驻线程池：两边同时发请求"""
+    return concurrent.futures.ThreadPoolExecutor(max_workers=2)
+
+@st.cache_resource
+def init_hub(_exchanges):
+    """所有浏览器会话共享的行情中心：每个交易所只轮询一次，页面只读缓存"""
+    return MarketDataHub(_exchanges).start()
+
 # 初始化
-exchanges_dict, bp_status_text, hl_status_text = init_exchanges()
+exchanges_dict, bp_status_text, hl_status_text = connect_exchanges()
 backpack = exchanges_dict['bp']
 hyperliquid = exchanges_dict['hl']
+hub = init_hub(exchanges_dict)
 
 # === 3. Session State 状态管理 ===
 if 'log' not in st.session_state: st.session_state.log = []
@@ -191,16 +182,15 @@ if st.button("🛑 停止/刷新监控"):
 
 try:
     # A. 获取行情
-    # 注意：分别获取不同的 Symbol
-    ticker_bp = backpack.fetch_ticker(SYMBOL_BP) 
-    ticker_hl = hyperliquid.fetch_ticker(SYMBOL_HL)
+    # 注意：分别获取不同的 Symbol，从共享行情中心读缓存；太旧或时差太大的快照直接拒绝
+    snapshot = fetch_paired(init_quote_pool(), hub.client('bp'), SYMBOL_BP, hub.client('hl'), SYMBOL_HL)
+    SnapshotGuard(max_age_ms=1500, max_skew_ms=300).check(snapshot)
     
-    price_bp = ticker_bp['last']
-    price_hl = ticker_hl['last']
+    price_bp = snapshot.bp.last
+    price_hl = snapshot.hl.last
     
     # B. 计算价差
-    diff = price_bp - price_hl
-    diff_pct = (diff / price_bp) * 100
+    diff, diff_pct = snapshot.spread
     abs_diff_pct = abs(diff_pct)
     
     # C. 更新UI指标
@@ -242,6 +232,11 @@ try:
     time.sleep(2)
     st.rerun()
 
+except StaleSnapshotError as e:
+    st.warning(f"⏭️ 行情不同步，跳过本轮: {e}")
+    time.sleep(1)
+    st.rerun()
+
 except Exception as e:
     st.error(f"获取数据出错: {e}")
     if "Symbol" in str(e):
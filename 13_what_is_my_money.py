@@ -1,6 +1,9 @@
+import vibetrader  # 先装好按需加载的 ccxt，只导入用到的交易所
 import ccxt
 import os
 from dotenv import load_dotenv
+from vibetrader.ratelimit import install_rate_limiter
+from vibetrader.markets_cache import load_markets_cached
 
 load_dotenv()
 
@@ -8,12 +11,15 @@ print("🕵️‍♂️ 正在全网搜寻您的资产...")
 
 try:
     # 连接 Backpack
-    backpack = ccxt.backpack({
+    # 和正在运行的机器人共用限频额度，查余额不会把它挤到 429
+    backpack = install_rate_limiter(ccxt.backpack({
         'apiKey': os.getenv("BP_API_KEY"),
         'secret': os.getenv("BP_SECRET"),
         'enableRateLimit': True,
-    })
+    }))
     
+    load_markets_cached(backpack)  # 市场信息读磁盘缓存，不用每次都下载
+
     # 获取所有余额
     balance = backpack.fetch_balance()
     
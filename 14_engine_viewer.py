@@ -0,0 +1,51 @@
+import streamlit as st
+import os
+import time
+from vibetrader.state import StateStore
+
+# === 页面配置 ===
+# 这个页面只读：交易由无头引擎 (python -m vibetrader.engine) 负责，
+# 关掉浏览器也不会影响机器人运行。
+st.set_page_config(page_title="VibeTrader 引擎监控", layout="wide", page_icon="🧠")
+
+st.sidebar.header("🧠 引擎监控")
+DB_FILE = st.sidebar.text_input("引擎状态库", "bot_state_engine.db")
+REFRESH_SEC = st.sidebar.number_input("刷新间隔 (秒)", 1, 60, 2)
+
+st.title("🧠 VibeTrader 引擎监控 (只读)")
+
+if not os.path.exists(DB_FILE):
+    st.warning("还没有找到引擎状态库，请先运行: python -m vibetrader.engine")
+    st.stop()
+
+@st.cache_resource
+def open_store(db_file):
+    """每个状态库只开一个只读连接，页面每次刷新都复用它 (按路径缓存)"""
+    return StateStore(db_file, read_only=True)
+
+store = open_store(DB_FILE)
+
+try:
+    state = store.get_state()
+    status = store.get_status()
+
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Backpack", f"${status['price_bp']:,.2f}")
+    col2.metric("Hyperliquid", f"${status['price_hl']:,.2f}")
+    col3.metric("Spread %", f"{status['diff_pct']:.4f}%")
+    col4.metric("决策耗时", f"{status['cycle_ms']:.1f} ms", f"共 {status['ticks']} 轮", delta_color="off")
+
+    if state['status'] == "EMPTY":
+        st.markdown("### ⚪ 空仓待机")
+    else:
+        st.markdown(f"### 🔵 持仓中\n方向: {state['direction']} | 开仓价差: {state['entry_spread']:.4f}% | 数量: {state['amount']}")
+    st.caption(f"最近心跳: {status['updated_at'] or '--'}")
+
+    logs = store.recent_logs(50)
+    st.text_area("📜 引擎日志", "\n".join(f"[{ts}] {msg}" for ts, msg in logs), height=300)
+
+except Exception as e:
+    st.error(f"读取引擎状态出错: {e}")
+
+time.sleep(REFRESH_SEC)
+st.rerun()
@@ -1,6 +1,7 @@
 import ccxt
 import time
 from datetime import datetime
+from vibetrader.analytics import PnLTracker
 
 # === 策略参数设置 ===
 OPEN_THRESHOLD = 0.05   # 开仓阈值：价差超过 0.05% 就开仓
@@ -18,7 +19,9 @@ def paper_trade_bot():
     in_position = False     # 当前是否持仓？
     entry_price_bp = 0      # 记录 BackPack 开仓价
     entry_price_hl = 0      # 记录 Hyperliquid 开仓价
-    total_profit = 0        # 记录总盈利
+    position_qty = 0        # 每条腿的币数量
+    side_bp = None          # Backpack 这条腿的方向
+    tracker = PnLTracker()  # 按成交增量记账：已实现/未实现盈亏、胜率、回撤
     
     print("✅ 连接成功，等待机会中...")
     print("=====================================================")
@@ -56,9 +59,14 @@ def paper_trade_bot():
                     if price_bp > price_hl:
                         print(f"   👉 动作: 在 Backpack 卖出 (做空), 在 Hyperliquid 买入 (做多)")
                         direction = "Short BP / Long HL"
+                        side_bp = 'sell'
                     else:
                         print(f"   👉 动作: 在 Hyperliquid 卖出 (做空), 在 Backpack 买入 (做多)")
                         direction = "Long BP / Short HL"
+                        side_bp = 'buy'
+                    position_qty = TRADE_SIZE_USD / price_bp
+                    tracker.on_fill('bp', 'BTC/USDC', side_bp, position_qty, price_bp)
+                    tracker.on_fill('hl', 'BTC/USDC', 'buy' if side_bp == 'sell' else 'sell', position_qty, price_hl)
                         
                     in_position = True # 修改状态为“持仓中”
                     print(f"   🔒 锁定开仓价: BP=${entry_price_bp}, HL=${entry_price_hl}")
@@ -66,28 +74,23 @@ def paper_trade_bot():
 
             # [场景 B] 持仓状态 -> 寻找平仓机会
             elif in_position:
-                # 简单打印持仓盈亏
-                # 这里的盈亏计算简化了：实际上是 (卖出价 - 买入价)
-                # 但为了模拟，我们只看价差是否缩回去了
-                print(f"[{now}] 持仓中... 当前价差: {diff_percent:.4f}% (目标: < {CLOSE_THRESHOLD}%)")
+                # 用最新价格标记两条腿，打印浮动盈亏
+                tracker.mark('bp', 'BTC/USDC', price_bp)
+                tracker.mark('hl', 'BTC/USDC', price_hl)
+                print(f"[{now}] 持仓中... 当前价差: {diff_percent:.4f}% (目标: < {CLOSE_THRESHOLD}%) | 浮动盈亏: ${tracker.unrealized:.2f}")
                 
                 if diff_percent < CLOSE_THRESHOLD:
                     print(f"\n💰 [{now}] 触发平仓信号！价差回归 ({diff_percent:.4f}%)")
                     
-                    # 假装平仓
-                    exit_price_bp = price_bp
-                    exit_price_hl = price_hl
-                    
-                    # 计算这一单大概赚了多少 (简化算法：价差缩小的值 * 仓位)
-                    # 逻辑：开仓时价差是 X，平仓时价差是 Y。如果你做对了方向，收益约为 (X - Y)
-                    spread_captured = (abs(entry_price_bp - entry_price_hl) - abs(exit_price_bp - exit_price_hl))
-                    estimated_pnl = (spread_captured / price_bp) * TRADE_SIZE_USD
-                    
-                    total_profit += estimated_pnl
+                    # 假装平仓：两条腿反向成交，这一回合的盈亏由 tracker 结算
+                    close_bp = 'buy' if side_bp == 'sell' else 'sell'
+                    tracker.on_fill('bp', 'BTC/USDC', close_bp, position_qty, price_bp)
+                    tracker.on_fill('hl', 'BTC/USDC', side_bp, position_qty, price_hl)
+                    stats = tracker.snapshot()
                     
                     print(f"   ✅ 平仓成功！")
-                    print(f"   💵 本次预估盈利: ${estimated_pnl:.2f}")
-                    print(f"   🏆 累计总盈利:   ${total_profit:.2f}")
+                    print(f"   💵 本次盈利: ${stats['last_round_trip']:.2f}")
+                    print(f"   🏆 累计总盈利:   ${stats['net']:.2f} | 胜率 {stats['win_rate']:.0%} ({stats['round_trips']} 回合) | 最大回撤 ${stats['max_drawdown']:.2f}")
                     
                     in_position = False # 重置状态为“空仓”
                     print("   --- 等待下一轮机会 ---\n")
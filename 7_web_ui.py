@@ -1,7 +1,11 @@
 import streamlit as st
+import vibetrader  # 先装好按需加载的 ccxt，只导入用到的交易所
 import ccxt
 import time
 from datetime import datetime
+from vibetrader.hub import MarketDataHub
+from vibetrader.ratelimit import install_rate_limiter
+from vibetrader.timeseries import RingBuffer
 
 # === 网页基本配置 ===
 st.set_page_config(
@@ -17,10 +21,17 @@ st.markdown("---") # 分割线
 # === 初始化连接 (使用缓存，避免每次刷新都重连) ===
 @st.cache_resource
 def init_exchanges():
-    return ccxt.backpack(), ccxt.hyperliquid()
+    return install_rate_limiter(ccxt.backpack()), install_rate_limiter(ccxt.hyperliquid())
 
 backpack, hyperliquid = init_exchanges()
 
+@st.cache_resource
+def init_hub():
+    """所有浏览器标签页共享一个行情中心：每个交易所只轮询一次，页面只读缓存"""
+    return MarketDataHub({'bp': backpack, 'hl': hyperliquid}).start()
+
+hub = init_hub()
+
 # === 创建占位符 (用于动态刷新内容) ===
 # 这一步很关键，我们在网页上挖几个坑，稍后不断往里填新数据
 metrics_container = st.empty()
@@ -29,14 +40,14 @@ log_container = st.container()
 
 # === 主循环逻辑 ===
 def run_dashboard():
-    # 创建两个空列表，用于记录历史价差，画图用
-    spread_history = []
+    # 定长环形缓冲区记录历史价差，画图用 (3 秒一个点，能存 3 天)
+    spread_history = RingBuffer(86_400)
     
     while True:
         try:
             # 1. 获取数据
-            ticker_bp = backpack.fetch_ticker('BTC/USDC')
-            ticker_hl = hyperliquid.fetch_ticker('BTC/USDC')
+            ticker_bp = hub.fetch_ticker('bp', 'BTC/USDC')
+            ticker_hl = hub.fetch_ticker('hl', 'BTC/USDC')
             
             price_bp = ticker_bp['last']
             price_hl = ticker_hl['last']
@@ -45,10 +56,8 @@ def run_dashboard():
             diff = price_bp - price_hl
             diff_percent = (diff / price_bp) * 100
             
-            # 记录数据用于画图 (只保留最近 50 次)
-            spread_history.append(diff)
-            if len(spread_history) > 50:
-                spread_history.pop(0)
+            # 记录数据用于画图 (O(1) 追加，满了自动覆盖最旧的点)
+            spread_history.append(time.time() * 1000, diff)
 
             # 3. 更新界面内容
             with metrics_container.container():
@@ -80,7 +89,9 @@ def run_dashboard():
             # 4. 更新简单的折线图
             with chart_container.container():
                 st.write("### 📊 价差波动走势 (USD)")
-                st.line_chart(spread_history)
+                # 按图表宽度降采样 (LTTB)，点再多渲染也和 50 个点一样快
+                _, chart_values = spread_history.downsample(800)
+                st.line_chart(chart_values)
 
             # 5. 休息一下
             time.sleep(3)
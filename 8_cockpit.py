@@ -1,8 +1,12 @@
 import streamlit as st
+import vibetrader  # 先装好按需加载的 ccxt，只导入用到的交易所
 import ccxt
 import time
-import pandas as pd # 用于处理表格数据
 from datetime import datetime
+from vibetrader.hub import MarketDataHub
+from vibetrader.ratelimit import install_rate_limiter
+from vibetrader.timeseries import RingBuffer
+from vibetrader.analytics import PnLTracker
 
 # === 页面配置 ===
 st.set_page_config(page_title="自动化套利驾驶舱", layout="wide", page_icon="🛸")
@@ -10,10 +14,17 @@ st.set_page_config(page_title="自动化套利驾驶舱", layout="wide", page_ic
 # === 1. 初始化交易所 (缓存) ===
 @st.cache_resource
 def init_exchanges():
-    return ccxt.backpack(), ccxt.hyperliquid()
+    return install_rate_limiter(ccxt.backpack()), install_rate_limiter(ccxt.hyperliquid())
 
 backpack, hyperliquid = init_exchanges()
 
+@st.cache_resource
+def init_hub():
+    """所有浏览器标签页共享一个行情中心：每个交易所只轮询一次，页面只读缓存"""
+    return MarketDataHub({'bp': backpack, 'hl': hyperliquid}).start()
+
+hub = init_hub()
+
 # === 2. 初始化机器人的记忆 (Session State) ===
 if 'balance' not in st.session_state:
     st.session_state.balance = 10000.0  # 初始资金 $10,000
@@ -23,6 +34,10 @@ if 'position_info' not in st.session_state:
     st.session_state.position_info = {} # 持仓详情
 if 'trade_history' not in st.session_state:
     st.session_state.trade_history = [] # 交易记录
+if 'equity_curve' not in st.session_state:
+    st.session_state.equity_curve = RingBuffer(172_800) # 资金曲线 (2 秒一个点，能存 4 天)
+if 'pnl' not in st.session_state:
+    st.session_state.pnl = PnLTracker() # 按成交增量记账的盈亏统计
 
 # === 侧边栏：策略控制台 ===
 st.sidebar.title("🎮 策略参数控制")
@@ -35,6 +50,8 @@ st.sidebar.markdown("---")
 if st.sidebar.button("🔴 重置模拟账户"):
     st.session_state.balance = 10000.0
     st.session_state.trade_history = []
+    st.session_state.equity_curve = RingBuffer(172_800)
+    st.session_state.pnl = PnLTracker()
     st.session_state.in_position = False
     st.experimental_rerun()
 
@@ -52,6 +69,7 @@ metric_pnl = col4.empty()
 # Row 2: 当前持仓状态
 st.markdown("### 🏦 当前持仓 (Current Position)")
 position_container = st.empty()
+stats_place = st.empty()
 
 # Row 3: 历史记录 & 图表
 col_chart, col_log = st.columns([2, 1])
@@ -73,8 +91,8 @@ def run_strategy():
     while True:
         try:
             # --- A. 获取数据 ---
-            tick_bp = backpack.fetch_ticker('BTC/USDC')
-            tick_hl = hyperliquid.fetch_ticker('BTC/USDC')
+            tick_bp = hub.fetch_ticker('bp', 'BTC/USDC')
+            tick_hl = hub.fetch_ticker('hl', 'BTC/USDC')
             
             p_bp = tick_bp['last']
             p_hl = tick_hl['last']
@@ -85,19 +103,28 @@ def run_strategy():
             now_str = datetime.now().strftime("%H:%M:%S")
 
             # --- B. 策略判定 (Brain) ---
+            pnl_tracker = st.session_state.pnl
+            pnl_tracker.mark('bp', 'BTC/USDC', p_bp)
+            pnl_tracker.mark('hl', 'BTC/USDC', p_hl)
             
             # 1. 开仓逻辑
             if not st.session_state.in_position:
                 if diff_pct > OPEN_THRESHOLD:
-                    # 记录开仓
+                    # 记录开仓：两腿按当前价格模拟成交，交给 PnLTracker 记账
                     st.session_state.in_position = True
                     direction = "做空BP / 做多HL" if diff > 0 else "做空HL / 做多BP"
+                    qty = TRADE_SIZE / p_bp
+                    side_bp = 'sell' if diff > 0 else 'buy'
+                    pnl_tracker.on_fill('bp', 'BTC/USDC', side_bp, qty, p_bp)
+                    pnl_tracker.on_fill('hl', 'BTC/USDC', 'buy' if side_bp == 'sell' else 'sell', qty, p_hl)
                     st.session_state.position_info = {
                         "time": now_str,
                         "entry_bp": p_bp,
                         "entry_hl": p_hl,
                         "direction": direction,
-                        "size": TRADE_SIZE
+                        "size": TRADE_SIZE,
+                        "qty": qty,
+                        "side_bp": side_bp,
                     }
                     # 写入一条日志
                     st.toast(f"⚡ 触发开仓！{direction}", icon="🚀")
@@ -105,17 +132,15 @@ def run_strategy():
             # 2. 平仓逻辑
             elif st.session_state.in_position:
                 entry = st.session_state.position_info
-                # 计算浮动盈亏 (简化算法)
-                # 利润 ≈ (开仓价差 - 当前价差) * 仓位 / 价格
-                open_spread = abs(entry['entry_bp'] - entry['entry_hl'])
-                current_spread = abs(diff)
-                profit = ((open_spread - current_spread) / p_bp) * TRADE_SIZE
-                
-                # 更新持仓显示的盈亏
-                st.session_state.position_info['floating_pnl'] = profit
+                # 浮动盈亏 = 两腿按最新价格标记后的未实现盈亏
+                st.session_state.position_info['floating_pnl'] = pnl_tracker.unrealized
 
                 if diff_pct < CLOSE_THRESHOLD:
-                    # 执行平仓
+                    # 执行平仓：两腿反向成交，这一回合的盈亏由 PnLTracker 结算
+                    side_bp = 'buy' if entry['side_bp'] == 'sell' else 'sell'
+                    pnl_tracker.on_fill('bp', 'BTC/USDC', side_bp, entry['qty'], p_bp)
+                    pnl_tracker.on_fill('hl', 'BTC/USDC', 'buy' if side_bp == 'sell' else 'sell', entry['qty'], p_hl)
+                    profit = pnl_tracker.last_round_trip
                     st.session_state.balance += profit
                     st.session_state.in_position = False
                     
@@ -153,11 +178,23 @@ def run_strategy():
                 )
             else:
                 position_container.info("💤 当前空仓，正在扫描市场机会...")
+            stats = pnl_tracker.snapshot()
+            stats_place.caption(
+                f"已实现 ${stats['realized']:.2f} | 未实现 ${stats['unrealized']:.2f} | 手续费 ${stats['fees']:.2f} | "
+                f"回合 {stats['round_trips']} | 胜率 {stats['win_rate']:.0%} | 最大回撤 ${stats['max_drawdown']:.2f} | "
+                f"敞口 ${stats['exposure']:,.0f}"
+            )
 
             # 3. 更新图表和日志
+            equity = st.session_state.balance + pnl_tracker.unrealized  # 空仓时未实现盈亏为 0
+            st.session_state.equity_curve.append(time.time() * 1000, equity)
+            _, equity_values = st.session_state.equity_curve.downsample(600)  # 按图表宽度降采样
+            chart_place.line_chart(equity_values)
+
             if len(st.session_state.trade_history) > 0:
-                df = pd.DataFrame(st.session_state.trade_history)
-                log_place.dataframe(df.iloc[::-1].head(10), height=200) # 显示最近10条
+                import pandas as pd  # 用于处理表格数据，有成交记录时才加载
+                df = pd.DataFrame(st.session_state.trade_history[-10:][::-1])  # 只取最近10条，不用整表重建
+                log_place.dataframe(df, height=200)
             
             # 4. 休息
             time.sleep(2)
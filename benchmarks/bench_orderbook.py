@@ -0,0 +1,83 @@
+"""
+L2 盘口增量更新的微基准
+
+    python benchmarks/bench_orderbook.py --messages 200000
+
+用随机游走的中间价生成 Backpack 格式的增量 (每条 1~6 档变更，约 25% 为删除)，
+统计单本盘口每秒能应用多少档变更、多少条消息，以及最优价 / 累计深度 / VWAP 的读取耗时。
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from vibetrader.orderbook import L2Book  # noqa: E402
+
+
+def make_messages(count, levels=200, tick=0.1, seed=0):
+    rng = np.random.default_rng(seed)
+    mid = 90_000.0
+    messages = []
+    seq = 1
+    for _ in range(count):
+        mid += rng.normal(0, tick)
+        n = int(rng.integers(1, 7))
+        bids, asks = [], []
+        for _ in range(n):
+            offset = int(rng.geometric(0.08))   # 越靠近盘口越频繁
+            size = 0.0 if rng.random() < 0.25 else round(float(rng.exponential(0.5)), 4)
+            if rng.random() < 0.5:
+                bids.append((round(mid - offset * tick, 1), size))
+            else:
+                asks.append((round(mid + offset * tick, 1), size))
+        messages.append({"U": seq, "u": seq + n - 1, "b": bids, "a": asks, "T": seq * 1000})
+        seq += n
+    snapshot = {
+        "bids": [(round(mid - i * tick, 1), 1.0) for i in range(1, levels)],
+        "asks": [(round(mid + i * tick, 1), 1.0) for i in range(1, levels)],
+        "nonce": 0,
+    }
+    return snapshot, messages
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="L2 盘口增量更新微基准")
+    parser.add_argument("--messages", type=int, default=200_000)
+    args = parser.parse_args(argv)
+
+    snapshot, messages = make_messages(args.messages)
+    book = L2Book("bp", "BTC/USDC")
+    book.apply_snapshot(snapshot["bids"], snapshot["asks"], snapshot["nonce"])
+
+    started = time.perf_counter()
+    for data in messages:
+        book.on_backpack_depth(data)
+    elapsed = time.perf_counter() - started
+    print(f"📈 {len(messages):,} 条增量 / {book.updates:,} 档变更，用时 {elapsed:.2f} 秒")
+    print(f"   {book.updates / elapsed:,.0f} 档/秒 | {len(messages) / elapsed:,.0f} 条/秒 | "
+          f"盘口 {len(book.bids)} 买档 / {len(book.asks)} 卖档 | 缺口 {book.gaps}")
+
+    reads = 100_000
+    started = time.perf_counter()
+    for _ in range(reads):
+        book.best_bid()
+        book.best_ask()
+    print(f"   最优价读取 {(time.perf_counter() - started) / reads * 1e9:,.0f} ns/次")
+
+    started = time.perf_counter()
+    for _ in range(reads):
+        book.bids.depth(10)
+    print(f"   前 10 档累计深度 {(time.perf_counter() - started) / reads * 1e9:,.0f} ns/次 (缓存命中)")
+
+    started = time.perf_counter()
+    for _ in range(10_000):
+        book.vwap_buy(1.0)
+    print(f"   VWAP(1 BTC) {(time.perf_counter() - started) / 10_000 * 1e6:,.1f} µs/次")
+
+
+if __name__ == "__main__":
+    main()
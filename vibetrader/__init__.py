@@ -0,0 +1,14 @@
+"""
+VibeTrader 核心包
+
+把原来散落在各个 Streamlit 脚本里的交易逻辑 (交易所连接、价差信号、
+双边下单、状态持久化) 收拢到一起，供无头引擎 `python -m vibetrader.engine`
+和各个看板页面共用。
+"""
+
+__version__ = "0.1.0"
+
+# 先把 ccxt 换成按需加载的版本：只导入用到的交易所模块 (见 lazy_ccxt.py)
+from .lazy_ccxt import install as _install_lazy_ccxt
+
+_install_lazy_ccxt()
@@ -0,0 +1,202 @@
+"""
+增量 PnL / 交易统计
+
+6_paper_trading.py 和 8_cockpit.py 的盈亏是 session_state 里东拼西凑的字典，
+日志表每个 tick 都用 pd.DataFrame(trade_history) 整表重建，跑得越久越慢。
+
+PnLTracker 把每一笔成交当作事件消费，每个事件 O(1) 更新：
+
+- 每个 (交易所, 交易对) 一个持仓，按平均成本记账，减仓/反手时结算已实现盈亏；
+- 未实现盈亏和总敞口 (名义价值) 按单个持仓的变化量增减，不用每次遍历所有持仓；
+- 所有持仓回到 0 算一个回合 (开仓 + 平仓)，统计胜率；
+- 权益 = 已实现 + 未实现 - 手续费，跟踪最高点和最大回撤；
+- 按 rollup_interval 秒分桶汇总 (已实现、手续费、成交笔数、成交额、期末权益)，只保留最近 rollup_keep 个桶。
+
+    tracker = PnLTracker()
+    tracker.on_fill('bp', 'BTC/USDC', 'sell', 0.01, 90010.0, fee=0.36)
+    tracker.on_fill('hl', 'BTC/USDC', 'buy', 0.01, 90000.0, fee=0.36)
+    tracker.mark('bp', 'BTC/USDC', 89995.0)
+    tracker.snapshot()['net']
+"""
+import time
+from collections import deque
+from dataclasses import dataclass
+
+EPS = 1e-12
+
+
+@dataclass
+class Position:
+    qty: float = 0.0          # 带符号：多头为正
+    avg_price: float = 0.0
+    mark: float = 0.0
+
+    @property
+    def unrealized(self):
+        return self.qty * (self.mark - self.avg_price) if self.qty else 0.0
+
+    @property
+    def notional(self):
+        return abs(self.qty) * self.mark
+
+
+class PnLTracker:
+    def __init__(self, fee_bps=0.0, rollup_interval=3600, rollup_keep=24 * 14):
+        """
+        fee_bps: on_fill 没给 fee 时按成交额的万分之几估算手续费
+        """
+        self.fee_bps = fee_bps
+        self.rollup_interval = rollup_interval
+        self.positions = {}
+        self.realized = 0.0
+        self.unrealized = 0.0
+        self.fees = 0.0
+        self.exposure = 0.0       # 所有持仓的名义价值之和
+        self.volume = 0.0
+        self.fills = 0
+        self.round_trips = 0
+        self.wins = 0
+        self.last_round_trip = None
+        self.peak = 0.0
+        self.max_drawdown = 0.0
+        self.time_in_position = 0.0
+        self._open = 0            # 非零持仓个数
+        self._cycle_start = 0.0   # 本回合开始时的 realized - fees
+        self._last_ts = None
+        self._rollups = deque(maxlen=rollup_keep)
+
+    # --- 事件 ---
+    def on_fill(self, venue, symbol, side, amount, price, fee=None, ts=None):
+        """一笔成交，返回这笔成交结算出的已实现盈亏"""
+        amount = float(amount)
+        if abs(amount) <= EPS:
+            return 0.0   # 没成交的 IOC、被拒的腿：不是成交，而且空仓时下面算平均成本会除以 0
+        ts = time.time() if ts is None else ts
+        self._advance(ts)
+        price = float(price)
+        fee = amount * price * self.fee_bps / 10000 if fee is None else float(fee)
+        position = self.positions.setdefault((venue, symbol), Position(mark=price))
+        self._remove(position)
+
+        signed = amount if side == 'buy' else -amount
+        realized = 0.0
+        was_open = abs(position.qty) > EPS
+        if position.qty * signed < 0:
+            # 减仓 (可能反手)：平掉的部分按平均成本结算
+            closed = min(abs(signed), abs(position.qty))
+            realized = closed * (price - position.avg_price) * (1 if position.qty > 0 else -1)
+            position.qty += signed
+            if abs(position.qty) <= EPS:
+                position.qty = 0.0
+                position.avg_price = 0.0
+            elif position.qty * signed > 0:
+                position.avg_price = price   # 反手后剩下的是新方向的仓位
+        else:
+            total = position.qty + signed
+            position.avg_price = (position.qty * position.avg_price + signed * price) / total
+            position.qty = total
+        position.mark = price
+        self._add(position)
+
+        self._open += (abs(position.qty) > EPS) - was_open
+        self.realized += realized
+        self.fees += fee
+        self.volume += amount * price
+        self.fills += 1
+        if self._open == 0:
+            self._finish_round_trip()
+        self._update_equity(ts, realized, fee, amount * price)
+        return realized
+
+    def on_order(self, venue, order, ts=None):
+        """直接消费 ccxt 的订单回报 (用 filled / average，手续费取 order['fee'])；没有 filled 字段才按 amount 算"""
+        filled = order.get('filled')
+        if filled is None:
+            filled = order.get('amount') or 0
+        price = order.get('average') or order.get('price')
+        if not filled or not price:
+            return 0.0
+        fee = (order.get('fee') or {}).get('cost')
+        ts = ts if ts is not None else (order['timestamp'] / 1000 if order.get('timestamp') else None)
+        return self.on_fill(venue, order['symbol'], order['side'], filled, price, fee, ts)
+
+    def mark(self, venue, symbol, price, ts=None):
+        """更新标记价格 (未实现盈亏跟着变)"""
+        position = self.positions.get((venue, symbol))
+        ts = time.time() if ts is None else ts
+        self._advance(ts)
+        if position is None:
+            return
+        self._remove(position)
+        position.mark = float(price)
+        self._add(position)
+        self._update_equity(ts)
+
+    # --- 内部 ---
+    def _remove(self, position):
+        self.unrealized -= position.unrealized
+        self.exposure -= position.notional
+
+    def _add(self, position):
+        self.unrealized += position.unrealized
+        self.exposure += position.notional
+
+    def _advance(self, ts):
+        if self._last_ts is not None and self._open and ts > self._last_ts:
+            self.time_in_position += ts - self._last_ts
+        self._last_ts = ts if self._last_ts is None else max(self._last_ts, ts)
+
+    def _finish_round_trip(self):
+        closed = self.realized - self.fees
+        pnl = closed - self._cycle_start
+        self._cycle_start = closed
+        self.round_trips += 1
+        self.wins += pnl > 0
+        self.last_round_trip = pnl
+        # 平仓后残留的浮点误差清零
+        self.unrealized = 0.0
+        self.exposure = 0.0
+
+    @property
+    def equity(self):
+        return self.realized + self.unrealized - self.fees
+
+    def _update_equity(self, ts, realized=0.0, fee=0.0, volume=0.0):
+        equity = self.equity
+        self.peak = max(self.peak, equity)
+        self.max_drawdown = max(self.max_drawdown, self.peak - equity)
+        start = ts - ts % self.rollup_interval
+        if not self._rollups or self._rollups[-1]['start'] != start:
+            self._rollups.append({'start': start, 'realized': 0.0, 'fees': 0.0, 'fills': 0, 'volume': 0.0,
+                                  'equity': equity})
+        bucket = self._rollups[-1]
+        bucket['realized'] += realized
+        bucket['fees'] += fee
+        bucket['fills'] += 1 if volume else 0
+        bucket['volume'] += volume
+        bucket['equity'] = equity
+
+    # --- 读取 ---
+    def snapshot(self):
+        """当前的汇总数字 (都是现成的累加值，O(1))"""
+        return {
+            'realized': self.realized,
+            'unrealized': self.unrealized,
+            'fees': self.fees,
+            'net': self.equity,
+            'exposure': self.exposure,
+            'volume': self.volume,
+            'fills': self.fills,
+            'round_trips': self.round_trips,
+            'win_rate': self.wins / self.round_trips if self.round_trips else 0.0,
+            'last_round_trip': self.last_round_trip,
+            'drawdown': self.peak - self.equity,
+            'max_drawdown': self.max_drawdown,
+            'time_in_position': self.time_in_position,
+            'in_position': self._open > 0,
+        }
+
+    def rollups(self, last=None):
+        """按时间分桶的汇总，从旧到新；last 只取最近几个桶"""
+        buckets = list(self._rollups)
+        return buckets[-last:] if last else buckets
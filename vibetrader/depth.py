@@ -0,0 +1,126 @@
+"""
+按盘口深度计算的可成交价差
+
+所有价差都是拿 ticker['last'] 算的，但 execute_dual_trade 发的是市价单，会吃穿盘口。
+下单量稍大一点，“看到的价差”和“拿到的价差”就是两个数。这里用两边的 L2 盘口
+(NumPy 数组，每行 [价格, 数量]) 算出给定数量的 VWAP 成交价，再算两个方向真正能成交的价差：
+
+    Short_BP_Long_HL: 在 BP 卖 (吃 bids)、在 HL 买 (吃 asks)
+    Long_BP_Short_HL: 在 BP 买 (吃 asks)、在 HL 卖 (吃 bids)
+
+百分比的口径与 strategy.compute_spread 相同：(p_bp - p_hl) / p_bp * 100，
+所以可以直接喂给 strategy.decide，阈值的含义不变。
+"""
+from dataclasses import dataclass
+
+import numpy as np
+
+from .strategy import SHORT_BP_LONG_HL
+
+NAN = float("nan")
+
+
+def levels_array(levels, limit=None):
+    """ccxt 的 [[price, size, ...], ...] -> (n, 2) float64 数组"""
+    if limit:
+        levels = levels[:limit]
+    if not len(levels):
+        return np.empty((0, 2))
+    return np.array([level[:2] for level in levels], dtype=np.float64)
+
+
+@dataclass
+class DepthBook:
+    venue: str
+    symbol: str
+    bids: np.ndarray      # (n, 2)，价格从高到低
+    asks: np.ndarray      # (n, 2)，价格从低到高
+    timestamp: float = None
+    recv_ms: float = None
+
+    @classmethod
+    def from_ccxt(cls, venue, symbol, order_book, limit=None):
+        return cls(venue, symbol, levels_array(order_book['bids'], limit), levels_array(order_book['asks'], limit),
+                   order_book.get('timestamp'), order_book.get('recv_ms'))
+
+    def ticker(self):
+        """盘口顶端转成 ticker 结构，'last' 用中间价 (与 marketdata.book_to_ticker 一致)"""
+        bid = float(self.bids[0, 0]) if len(self.bids) else None
+        ask = float(self.asks[0, 0]) if len(self.asks) else None
+        last = (bid + ask) / 2 if bid is not None and ask is not None else (bid if bid is not None else ask)
+        ticker = {'symbol': self.symbol, 'timestamp': self.timestamp, 'bid': bid, 'ask': ask, 'last': last,
+                  'bidVolume': float(self.bids[0, 1]) if len(self.bids) else None,
+                  'askVolume': float(self.asks[0, 1]) if len(self.asks) else None}
+        if self.recv_ms is not None:
+            ticker['recv_ms'] = self.recv_ms
+        return ticker
+
+    def vwap_buy(self, amount):
+        return vwap(self.asks, amount)
+
+    def vwap_sell(self, amount):
+        return vwap(self.bids, amount)
+
+
+def vwap(levels, amount):
+    """
+    吃掉 amount 数量的平均成交价，一次 O(档位数) 的累加。
+    返回 (均价, 可成交数量)；盘口不够深时可成交数量 < amount。
+    """
+    if not len(levels) or amount <= 0:
+        return NAN, 0.0
+    prices, sizes = levels[:, 0], levels[:, 1]
+    cum = np.cumsum(sizes)
+    k = int(np.searchsorted(cum, amount))   # 第一个累计量 >= amount 的档位
+    if k >= len(levels):
+        filled = float(cum[-1])
+        return float(np.dot(prices, sizes)) / filled, filled
+    before = float(cum[k - 1]) if k else 0.0
+    cost = float(np.dot(prices[:k], sizes[:k])) + (amount - before) * float(prices[k])
+    return cost / amount, float(amount)
+
+
+@dataclass
+class ExecutableSpread:
+    amount: float
+    sell_bp: float        # BP 卖出 amount 的 VWAP (吃 bids)
+    buy_bp: float         # BP 买入 amount 的 VWAP (吃 asks)
+    sell_hl: float
+    buy_hl: float
+    complete: bool        # 四个方向的深度是否都够 amount
+
+    @property
+    def short_bp_pct(self):
+        """Short_BP_Long_HL 能成交的价差 (%)，> 0 才有利可图"""
+        return (self.sell_bp - self.buy_hl) / self.sell_bp * 100
+
+    @property
+    def long_bp_pct(self):
+        """Long_BP_Short_HL 能成交的价差 (%)，< 0 才有利可图"""
+        return (self.buy_bp - self.sell_hl) / self.buy_bp * 100
+
+    def decision_pct(self, status, direction):
+        """
+        给 strategy.decide 用的 diff_pct：
+        空仓时取两个方向里有正收益的那个 (都没有就返回 0，不会触发开仓)；
+        持仓时取平仓那笔反向交易真正能成交的价差。
+        深度不够时返回 NaN，任何阈值比较都不成立，本轮不做动作。
+        """
+        if not self.complete:
+            return NAN
+        if status == "HOLDING":
+            # 平 Short_BP 要在 BP 买、HL 卖，反之亦然
+            return self.long_bp_pct if direction == SHORT_BP_LONG_HL else self.short_bp_pct
+        if self.short_bp_pct > 0:
+            return self.short_bp_pct
+        if self.long_bp_pct < 0:
+            return self.long_bp_pct
+        return 0.0
+
+
+def executable_spread(book_bp, book_hl, amount):
+    sell_bp, q1 = book_bp.vwap_sell(amount)
+    buy_bp, q2 = book_bp.vwap_buy(amount)
+    sell_hl, q3 = book_hl.vwap_sell(amount)
+    buy_hl, q4 = book_hl.vwap_buy(amount)
+    return ExecutableSpread(amount, sell_bp, buy_bp, sell_hl, buy_hl, min(q1, q2, q3, q4) >= amount)
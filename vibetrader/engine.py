@@ -0,0 +1,230 @@
+"""
+无头 asyncio 交易引擎
+
+    python -m vibetrader.engine --symbol-bp BTC/USDC --symbol-hl BTC/USDC --amount 0.001
+
+引擎自己持有交易所连接、行情循环、execute_dual_trade 和状态库，
+不依赖浏览器页面是否开着。Streamlit 页面 (14_engine_viewer.py)
+只以只读方式读取状态库来展示。
+"""
+import argparse
+import asyncio
+import concurrent.futures
+import logging
+import signal
+import time
+from dataclasses import dataclass
+
+from .exchanges import init_exchanges
+from .execution import ExecutionService
+from .ordertracker import OrderTracker
+from .pairing import PairedQuoteFetcher, StaleSnapshotError
+from .priority import Priority
+from .state import StateStore
+from .strategy import decide
+from .ticks import TickWriter
+from .trading import execute_dual_trade
+
+logger = logging.getLogger("vibetrader.engine")
+
+
+@dataclass
+class EngineConfig:
+    symbol_bp: str = "BTC/USDC"
+    symbol_hl: str = "BTC/USDC"
+    amount: float = 0.001
+    open_threshold: float = 0.010     # 开仓阈值 (Spread %)
+    close_threshold: float = 0.005    # 平仓阈值 (Spread %)
+    is_real: bool = False
+    interval: float = 0.1             # 决策周期 (秒)
+    status_interval: float = 1.0      # 心跳写库间隔 (秒)
+    use_ws: bool = False              # 用 WebSocket 推送行情代替 REST 轮询
+    max_age_ms: float = 1500          # 快照最大延迟，超过就不做决策
+    max_skew_ms: float = 300          # 两腿报价最大时差
+    keepalive_interval: float = 30.0  # 下单连接心跳间隔 (秒)
+    record_dir: str = ""              # 非空时把看到的每一条行情录制成 tick 文件
+    depth: int = 0                    # > 0 时取前 N 档盘口，用 amount 的可成交价差 (VWAP) 做决策
+    mock: bool = False                # 连本地模拟交易所 (vibetrader.mockexchange)，下单走真实路径
+    mock_latency: str = "fixed:0"
+    mock_faults: str = ""
+    db_file: str = "bot_state_engine.db"
+
+
+class TradingEngine:
+    def __init__(self, config, exchanges=None, store=None):
+        self.config = config
+        if exchanges is None and config.mock:
+            from .mockexchange import mock_exchanges
+            exchanges = mock_exchanges(latency=config.mock_latency, faults=config.mock_faults)
+        exchanges = exchanges or init_exchanges()
+        self.backpack = exchanges['bp']
+        self.hyperliquid = exchanges['hl']
+        self.store = store or StateStore(config.db_file)
+        # 每个交易所一个常驻下单线程池，定期心跳保持连接是热的；私有推送确认成交 (下单回报丢了也不会留下裸腿)
+        self.execution = ExecutionService(exchanges, tracker=OrderTracker.from_exchanges(exchanges).start()
+                                          ).start_keepalive(config.keepalive_interval)
+        self.stream = None
+        if config.use_ws:
+            from .marketdata import MarketDataStream   # ccxt.pro 导入很慢，只在用推送行情时才加载
+            self.stream = MarketDataStream(depth=max(config.depth, 5)).start()
+        if self.stream:
+            quote_bp, quote_hl = self.stream.client('bp'), self.stream.client('hl')
+        else:
+            quote_bp, quote_hl = self.backpack, self.hyperliquid
+        self.quotes = PairedQuoteFetcher(quote_bp, quote_hl, config.max_age_ms, config.max_skew_ms, config.depth)
+        self.recorder = TickWriter(config.record_dir) if config.record_dir else None
+        # 行情和下单都是阻塞的 ccxt 调用，放到常驻线程池里跑，避免每轮新建线程
+        self.pool = concurrent.futures.ThreadPoolExecutor(max_workers=4, thread_name_prefix="engine")
+        self.ticks = 0
+        self._stop = asyncio.Event()
+        self._last_status = 0.0
+
+    def log(self, msg):
+        logger.info(msg)
+        self.store.add_log(msg)
+
+    def stop(self):
+        self._stop.set()
+
+    async def _call(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.pool, fn, *args)
+
+    async def tick(self):
+        """单个决策周期：同时取两边行情 -> 计算价差 -> 决策 -> 执行"""
+        cfg = self.config
+        started = time.perf_counter()
+
+        try:
+            snapshot = await self._call(self.quotes.fetch, cfg.symbol_bp, cfg.symbol_hl)
+        except StaleSnapshotError as e:
+            # 过期/错位的快照直接丢弃，不进入开平仓判断
+            logger.debug(f"跳过快照: {e}")
+            return None
+        if self.recorder:
+            for leg in (snapshot.bp, snapshot.hl):
+                self.recorder.append(leg.venue, leg.symbol, leg.exchange_ts, leg.bid, leg.ask, leg.last,
+                                     bid_size=leg.bid_size, ask_size=leg.ask_size, recv_ms=leg.recv_ms)
+        p_bp = snapshot.bp.last
+        p_hl = snapshot.hl.last
+        diff, diff_pct = snapshot.spread
+        # 下单时 Hyperliquid 市价单直接用这份行情做滑点基准，不再临时查价
+        self.execution.note_price('bp', cfg.symbol_bp, p_bp)
+        self.execution.note_price('hl', cfg.symbol_hl, p_hl)
+
+        state = self.store.get_state()
+        decision_pct = diff_pct
+        if cfg.depth:
+            # 用这笔下单量真正能成交的价差代替中间价价差
+            decision_pct = snapshot.executable(cfg.amount).decision_pct(state['status'], state['direction'])
+        action, direction = decide(state['status'], state['direction'], decision_pct,
+                                   cfg.open_threshold, cfg.close_threshold)
+        if action == "OPEN":
+            self.log(f"⚡ 触发自动开仓! 价差 {decision_pct:.4f}%")
+        elif action == "CLOSE":
+            self.log(f"🔄 触发自动平仓! 当前价差 {decision_pct:.4f}% 满足条件")
+
+        if action:
+            success, logs = await self._call(
+                execute_dual_trade, self.execution, direction,
+                cfg.amount, cfg.symbol_bp, cfg.symbol_hl, cfg.is_real, self.store,
+                Priority.OPEN if action == "OPEN" else Priority.CLOSE)
+            for l in logs:
+                self.log(l)
+            if success and action == "OPEN":
+                self.store.update_state("HOLDING", direction, decision_pct, cfg.amount)
+            elif success:
+                self.store.update_state("EMPTY", "NONE", 0.0, 0.0)
+
+        self.ticks += 1
+        cycle_ms = (time.perf_counter() - started) * 1000
+        now = time.monotonic()
+        if now - self._last_status >= cfg.status_interval:
+            self._last_status = now
+            self.store.update_status(p_bp, p_hl, diff_pct, cycle_ms, self.ticks)
+        return cycle_ms
+
+    async def run(self):
+        cfg = self.config
+        mode = "🧪 模拟交易所" if cfg.mock else ("⚡ 实盘" if cfg.is_real else "🛡️ 模拟")
+        self.log(f"🚀 引擎启动 ({mode}) {cfg.symbol_bp} / {cfg.symbol_hl} 开仓>{cfg.open_threshold}% 平仓<{cfg.close_threshold}%")
+        try:
+            while not self._stop.is_set():
+                started = time.perf_counter()
+                try:
+                    await self.tick()
+                except Exception as e:
+                    self.log(f"Error: {e}")
+                # 按固定节奏推进：扣掉本轮耗时，剩下的时间再等
+                delay = cfg.interval - (time.perf_counter() - started)
+                if delay > 0:
+                    try:
+                        await asyncio.wait_for(self._stop.wait(), timeout=delay)
+                    except asyncio.TimeoutError:
+                        pass
+        finally:
+            if self.stream:
+                self.stream.stop()
+            self.quotes.close()
+            if self.recorder:
+                self.recorder.close()
+            self.execution.shutdown()
+            self.pool.shutdown(wait=True)
+            self.log("🛑 引擎已停止")
+            self.store.close()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="VibeTrader 无头交易引擎")
+    parser.add_argument("--symbol-bp", default=EngineConfig.symbol_bp)
+    parser.add_argument("--symbol-hl", default=EngineConfig.symbol_hl)
+    parser.add_argument("--amount", type=float, default=EngineConfig.amount)
+    parser.add_argument("--open-threshold", type=float, default=EngineConfig.open_threshold)
+    parser.add_argument("--close-threshold", type=float, default=EngineConfig.close_threshold)
+    parser.add_argument("--interval", type=float, default=EngineConfig.interval)
+    parser.add_argument("--db", default=EngineConfig.db_file)
+    parser.add_argument("--ws", action="store_true", help="使用 WebSocket 推送行情")
+    parser.add_argument("--record", default="", metavar="DIR", help="把行情录制成 tick 文件")
+    parser.add_argument("--depth", type=int, default=0, metavar="N", help="按前 N 档盘口计算可成交价差")
+    parser.add_argument("--real", action="store_true", help="实盘模式 (消耗真实资金)")
+    parser.add_argument("--mock", action="store_true", help="连本地模拟交易所，离线跑完整的下单/回滚流程")
+    parser.add_argument("--mock-latency", default=EngineConfig.mock_latency, help="如 lognormal:30:0.5")
+    parser.add_argument("--mock-faults", default=EngineConfig.mock_faults, help="如 rate_limit=0.02,timeout=0.01,partial=0.05")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="[%(asctime)s] %(message)s", datefmt="%H:%M:%S")
+    config = EngineConfig(
+        symbol_bp=args.symbol_bp,
+        symbol_hl=args.symbol_hl,
+        amount=args.amount,
+        open_threshold=args.open_threshold,
+        close_threshold=args.close_threshold,
+        is_real=args.real or args.mock,   # 模拟交易所上照常真实下单
+        interval=args.interval,
+        db_file=args.db,
+        use_ws=args.ws,
+        record_dir=args.record,
+        depth=args.depth,
+        mock=args.mock,
+        mock_latency=args.mock_latency,
+        mock_faults=args.mock_faults,
+    )
+
+    async def _main():
+        engine = TradingEngine(config)
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, engine.stop)
+            except NotImplementedError:  # Windows
+                pass
+        await engine.run()
+
+    asyncio.run(_main())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""交易所连接：有私钥就建立实盘连接，否则只建立公共连接用于看行情"""
+import os
+
+import ccxt
+from dotenv import load_dotenv
+
+from .markets_cache import load_markets_cached
+from .ratelimit import install_rate_limiter
+
+
+def init_exchanges():
+    """
+    所有脚本共用的交易所连接 (taolitest1.py / timetest.py / 12_final_terminal.py 直接调用)，
+    返回 {'bp': backpack, 'hl': hyperliquid}。
+    两个连接都装上跨进程共享的限速器，同一个 Key 的所有脚本共用一份额度；
+    市场信息优先从磁盘缓存加载 (vibetrader.markets_cache)，重启后不用重新下载就能下单。
+    """
+    load_dotenv()
+    exchanges = {}
+
+    # Backpack
+    bp_key = os.getenv("BP_API_KEY")
+    bp_secret = os.getenv("BP_SECRET")
+    if bp_key and bp_secret:
+        exchanges['bp'] = ccxt.backpack({'apiKey': bp_key, 'secret': bp_secret, 'enableRateLimit': True})
+    else:
+        exchanges['bp'] = ccxt.backpack({'enableRateLimit': True})  # 仅行情
+
+    # Hyperliquid
+    hl_private = os.getenv("HL_PRIVATE_KEY")
+    hl_address = os.getenv("HL_WALLET_ADDRESS")
+    if hl_private:
+        exchanges['hl'] = ccxt.hyperliquid({'walletAddress': hl_address, 'privateKey': hl_private, 'enableRateLimit': True})
+    else:
+        exchanges['hl'] = ccxt.hyperliquid({'enableRateLimit': True})  # 仅行情
+
+    for exchange in exchanges.values():
+        install_rate_limiter(exchange)
+        try:
+            load_markets_cached(exchange)
+        except Exception as e:
+            print(f"⚠️ {exchange.id} 加载市场信息失败，首次请求时再试: {e}")
+    return exchanges
@@ -0,0 +1,416 @@
+"""
+常驻下单服务
+
+以前每次 execute_dual_trade 都新建一个 ThreadPoolExecutor(max_workers=2)，
+在 timetest.py 的 10 分钟持仓循环里，到下单时到两个交易所的 HTTP/TLS 连接
+早就冷了。ExecutionService 给每个交易所一个固定的常驻线程池：
+
+- 两腿在各自的线程里用 Barrier 对齐后同时发出，省掉起线程和 TLS 握手；
+- 在计划的开/平仓时刻之前发一个便宜的认证请求 (心跳) 把连接焐热；
+- 记录每一腿从发出到回报的耗时；
+- 线程池按优先级排队 (priority.PriorityExecutor)：回滚 > 平仓 > 开仓 > 行情 > 查询，
+  回滚请求有专用线程，心跳/查余额排在最后；
+- Hyperliquid 没有真正的市价单，ccxt 要拿一个参考价加上滑点换算成 IOC 限价单。
+  参考价用我们自己最新的行情 (note_price)，下单路径上不再额外查价格；
+  启动时提前跑一遍 initialize_client (builder fee / ref 这几个一次性请求)，
+  每一腿都统计实际发了几个 HTTP 请求 (LegResult.requests)，应该正好是 1；
+- 签名交给 signing.py 的缓存签名器：Hyperliquid 的单在 Barrier 之前就签好，
+  开仓请求飞行期间顺手把对应的回滚单 (reduceOnly) 也签好；签名耗时和网络耗时分开记录；
+- 单边成交后的回滚交给 rollback.RollbackEngine (self.rollbacks)：按实际成交量逐级加码，带时间预算；
+- 每一腿都带客户端订单号下单 (LegResult.client_id)；传入 tracker (ordertracker.OrderTracker) 时还会登记，
+  成交 / 撤单 / 拒单由私有推送确认。下单超时 (回报丢了) 的腿先等推送，推送说不清就按客户端订单号查 REST；
+  之后推送再报出来的成交 (迟到的推送) 交给回滚线程反向平掉 (_on_late_fill)；
+- 挂单 + 吃单对冲的执行方式交给 maker.MakerTaker (self.maker)，延迟直方图也在它上面。
+"""
+import logging
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+
+from .maker import MakerTaker
+from .priority import Priority, PriorityExecutor, QueueStats
+from .ordertracker import find_order, is_ambiguous, new_client_order_id
+from .rollback import RollbackEngine
+from .signing import SigningStats, install_signer, thread_signing_ms
+from .trading import needs_reference_price, place_order_safe
+
+logger = logging.getLogger("vibetrader.execution")
+
+_local = threading.local()
+
+
+def count_requests(exchange):
+    """给 exchange.fetch 包一层计数 (按线程累计)，用来核对每一腿到底发了几个 HTTP 请求"""
+    if getattr(exchange, '_counting_requests', False):
+        return exchange
+    inner = exchange.fetch
+
+    def fetch(*args, **kwargs):
+        _local.requests = getattr(_local, 'requests', 0) + 1
+        return inner(*args, **kwargs)
+
+    exchange.fetch = fetch
+    exchange._counting_requests = True
+    return exchange
+
+
+def thread_requests():
+    """当前线程累计发出的请求数"""
+    return getattr(_local, 'requests', 0)
+
+
+@dataclass
+class LegResult:
+    venue: str
+    symbol: str
+    side: str
+    amount: float
+    price: float = None  # 参考价 (Hyperliquid 市价单的滑点基准)
+    order: dict = None
+    error: str = None
+    submit_ns: int = 0   # 提交到线程池
+    send_ns: int = 0     # 真正发出请求
+    ack_ns: int = 0      # 收到回报 (或异常)
+    requests: int = 0    # 这一腿实际发出的 HTTP 请求数
+    sign_ms: float = 0.0      # 这一腿的签名耗时
+    presigned: bool = False   # 是否在发出之前就签好了 (签名不占发出 -> 回报的时间)
+    rollback: object = None   # 开仓腿预先签好的回滚单 (signing.PrebuiltOrder)
+    client_id: str = None     # 客户端订单号 (模拟下单没有)
+
+    @property
+    def ok(self):
+        return self.order is not None
+
+    @property
+    def send_to_ack_ms(self):
+        return (self.ack_ns - self.send_ns) / 1e6
+
+    @property
+    def network_ms(self):
+        """发出 -> 回报里扣掉签名的部分"""
+        return self.send_to_ack_ms - (0.0 if self.presigned else self.sign_ms)
+
+    @property
+    def queue_us(self):
+        return (self.send_ns - self.submit_ns) / 1e3
+
+
+def heartbeat_call(exchange):
+    """便宜的心跳请求：有密钥就走认证接口 (和下单同一条连接)，否则走公共接口"""
+    if exchange.apiKey or exchange.walletAddress:
+        return exchange.fetch_balance()
+    if exchange.has.get('fetchTime'):
+        return exchange.fetch_time()
+    return exchange.fetch_status()
+
+
+class ExecutionService:
+    def __init__(self, exchanges, workers_per_exchange=2, warmup_lead=5.0, max_slippage=0.005, price_max_age=10.0,
+                 rollback_slippage=0.02, rollback_budget=5.0, tracker=None, ambiguous_wait=0.5):
+        """
+        exchanges: {'bp': backpack, 'hl': hyperliquid}
+        warmup_lead: 计划下单前多少秒发心跳
+        max_slippage: Hyperliquid 市价单相对参考价最多偏离多少 (0.005 = 0.5%)
+        price_max_age: 参考价超过多少秒就不用了，下单前临时查一次 (会多一个请求)
+        rollback_slippage: 预先签好的回滚单的滑点上限 (签的时候还不知道成交价，给宽一点)
+        rollback_budget: 单边成交后回滚的硬性时间预算 (秒)
+        tracker: ordertracker.OrderTracker，用私有推送确认每一腿的成交 (shutdown 时一起停掉)
+        ambiguous_wait: 有 tracker 时，下单超时 (订单可能成交了、回报丢了) 后最多等多少秒推送，再去查 REST
+        """
+        self.exchanges = {venue: count_requests(exchange) for venue, exchange in exchanges.items()}
+        self.warmup_lead = warmup_lead
+        self.max_slippage = max_slippage
+        self.price_max_age = price_max_age
+        self.rollback_slippage = rollback_slippage
+        self.tracker = tracker
+        self.ambiguous_wait = ambiguous_wait
+        self._prices = {}   # (venue, symbol) -> (价格, time.monotonic())
+        # 密钥只解析一次的签名器 (没有密钥 / 模拟交易所时为 None，照常走 ccxt)
+        self.signing_stats = SigningStats()
+        self.signers = {venue: install_signer(exchange, venue, self.signing_stats)
+                        for venue, exchange in self.exchanges.items()}
+        self.queue_stats = QueueStats()   # 所有交易所合计的分类排队时间
+        self.pools = {
+            venue: PriorityExecutor(workers_per_exchange, f"exec-{venue}", self.queue_stats)
+            for venue in exchanges
+        }
+        self.history = deque(maxlen=200)   # 最近的 LegResult，用于统计
+        self.rollbacks = RollbackEngine(self, budget=rollback_budget)
+        self.maker = MakerTaker(self)   # 挂单 + 吃单对冲 (maker.execute_maker_taker)
+        if tracker is not None:
+            tracker.late_fill_listeners.append(self._on_late_fill)
+        self._timers = {}
+        self._keepalive = None
+        self._lock = threading.Lock()
+        self._pair_lock = threading.Lock()
+        # ccxt 的 Hyperliquid 在第一笔订单里才做 builder fee 授权 / 设置 ref，这里提前在后台跑掉
+        for venue, exchange in self.exchanges.items():
+            if hasattr(exchange, 'initialize_client') and (exchange.apiKey or exchange.privateKey):
+                self.pools[venue].submit(exchange.initialize_client, priority=Priority.QUERY)
+
+    # --- 参考价 ---
+    def note_price(self, venue, symbol, price):
+        """记下最新行情，Hyperliquid 市价单用它做滑点基准"""
+        if price:
+            self._prices[(venue, symbol)] = (float(price), time.monotonic())
+
+    def reference_price(self, venue, symbol):
+        """最新的参考价；没有或太旧时返回 None"""
+        entry = self._prices.get((venue, symbol))
+        if entry is None or time.monotonic() - entry[1] > self.price_max_age:
+            return None
+        return entry[0]
+
+    def _leg_price(self, leg):
+        if leg.price is None and needs_reference_price(self.exchanges[leg.venue]):
+            leg.price = self.reference_price(leg.venue, leg.symbol)
+            if leg.price is None:
+                # 兜底：没有新鲜报价只能临时查一次，这一腿会多一个请求 (requests == 2)
+                ticker = self.exchanges[leg.venue].fetch_ticker(leg.symbol)
+                leg.price = ticker['last']
+                self.note_price(leg.venue, leg.symbol, leg.price)
+        return leg.price
+
+    # --- 下单 ---
+    def call(self, venue, fn, *args, priority=Priority.QUERY):
+        """在该交易所的常驻线程上按 priority 排队执行任意阻塞调用，返回结果 (异常原样抛出)"""
+        return self.pools[venue].submit(fn, *args, priority=priority).result()
+
+    def _run_leg(self, leg, is_real, barrier, sent=None, prebuilt=None):
+        before = thread_requests()
+        sign_before = thread_signing_ms()
+        price = None
+        failure = None
+        try:
+            # 参考价和签名都在对齐之前准备好，Barrier 之后只剩下单这一个请求
+            price = self._leg_price(leg) if is_real else None
+            signer = self.signers.get(leg.venue)
+            if prebuilt is not None and not prebuilt.valid:
+                prebuilt = None
+            if prebuilt is None and is_real:
+                leg.client_id = new_client_order_id(leg.venue)
+            elif prebuilt is not None:
+                leg.client_id = prebuilt.client_order_id
+            if leg.client_id is not None and self.tracker is not None:
+                self.tracker.track(leg.venue, leg.client_id, leg.symbol, leg.side, leg.amount)
+            if prebuilt is None and is_real and signer is not None and signer.can_prebuild:
+                prebuilt = signer.prebuild(leg.symbol, leg.side, leg.amount, price, self.max_slippage,
+                                           client_order_id=leg.client_id)
+        except Exception as e:
+            leg.error = f"下单前准备失败: {e}"
+        leg.presigned = prebuilt is not None
+        if barrier is not None:
+            try:
+                barrier.wait()
+            except threading.BrokenBarrierError:
+                pass  # 另一腿迟迟没就位 (线程被心跳占着)，不再等它
+        leg.send_ns = time.perf_counter_ns()
+        if sent is not None:
+            sent.set()
+        if leg.error is None:
+            try:
+                if prebuilt is not None:
+                    leg.order = prebuilt.send()
+                else:
+                    leg.order = place_order_safe(self.exchanges[leg.venue], leg.symbol, leg.side, leg.amount, is_real,
+                                                 price, self.max_slippage, leg.client_id)
+            except Exception as e:
+                leg.error = str(e)
+                failure = e
+        leg.ack_ns = time.perf_counter_ns()
+        if leg.client_id is not None and self.tracker is not None:
+            if leg.order is not None:
+                self.tracker.bind(leg.venue, leg.client_id, leg.order)
+            else:
+                self.tracker.reject(leg.venue, leg.client_id, failure or leg.error)
+        if leg.client_id is not None and failure is not None and is_ambiguous(failure):
+            self._recover_leg(leg)
+        leg.requests = thread_requests() - before
+        leg.sign_ms = thread_signing_ms() - sign_before
+        self.history.append(leg)
+        return leg
+
+    def resolve_order(self, venue, symbol, client_id, priority=None, timeout=None):
+        """
+        结果不明 (超时、断线) 的订单到底怎么样了，返回 (订单, 是否确认)：
+        有 tracker 先等 ambiguous_wait 秒推送，推送说不清再按客户端订单号查 REST (find_order)。
+        (None, True) 是交易所确认没有这笔单，(None, False) 是查询也失败了、仍然不明。
+        priority: 不在该交易所的工作线程上时，按这个优先级排队去查；None 表示就在当前线程查
+        timeout: 等推送加查询最多用多少秒 (None 不限)
+        """
+        if self.tracker is not None:
+            wait = self.ambiguous_wait if timeout is None else min(self.ambiguous_wait, timeout)
+            started = time.monotonic()
+            entry = self.tracker.settle(venue, client_id, wait)
+            if timeout is not None:
+                timeout = max(0.0, timeout - (time.monotonic() - started))
+            if entry is not None and entry.state != 'pending':
+                return entry.as_order(), True
+        exchange = self.exchanges[venue]
+        try:
+            if priority is None:
+                order = find_order(exchange, symbol, client_id)
+            else:
+                order = self.pools[venue].submit(find_order, exchange, symbol, client_id,
+                                                 priority=priority).result(timeout=timeout)
+        except Exception as e:
+            logger.warning(f"⚠️ {venue} 订单 {client_id} 结果不明，按客户端订单号查询失败: {e}")
+            return None, False
+        if self.tracker is not None:
+            self.tracker.resolve(venue, client_id, order)
+        return order, True
+
+    def _recover_leg(self, leg):
+        """
+        下单超时：订单其实成交了 (回报丢了) 就按推送 / REST 查到的结果补上这一腿的回报，后面照常回滚 / 对齐。
+        这一腿就按现在确认的成交量处理，之后推送再报出来的成交由 _on_late_fill 平掉
+        """
+        order, known = self.resolve_order(leg.venue, leg.symbol, leg.client_id)
+        filled = float(order.get('filled') or 0.0) if order else 0.0
+        if filled > 0:
+            leg.order = order
+            leg.error = None
+        elif not known:
+            leg.error = f"{leg.error} (结果不明，推送和 REST 都没能确认，请核对 {leg.venue} 订单 {leg.client_id})"
+        if self.tracker is not None:
+            self.tracker.abandon(leg.venue, leg.client_id, filled)
+
+    def _on_late_fill(self, entry, amount):
+        """已经按没成交 (或更少成交) 处理过的腿，推送又报出成交：在回滚线程上把多出来的部分反向平掉"""
+        side = 'sell' if entry.side == 'buy' else 'buy'
+        logger.warning(f"⚠️ {entry.venue} 订单 {entry.client_id} 迟到的成交 {amount:g}，反向平掉")
+        try:
+            self.rollbacks.submit(entry.venue, entry.symbol, side, amount, reduce_only=False)
+        except RuntimeError as e:
+            logger.error(f"💀 {entry.venue} 订单 {entry.client_id} 迟到的成交 {amount:g} 没能平掉，请手动操作: {e}")
+
+    def place(self, venue, symbol, side, amount, is_real, priority=Priority.OPEN, price=None, prebuilt=None):
+        """
+        单腿下单，返回 LegResult；price 为参考价，不给就用 note_price 记下的最新行情。
+        prebuilt: 预先签好的订单 (比如开仓腿的 LegResult.rollback)，还有效就直接发，不用再签
+        """
+        leg = LegResult(venue, symbol, side, amount, price, submit_ns=time.perf_counter_ns())
+        return self.pools[venue].submit(self._run_leg, leg, is_real, None, None, prebuilt,
+                                        priority=priority).result()
+
+    def _prebuild_rollback(self, leg):
+        """开仓腿的反向 reduceOnly 单，趁开仓请求在路上的时候先签好 (带客户端订单号，回报丢了也能查到)"""
+        signer = self.signers.get(leg.venue)
+        price = leg.price or self.reference_price(leg.venue, leg.symbol)
+        if signer is None or not signer.can_prebuild or price is None:
+            return None
+        side = 'sell' if leg.side == 'buy' else 'buy'
+        try:
+            return signer.prebuild(leg.symbol, side, leg.amount, price, self.rollback_slippage, reduce_only=True,
+                                   client_order_id=new_client_order_id(leg.venue))
+        except Exception:
+            return None   # 签不出来就在回滚时现签
+
+    def place_pair(self, leg_bp, leg_hl, is_real, priority=Priority.OPEN):
+        """
+        两腿同时下单。leg_bp / leg_hl 是 (venue, symbol, side, amount) 或带参考价的 (..., price)。
+        两个工作线程在 Barrier 处对齐后才发请求，返回 (LegResult, LegResult)。
+        priority: 开仓用 OPEN，平仓用 CLOSE
+        """
+        barrier = threading.Barrier(2, timeout=5)
+        legs = [LegResult(*leg_bp), LegResult(*leg_hl)]
+        sent = [threading.Event(), threading.Event()]
+        futures = []
+        # 两腿原子地入队：多对同时下单时，两边队列里的先后顺序一致，
+        # 不会出现 A 的 BP 腿和 B 的 HL 腿各占着线程互相等 Barrier
+        with self._pair_lock:
+            for leg, event in zip(legs, sent):
+                leg.submit_ns = time.perf_counter_ns()
+                futures.append(self.pools[leg.venue].submit(self._run_leg, leg, is_real, barrier, event,
+                                                            priority=priority))
+        rollbacks = {}
+        if is_real and priority == Priority.OPEN and any(self.signers.values()):
+            # 两腿都发出去之后 (工作线程在等网络，不抢 GIL)，在调用线程上把回滚单签好
+            for event in sent:
+                event.wait(5)
+            rollbacks = {leg.venue: self._prebuild_rollback(leg) for leg in legs}
+        results = tuple(f.result() for f in futures)
+        for leg in results:
+            leg.rollback = rollbacks.get(leg.venue)
+        return results
+
+    # --- 连接预热 ---
+    def warm_up(self, venues=None):
+        """每个交易所发一次心跳，返回 {venue: 耗时ms 或 错误信息}"""
+        venues = venues or list(self.exchanges)
+        futures = {}
+        for venue in venues:
+            futures[venue] = self.pools[venue].submit(self._timed_heartbeat, venue, priority=Priority.QUERY)
+        return {venue: f.result() for venue, f in futures.items()}
+
+    def _timed_heartbeat(self, venue):
+        started = time.perf_counter()
+        try:
+            heartbeat_call(self.exchanges[venue])
+        except Exception as e:
+            return f"心跳失败: {e}"
+        return (time.perf_counter() - started) * 1000
+
+    def schedule_warmup(self, at_ts):
+        """
+        在 at_ts (epoch 秒) 之前 warmup_lead 秒发心跳。
+        同一个时刻重复调用只会安排一次，适合在 Streamlit 每次 rerun 时调用。
+        """
+        key = int(at_ts)
+        delay = at_ts - self.warmup_lead - time.time()
+        with self._lock:
+            if key in self._timers or delay <= 0:
+                return
+            timer = threading.Timer(delay, self._fire_warmup, args=(key,))
+            timer.daemon = True
+            self._timers[key] = timer
+            timer.start()
+
+    def _fire_warmup(self, key):
+        self.warm_up()
+        self.refresh_prices()
+        with self._lock:
+            self._timers.pop(key, None)
+
+    def refresh_prices(self):
+        """计划下单前把用过的 Hyperliquid 交易对的参考价刷新一遍 (在下单线程上，不占用下单时刻)"""
+        for venue, symbol in list(self._prices):
+            exchange = self.exchanges[venue]
+            if needs_reference_price(exchange):
+                self.pools[venue].submit(self._refresh_price, venue, symbol, priority=Priority.MARKET_DATA)
+
+    def _refresh_price(self, venue, symbol):
+        try:
+            self.note_price(venue, symbol, self.exchanges[venue].fetch_ticker(symbol)['last'])
+        except Exception:
+            pass   # 刷新失败就在下单时兜底
+
+    def start_keepalive(self, interval=30.0):
+        """空闲时也定期心跳，避免交易所把空闲连接关掉"""
+        if self._keepalive is not None:
+            return self
+        stop = threading.Event()
+
+        def loop():
+            while not stop.wait(interval):
+                self.warm_up()
+
+        thread = threading.Thread(target=loop, name="exec-keepalive", daemon=True)
+        self._keepalive = (thread, stop)
+        thread.start()
+        return self
+
+    def shutdown(self):
+        if self._keepalive is not None:
+            self._keepalive[1].set()
+        with self._lock:
+            for timer in self._timers.values():
+                timer.cancel()
+            self._timers.clear()
+        self.rollbacks.shutdown()
+        self.maker.shutdown()
+        if self.tracker is not None:
+            self.tracker.stop()
+        for pool in self.pools.values():
+            pool.shutdown(wait=True)
@@ -0,0 +1,188 @@
+"""
+行情中心：每个交易所只轮询一次，所有看板会话共享
+
+7_web_ui.py / 8_cockpit.py / 12_final_terminal.py 每开一个浏览器标签页就多一个
+while True / st.rerun() 轮询循环，五个人一起看就是五倍的 fetch_ticker 流量。
+
+MarketDataHub 在一个后台线程里按 interval 把所有被订阅的交易对取一遍：两边交易所同时发请求
+(两腿的时差和 fetch_paired 一样小)，支持 fetchTickers 的一次请求取完，
+结果连同本地接收时间放进进程内缓存。
+Streamlit 的所有会话都在同一个进程里，用 @st.cache_resource 拿到同一个 hub，
+页面只读缓存，请求量和看板数量无关：
+
+    @st.cache_resource
+    def init_hub():
+        return MarketDataHub(init_exchanges()).start()
+
+    ticker = init_hub().fetch_ticker('bp', 'BTC/USDC')     # 读缓存，不发请求
+
+超过 ttl 秒没更新的行情会抛 StaleSnapshotError；idle_after 秒没人读的交易对自动停止轮询。
+hub.client('bp') 返回只有 fetch_ticker / fetch_order_book 的小对象，可以直接传给 fetch_paired。
+"""
+import concurrent.futures
+import threading
+import time
+
+from .marketdata import book_to_ticker
+from .pairing import StaleSnapshotError
+from .priority import Priority, request_priority
+
+
+class HubClient:
+    """同步的 fetch_ticker 接口，方便直接替换 ccxt 客户端"""
+
+    def __init__(self, hub, venue):
+        self.hub = hub
+        self.venue = venue
+
+    def fetch_ticker(self, symbol):
+        return self.hub.fetch_ticker(self.venue, symbol)
+
+    def fetch_order_book(self, symbol, limit=None):
+        return self.hub.fetch_order_book(self.venue, symbol, limit)
+
+
+class MarketDataHub:
+    def __init__(self, exchanges, interval=1.0, ttl=5.0, idle_after=60.0, first_quote_timeout=10.0):
+        """
+        exchanges: {'bp': backpack, 'hl': hyperliquid}，装了共享限速器的 ccxt 客户端
+        interval: 每个交易所的轮询周期 (秒)
+        """
+        self.exchanges = exchanges
+        self.interval = interval
+        self.ttl = ttl
+        self.idle_after = idle_after
+        self.first_quote_timeout = first_quote_timeout
+
+        self.quotes = {}          # (venue, symbol) -> ticker dict (带 recv_ms)
+        self.books = {}           # (venue, symbol) -> ccxt 格式盘口 (带 recv_ms)
+        self.errors = {}          # venue -> 最近一次轮询的错误
+        self.polls = {venue: 0 for venue in exchanges}   # 实际发出的轮询轮数
+        self.reads = 0            # 看板读取次数
+        self._subscriptions = {venue: {} for venue in exchanges}   # venue -> {symbol: [depth, 最近读取时间]}
+        self._cond = threading.Condition()
+        self._wake = threading.Event()
+        self._thread = None
+        self._pool = None
+        self._running = False
+
+    # --- 生命周期 ---
+    def start(self):
+        if self._thread is not None:
+            return self
+        self._running = True
+        self._pool = concurrent.futures.ThreadPoolExecutor(len(self.exchanges), thread_name_prefix="hub")
+        self._thread = threading.Thread(target=self._poll_loop, name="hub", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._running = False
+        self._wake.set()
+        self._thread.join(timeout=10)
+        self._thread = None
+        self._pool.shutdown(wait=True)
+
+    # --- 订阅 ---
+    def subscribe(self, venue, symbol, depth=0):
+        """订阅一个交易对；depth > 0 时改为轮询盘口 (同时也能读 ticker)"""
+        with self._cond:
+            subs = self._subscriptions[venue]
+            changed = symbol not in subs or depth > subs[symbol][0]
+            if changed:
+                subs[symbol] = [max(depth, subs.get(symbol, [0])[0]), time.monotonic()]
+            else:
+                subs[symbol][1] = time.monotonic()
+        if changed:
+            self._wake.set()   # 新订阅马上取一次，不用等下一个周期
+
+    def _poll_loop(self):
+        while self._running:
+            started = time.monotonic()
+            self._wake.clear()
+            futures = []
+            for venue in self.exchanges:
+                symbols = self._active_symbols(venue)
+                if symbols:
+                    futures.append(self._pool.submit(self._poll_venue, venue, symbols))
+            concurrent.futures.wait(futures)
+            delay = self.interval - (time.monotonic() - started)
+            if delay > 0:
+                self._wake.wait(delay)
+
+    def _poll_venue(self, venue, symbols):
+        try:
+            self._poll(venue, symbols)
+            self.errors.pop(venue, None)
+        except Exception as e:
+            self.errors[venue] = str(e)
+        self.polls[venue] += 1
+
+    def _active_symbols(self, venue):
+        """{symbol: depth}，顺便清掉 idle_after 秒没人读的订阅"""
+        now = time.monotonic()
+        with self._cond:
+            subs = self._subscriptions[venue]
+            for symbol in [s for s, (_, last_read) in subs.items() if now - last_read > self.idle_after]:
+                del subs[symbol]
+            return {symbol: depth for symbol, (depth, _) in subs.items()}
+
+    def _poll(self, venue, symbols):
+        exchange = self.exchanges[venue]
+        with request_priority(Priority.MARKET_DATA):
+            books = {s: exchange.fetch_order_book(s, d) for s, d in symbols.items() if d}
+            plain = [s for s, d in symbols.items() if not d]
+            if len(plain) > 1 and exchange.has.get('fetchTickers'):
+                tickers = exchange.fetch_tickers(plain)
+            else:
+                tickers = {s: exchange.fetch_ticker(s) for s in plain}
+        recv_ms = int(time.time() * 1000)
+        with self._cond:
+            for symbol, book in books.items():
+                book = {'bids': [level[:2] for level in book['bids']], 'asks': [level[:2] for level in book['asks']],
+                        'timestamp': book.get('timestamp'), 'recv_ms': recv_ms}
+                self.books[(venue, symbol)] = book
+                self.quotes[(venue, symbol)] = dict(book_to_ticker(symbol, book), recv_ms=recv_ms)
+            for symbol in plain:
+                if symbol in tickers:
+                    self.quotes[(venue, symbol)] = dict(tickers[symbol], recv_ms=recv_ms)
+            self._cond.notify_all()
+
+    # --- 读取 ---
+    def fetch_ticker(self, venue, symbol, timeout=None):
+        """读取缓存的 ticker；第一次读取会自动订阅并等待首次轮询"""
+        self.subscribe(venue, symbol)
+        return self._latest(self.quotes, venue, symbol, timeout)
+
+    def fetch_order_book(self, venue, symbol, limit=None, timeout=None):
+        """读取缓存的盘口 (前 limit 档，默认 20)"""
+        self.subscribe(venue, symbol, limit or 20)
+        book = self._latest(self.books, venue, symbol, timeout)
+        if limit and len(book['bids']) > limit:
+            book = dict(book, bids=book['bids'][:limit], asks=book['asks'][:limit])
+        return book
+
+    def _latest(self, cache, venue, symbol, timeout):
+        key = (venue, symbol)
+        timeout = self.first_quote_timeout if timeout is None else timeout
+        with self._cond:
+            if not self._cond.wait_for(lambda: key in cache, timeout=timeout):
+                error = self.errors.get(venue)
+                raise TimeoutError(f"{venue} {symbol} 在 {timeout} 秒内没有取到行情" + (f": {error}" if error else ""))
+            value = cache[key]
+        self.reads += 1
+        age = time.time() * 1000 - value['recv_ms']
+        if age > self.ttl * 1000:
+            raise StaleSnapshotError(f"{venue} {symbol} 行情已 {age / 1000:.1f} 秒未更新: {self.errors.get(venue)}")
+        return value
+
+    def client(self, venue):
+        return HubClient(self, venue)
+
+    def stats(self):
+        """{'polls', 'reads', 'symbols', 'errors'}，用于看板展示 API 负载"""
+        with self._cond:
+            symbols = {venue: sorted(subs) for venue, subs in self._subscriptions.items()}
+        return {'polls': dict(self.polls), 'reads': self.reads, 'symbols': symbols, 'errors': dict(self.errors)}
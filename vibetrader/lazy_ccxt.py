@@ -0,0 +1,104 @@
+"""
+按需加载的 ccxt
+
+`import ccxt` 会把 100 多个交易所类全部导入 (本机约 0.5 秒，ccxt.pro 约 0.9 秒)，
+而我们只用 backpack 和 hyperliquid。看门狗重启引擎、跑一次 10_check_balance.py
+都要先付这笔钱。
+
+install() 在 sys.modules 里放三个轻量的包对象 (ccxt / ccxt.async_support / ccxt.pro)，
+真正的 __init__.py 不执行；访问 ccxt.backpack 时才导入 ccxt/backpack.py 这一个模块
+(PEP 562 模块级 __getattr__)。Exchange、Precise、错误类等基础名字直接映射到 ccxt.base。
+访问到不认识的名字 (如 ccxt.exchanges 列表) 时，退回执行一次原始的 __init__.py，行为和完整导入一致。
+
+vibetrader/__init__.py 会自动调用 install()，所以脚本里只要在 `import ccxt` 之前先导入 vibetrader：
+
+    import vibetrader  # 按需加载 ccxt
+    import ccxt
+
+设置环境变量 VIBETRADER_FULL_CCXT=1 可以关掉，恢复完整导入。
+"""
+import importlib
+import importlib.machinery
+import importlib.util
+import os
+import re
+import sys
+import types
+
+PACKAGES = ("ccxt", "ccxt.async_support", "ccxt.pro")
+
+_DECIMAL_NAMES = ("decimal_to_precision", "TRUNCATE", "ROUND", "ROUND_UP", "ROUND_DOWN", "DECIMAL_PLACES",
+                  "SIGNIFICANT_DIGITS", "TICK_SIZE", "NO_PADDING", "PAD_WITH_ZERO")
+
+
+def _base_names(package):
+    """各包 __init__.py 里从 ccxt.base 转出来的名字 -> 所在模块"""
+    exchange_module = "ccxt.base.exchange" if package == "ccxt" else "ccxt.async_support.base.exchange"
+    names = {"Exchange": exchange_module, "Precise": "ccxt.base.precise", "OrderRouter": "ccxt.base.order_router"}
+    names.update({name: "ccxt.base.decimal_to_precision" for name in _DECIMAL_NAMES})
+    return names
+
+
+class LazyPackage(types.ModuleType):
+    def __init__(self, name, spec):
+        super().__init__(name)
+        self.__path__ = list(spec.submodule_search_locations)
+        self.__file__ = spec.origin
+        self.__spec__ = importlib.machinery.ModuleSpec(name, spec.loader, origin=spec.origin, is_package=True)
+        self.__spec__.submodule_search_locations = self.__path__
+        self._real_spec = spec
+        self._base = _base_names(name)
+        self._fully_loaded = False
+
+    def __getattr__(self, name):
+        if name.startswith("__") and name != "__version__":
+            raise AttributeError(name)
+        value = self._resolve(name)
+        setattr(self, name, value)   # 之后的访问不再进 __getattr__
+        return value
+
+    def _resolve(self, name):
+        if name == "__version__":
+            with open(self.__file__, encoding="utf-8") as f:
+                match = re.search(r"^__version__ = '([^']+)'", f.read(4096), re.M)
+            if match:
+                return match.group(1)
+        if name == "errors":
+            return importlib.import_module("ccxt.base.errors")
+        errors = importlib.import_module("ccxt.base.errors")
+        if hasattr(errors, name):
+            return getattr(errors, name)
+        if name in self._base:
+            return getattr(importlib.import_module(self._base[name]), name)
+        if os.path.exists(os.path.join(self.__path__[0], f"{name}.py")):
+            # 交易所模块：ccxt/backpack.py 里的 class backpack
+            module = importlib.import_module(f"{self.__name__}.{name}")
+            return getattr(module, name, module)
+        if os.path.isdir(os.path.join(self.__path__[0], name)):
+            return importlib.import_module(f"{self.__name__}.{name}")
+        return self._load_fully(name)
+
+    def _load_fully(self, name):
+        """不认识的名字：执行一次原始的 __init__.py (会导入全部交易所)"""
+        if not self._fully_loaded:
+            self._fully_loaded = True
+            self._real_spec.loader.exec_module(self)
+            if name in self.__dict__:
+                return self.__dict__[name]
+        raise AttributeError(f"module '{self.__name__}' has no attribute '{name}'")
+
+
+def install():
+    """把 ccxt 换成按需加载的包；ccxt 已经被完整导入过时什么也不做。返回 ccxt 模块"""
+    if os.getenv("VIBETRADER_FULL_CCXT") or "ccxt" in sys.modules:
+        return importlib.import_module("ccxt")
+    for name in PACKAGES:
+        spec = importlib.util.find_spec(name)   # 子包通过已经放进去的父包的 __path__ 查找
+        if spec is None:
+            return importlib.import_module("ccxt")
+        package = LazyPackage(name, spec)
+        sys.modules[name] = package
+        parent, _, child = name.rpartition(".")
+        if parent:
+            setattr(sys.modules[parent], child, package)
+    return sys.modules["ccxt"]
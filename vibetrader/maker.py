@@ -0,0 +1,661 @@
+"""
+挂单 + 吃单对冲 (Maker/Taker)
+
+execute_dual_trade 两边都是市价单，timetest.py 的定时循环开一次、平一次要付四笔 taker 手续费。
+这里换一种执行方式：在一个交易所 (maker_venue，默认 Backpack) 挂 post-only 限价单，
+挂单每成交一部分，立刻在另一个交易所用市价单对冲同样的数量：
+
+- 挂单价跟着己方最优价 (买一 / 卖一)，盘口移动超过 reprice_bps 就撤单、按剩余量重挂；
+  post-only 被拒 (挂单价已经穿过盘口) 就按最新盘口重挂；
+- 成交从私有推送 (ExecutionService.tracker) 拿，没有推送就每 poll_interval 秒查一次订单；
+- 对冲单走 Priority.ROLLBACK 的专用线程，一笔对冲在路上时新来的成交先攒着，回报后合并成一笔，不会多对冲；
+- 内置延迟直方图：成交 (收到推送) -> 对冲单发出、成交 -> 对冲回报、每段裸敞口的持续时间；
+- 裸敞口有硬上限 (max_unhedged_ms)：从有成交没对冲开始计时，超时就撤掉挂单、不再对冲，
+  把没对冲的量在挂单交易所平掉 (RollbackEngine 逐级加码)；已经发出去的对冲请求打断不了，
+  所以实际的裸敞口 = 上限 + 最多一个在路上的对冲请求 + 平仓耗时，直方图里看得到；
+- 结果和 execute_dual_trade 一样是全有或全无：挂单超时后剩余量按 fallback_taker 用双边市价补齐，
+  最后凑不齐下单数量 (中止 / 补单失败) 就把已经对冲好的部分两边一起平掉。
+
+    ok, logs = execute_maker_taker(service, 'Long_BP_Short_HL', 0.001, 'BTC/USDC:USDC', 'BTC/USDC:USDC', True)
+    python -m vibetrader.maker --mock --rounds 20 --faults partial=0.5
+"""
+import argparse
+import bisect
+import concurrent.futures
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+
+from ccxt.base.errors import InvalidOrder, NetworkError, OrderNotFound, RateLimitExceeded
+
+from .ordertracker import new_client_order_id
+from .priority import Priority
+from .rollback import format_rollback, order_filled
+from .strategy import split_direction
+from .trading import VENUE_NAMES, execute_dual_trade
+
+EDGES_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+
+@dataclass
+class MakerConfig:
+    maker_venue: str = 'bp'          # 在哪边挂单，另一边吃单对冲
+    reprice_bps: float = 1.0         # 目标挂单价偏离当前挂单价多少基点就撤单重挂
+    improve_bps: float = 0.0         # 挂单价比己方最优价往里让多少基点 (0 = 挂在买一 / 卖一)
+    poll_interval: float = 0.2       # 看盘口 (没有推送时还要查订单) 的间隔，秒
+    max_unhedged_ms: float = 500.0   # 裸敞口最长持续多久，超过就撤单并在挂单交易所平掉没对冲的量
+    timeout: float = 30.0            # 挂单最多挂多久，秒
+    fallback_taker: bool = True      # 挂单超时后剩余量用双边市价补齐
+
+
+class LatencyHistogram:
+    """固定分桶的延迟直方图 (ms)，另外保留最近 keep 个样本算分位数"""
+
+    def __init__(self, edges=EDGES_MS, keep=1000):
+        self.edges = tuple(edges)
+        self.counts = [0] * (len(self.edges) + 1)
+        self.samples = deque(maxlen=keep)
+        self._lock = threading.Lock()
+
+    def add(self, ms):
+        with self._lock:
+            self.counts[bisect.bisect_left(self.edges, ms)] += 1
+            self.samples.append(ms)
+
+    def summary(self):
+        """{'count', 'p50_ms', 'p99_ms', 'max_ms'}，分位数按最近 keep 个样本算"""
+        with self._lock:
+            samples = sorted(self.samples)
+            summary = {'count': sum(self.counts)}
+        if samples:
+            summary.update(p50_ms=samples[len(samples) // 2],
+                           p99_ms=samples[min(len(samples) - 1, int(len(samples) * 0.99))], max_ms=samples[-1])
+        return summary
+
+    def format(self, title, width=30):
+        """多行文本：标题 + 分位数，每个非空分桶一行条形图"""
+        with self._lock:
+            counts = list(self.counts)
+        stats = self.summary()
+        lines = [title if not stats['count'] else
+                 f"{title}: {stats['count']} 次 | p50 {stats['p50_ms']:.1f}ms | p99 {stats['p99_ms']:.1f}ms | "
+                 f"max {stats['max_ms']:.1f}ms"]
+        labels = [f"≤{edge}ms" for edge in self.edges] + [f">{self.edges[-1]}ms"]
+        peak = max(counts) or 1
+        for label, count in zip(labels, counts):
+            if count:
+                lines.append(f"  {label:>8} {'█' * max(1, round(count / peak * width)):<{width}} {count}")
+        return "\n".join(lines)
+
+
+@dataclass
+class MakerQuote:
+    client_id: str
+    price: float
+    amount: float
+    id: str = None
+    order: dict = None     # 最近一次拿到的订单结构 (REST)
+    seen: float = 0.0      # 已经计入的累计成交量
+    fee: float = 0.0
+    done: bool = False
+
+
+@dataclass
+class MakerResult:
+    maker_venue: str
+    hedge_venue: str
+    symbol_maker: str
+    symbol_hedge: str
+    maker_side: str
+    hedge_side: str
+    amount: float
+    filled: float = 0.0       # 挂单累计成交
+    hedged: float = 0.0       # 对冲腿确认成交
+    unwound: float = 0.0      # 超过裸敞口上限后在挂单交易所平掉的
+    taker: float = 0.0        # 挂单超时后双边市价补齐的
+    quotes: list = field(default_factory=list)      # MakerQuote
+    reprices: int = 0
+    rejections: int = 0       # post-only 被拒
+    hedges: list = field(default_factory=list)      # 对冲腿的 LegResult
+    rollbacks: list = field(default_factory=list)   # RollbackResult (超限平掉 / 凑不齐时两边平掉)
+    fill_to_send_ms: list = field(default_factory=list)
+    fill_to_ack_ms: list = field(default_factory=list)
+    max_unhedged_ms: float = 0.0
+    timed_out: bool = False
+    aborted: str = None
+    complete: bool = False
+    logs: list = field(default_factory=list)
+
+    @property
+    def pairs(self):
+        """两边都成交了的数量 (挂单成交里已经对冲上的部分)"""
+        return min(self.filled - self.unwound, self.hedged)
+
+
+def opposite(side):
+    return 'sell' if side == 'buy' else 'buy'
+
+
+class _MakerRun:
+    """一笔挂单 + 对冲的运行状态；挂单线程、推送线程和对冲线程共用，改动都在 lock 里"""
+
+    def __init__(self, maker, result, config, priority, quotes):
+        self.maker = maker
+        self.service = maker.service
+        self.result = result
+        self.config = config
+        self.priority = priority
+        self.sources = quotes or {}
+        self.exchange = self.service.exchanges[result.maker_venue]
+        self.tracker = self.service.tracker
+        self.lock = threading.Lock()
+        self.idle = threading.Event()
+        self.idle.set()
+        self.quote = None          # 当前挂着的 MakerQuote
+        self.by_client_id = {}     # 客户端订单号 -> MakerQuote (撤掉的也留着，迟到的推送照样计入)
+        self.fills = []            # 还没发对冲的成交时刻 (perf_counter_ns)
+        self.inflight = 0.0
+        self.unhedged_since = 0    # 最早一笔没对冲完的成交时刻，0 表示没有裸敞口
+        self.draining = False
+        self.stuck = False         # 平仓也没平完，不再自动处理
+        self.hedge_price_at = 0.0
+
+    # --- 数量 ---
+    def dust(self, venue, symbol, amount):
+        return self.service.rollbacks.is_dust(venue, symbol, amount)
+
+    def remaining(self):
+        """还要挂多少 (下单数量 - 挂单累计成交)"""
+        with self.lock:
+            return self.result.amount - self.result.filled
+
+    def _open(self):
+        r = self.result
+        return r.filled - r.hedged - r.unwound - self.inflight
+
+    def _over_cap(self):
+        since = self.unhedged_since
+        return since and (time.perf_counter_ns() - since) / 1e6 > self.config.max_unhedged_ms
+
+    def _abort(self, reason):
+        if self.result.aborted is None:
+            self.result.aborted = reason
+
+    # --- 成交 ---
+    def on_update(self, entry):
+        """OrderTracker 的 listener：挂单的推送 (在推送线程里调用)"""
+        if entry.venue != self.result.maker_venue:
+            return
+        quote = self.by_client_id.get(entry.client_id)
+        if quote is None:
+            return
+        quote.fee = entry.fee
+        self.observe(quote, entry.filled)
+        if entry.done:
+            quote.done = True
+
+    def observe(self, quote, filled):
+        """挂单的累计成交量到了 filled：新增部分记为一笔待对冲的成交"""
+        if filled is None:
+            return
+        with self.lock:
+            delta = float(filled) - quote.seen
+            if delta <= 1e-12:
+                return
+            now = time.perf_counter_ns()
+            quote.seen = float(filled)
+            self.result.filled += delta
+            self.fills.append(now)
+            if not self.unhedged_since:
+                self.unhedged_since = now
+            if not self.draining:
+                self.draining = True
+                self.idle.clear()
+                self.maker.pool.submit(self._drain)
+
+    def _sync(self, quote, order):
+        """REST 回报 (下单 / 撤单 / 查单) 里的成交量和状态"""
+        if not order:
+            return
+        quote.order = order
+        self.observe(quote, order_filled(order))
+        if order.get('status') in ('closed', 'canceled', 'cancelled', 'expired', 'rejected'):
+            quote.done = True
+
+    # --- 对冲 ---
+    def _drain(self):
+        """把没对冲的成交量全部对冲掉 (一次一笔，回报后再看有没有新的成交)"""
+        errors = 0
+        r = self.result
+        while True:
+            with self.lock:
+                amount = self._open()
+                aborted = r.aborted is not None or self.stuck
+                if not aborted and self._over_cap():
+                    self._abort(f"裸敞口超过 {self.config.max_unhedged_ms:.0f}ms 上限")
+                    aborted = True
+                venue, symbol = (r.maker_venue, r.symbol_maker) if aborted else (r.hedge_venue, r.symbol_hedge)
+                if self.stuck or self.dust(venue, symbol, amount):
+                    self._settle()
+                    self.draining = False
+                    self.idle.set()
+                    return
+                self.inflight = amount
+                fills, self.fills = self.fills, []
+            if aborted:
+                self._unwind(amount)
+                continue
+            if self._hedge(amount, fills):
+                errors = 0
+            else:
+                errors += 1
+                time.sleep(min(0.05 * 2 ** (errors - 1), 0.5))
+
+    def _settle(self):
+        """剩下的没对冲量小到可以忽略：这一段裸敞口结束 (在 lock 里调用)"""
+        if self.unhedged_since and not self.inflight:
+            ms = (time.perf_counter_ns() - self.unhedged_since) / 1e6
+            self.result.max_unhedged_ms = max(self.result.max_unhedged_ms, ms)
+            self.maker.exposure.add(ms)
+            self.unhedged_since = 0
+
+    def _hedge(self, amount, fills):
+        r = self.result
+        leg = self.service.place(r.hedge_venue, r.symbol_hedge, r.hedge_side, amount, True, Priority.ROLLBACK)
+        filled = min(self.service.rollbacks.confirmed_fill(leg)[0], amount) if leg.ok else 0.0
+        covered = self.dust(r.hedge_venue, r.symbol_hedge, amount - filled)
+        for fill_ns in fills if covered else ():
+            send_ms, ack_ms = (leg.send_ns - fill_ns) / 1e6, (leg.ack_ns - fill_ns) / 1e6
+            r.fill_to_send_ms.append(send_ms)
+            r.fill_to_ack_ms.append(ack_ms)
+            self.maker.fill_to_send.add(send_ms)
+            self.maker.fill_to_ack.add(ack_ms)
+        with self.lock:
+            self.inflight = 0.0
+            r.hedged += filled
+            r.hedges.append(leg)
+            if not covered:
+                self.fills = fills + self.fills   # 没对冲完，下一笔对冲还按原来的成交时刻算延迟
+        return leg.ok
+
+    def _unwind(self, amount):
+        """超过裸敞口上限：不再对冲，在挂单交易所把没对冲的量平掉"""
+        r = self.result
+        exposure_ns = self.unhedged_since or None
+        rollback = self.service.rollbacks.flatten(r.maker_venue, r.symbol_maker, opposite(r.maker_side), amount,
+                                                  exposure_ns=exposure_ns, reduce_only=False)
+        with self.lock:
+            self.inflight = 0.0
+            r.unwound += rollback.filled
+            r.rollbacks.append(rollback)
+            if not rollback.flat:
+                self.stuck = True
+
+    # --- 挂单 ---
+    def top(self):
+        """(买一, 卖一)：有推送行情 (quotes) 就读缓存，否则查一次 ticker"""
+        r = self.result
+        source = self.sources.get(r.maker_venue)
+        if source is not None:
+            ticker = source.fetch_ticker(r.symbol_maker)
+        else:
+            ticker = self.service.call(r.maker_venue, self.exchange.fetch_ticker, r.symbol_maker,
+                                       priority=Priority.MARKET_DATA)
+        self.service.note_price(r.maker_venue, r.symbol_maker, ticker.get('last'))
+        return ticker['bid'], ticker['ask']
+
+    def refresh_hedge_price(self):
+        """对冲腿 (Hyperliquid 市价单) 要参考价：每隔半个有效期刷新一次，下对冲单时不用临时查"""
+        r = self.result
+        if time.monotonic() - self.hedge_price_at < self.service.price_max_age / 2:
+            return
+        source = self.sources.get(r.hedge_venue)
+        exchange = self.service.exchanges[r.hedge_venue]
+        if source is not None:
+            ticker = source.fetch_ticker(r.symbol_hedge)
+        else:
+            ticker = self.service.call(r.hedge_venue, exchange.fetch_ticker, r.symbol_hedge,
+                                       priority=Priority.MARKET_DATA)
+        self.service.note_price(r.hedge_venue, r.symbol_hedge, ticker.get('last'))
+        self.hedge_price_at = time.monotonic()
+
+    def quote_price(self, bid, ask):
+        r = self.result
+        improve = self.config.improve_bps / 1e4
+        price = bid * (1 + improve) if r.maker_side == 'buy' else ask * (1 - improve)
+        if hasattr(self.exchange, 'price_to_precision'):
+            price = float(self.exchange.price_to_precision(r.symbol_maker, price))
+        if r.maker_side == 'buy' and price >= ask or r.maker_side == 'sell' and price <= bid:
+            price = bid if r.maker_side == 'buy' else ask   # 让过头了会被 post-only 拒掉
+        return price
+
+    def post(self, amount, price):
+        r = self.result
+        if hasattr(self.exchange, 'amount_to_precision'):
+            amount = float(self.exchange.amount_to_precision(r.symbol_maker, amount))
+        quote = MakerQuote(new_client_order_id(r.maker_venue), price, amount)
+        self.by_client_id[quote.client_id] = quote
+        if self.tracker is not None:
+            self.tracker.track(r.maker_venue, quote.client_id, r.symbol_maker, r.maker_side, amount)
+        try:
+            order = self.service.call(r.maker_venue, self.exchange.create_order, r.symbol_maker, 'limit',
+                                      r.maker_side, amount, price, {'postOnly': True, 'clientOrderId': quote.client_id},
+                                      priority=self.priority)
+        except InvalidOrder as e:
+            # post-only 会立即成交 (盘口已经动了)：下一轮按新盘口重挂
+            r.rejections += 1
+            self._reject(quote, e)
+            return
+        except RateLimitExceeded as e:
+            self._reject(quote, e)
+            return
+        except NetworkError as e:
+            # 请求可能已经到了交易所：只有推送能告诉我们这张单到底挂没挂上
+            self._reject(quote, e)
+            if not self._recover(quote):
+                self._abort(f"挂单请求结果未知 ({e})")
+            return
+        except Exception as e:
+            self._reject(quote, e)
+            self._abort(f"挂单失败: {e}")
+            return
+        quote.id = str(order['id'])
+        if self.tracker is not None:
+            self.tracker.bind(r.maker_venue, quote.client_id, order)
+        r.quotes.append(quote)
+        self.quote = quote
+        self._sync(quote, order)
+
+    def _reject(self, quote, error):
+        quote.done = True
+        if self.tracker is not None:
+            self.tracker.reject(self.result.maker_venue, quote.client_id, error)
+
+    def _recover(self, quote):
+        """挂单请求超时：等推送确认它有没有挂上，挂上了就当正常挂单继续管"""
+        if self.tracker is None:
+            return False
+        try:
+            entry = self.tracker.wait(self.result.maker_venue, quote.client_id,
+                                      states=('open', 'partially_filled', 'filled', 'cancelled'), timeout=1.0,
+                                      require_push=True)
+        except TimeoutError:
+            return False
+        quote.id, quote.done = entry.id, False
+        self.result.quotes.append(quote)
+        self.quote = quote
+        self.on_update(entry)
+        return True
+
+    def poll(self, quote):
+        """没有私有推送时按订单号查成交"""
+        try:
+            order = self.service.call(self.result.maker_venue, self.exchange.fetch_order, quote.id,
+                                      self.result.symbol_maker, priority=self.priority)
+        except Exception:
+            return   # 下一轮再查
+        self._sync(quote, order)
+
+    def cancel(self, quote):
+        """撤单并确认最终成交量；确认不了就中止 (不能在可能还挂着的单旁边再挂一张)"""
+        r = self.result
+        try:
+            self._sync(quote, self.service.call(r.maker_venue, self.exchange.cancel_order, quote.id, r.symbol_maker,
+                                                priority=Priority.CLOSE))
+        except OrderNotFound:
+            pass   # 已经全部成交 (或者已经撤掉)
+        except Exception:
+            pass   # 下面按推送 / 订单号确认
+        if self.tracker is not None:
+            try:
+                entry = self.tracker.wait(r.maker_venue, quote.client_id, timeout=1.0)
+                self.on_update(entry)
+            except TimeoutError:
+                pass
+        if not quote.done:
+            try:
+                self._sync(quote, self.service.call(r.maker_venue, self.exchange.fetch_order, quote.id, r.symbol_maker,
+                                                    priority=Priority.CLOSE))
+            except Exception:
+                pass
+        if not quote.done:
+            self._abort(f"撤单 {quote.id} 没有确认")
+        if self.quote is quote:
+            self.quote = None
+
+    def check_cap(self):
+        with self.lock:
+            if self.result.aborted is None and self._over_cap():
+                self._abort(f"裸敞口超过 {self.config.max_unhedged_ms:.0f}ms 上限")
+            if self.result.aborted is not None and not self.draining and not self.stuck:
+                # 对冲线程空闲时没人处理剩下的量，叫它起来在挂单交易所平掉
+                self.draining = True
+                self.idle.clear()
+                self.maker.pool.submit(self._drain)
+            return self.result.aborted is not None
+
+    def run(self):
+        r, config = self.result, self.config
+        deadline = time.monotonic() + config.timeout
+        if self.tracker is not None:
+            self.tracker.listeners.append(self.on_update)
+        try:
+            while not self.check_cap():
+                if self.dust(r.maker_venue, r.symbol_maker, self.remaining()):
+                    break
+                if time.monotonic() > deadline:
+                    r.timed_out = True
+                    break
+                try:
+                    self.refresh_hedge_price()
+                    bid, ask = self.top()
+                except Exception:
+                    time.sleep(config.poll_interval)
+                    continue
+                price = self.quote_price(bid, ask)
+                quote = self.quote
+                if quote is not None and quote.done:
+                    self.quote = quote = None   # 全部成交或者被交易所撤掉了
+                if quote is not None and abs(price - quote.price) / quote.price * 1e4 > config.reprice_bps:
+                    self.cancel(quote)
+                    r.reprices += 1
+                    continue   # 撤单确认后的剩余量按最新成交重新算
+                if quote is None:
+                    # 看盘口的那个请求也可能让上一张挂单成交完，剩余量在这里重新算
+                    remaining = self.remaining()
+                    if self.dust(r.maker_venue, r.symbol_maker, remaining):
+                        break
+                    self.post(remaining, price)
+                elif self.tracker is None:
+                    self.poll(quote)
+                time.sleep(config.poll_interval)
+        finally:
+            if self.quote is not None:
+                self.cancel(self.quote)
+            self.check_cap()
+            self.idle.wait(config.max_unhedged_ms / 1000 + self.service.rollbacks.budget + 5)
+            if self.tracker is not None:
+                self.tracker.listeners.remove(self.on_update)
+
+
+class MakerTaker:
+    def __init__(self, service, keep=200):
+        """
+        service: ExecutionService (挂单 / 撤单走各交易所的常驻线程，对冲走 ROLLBACK 专用线程)
+        keep: 保留最近多少笔 MakerResult
+        """
+        self.service = service
+        self.fill_to_send = LatencyHistogram()   # 挂单成交 -> 对冲单发出
+        self.fill_to_ack = LatencyHistogram()    # 挂单成交 -> 对冲单回报
+        self.exposure = LatencyHistogram()       # 每段裸敞口的持续时间
+        self.history = deque(maxlen=keep)
+        self.pool = concurrent.futures.ThreadPoolExecutor(8, thread_name_prefix="maker-hedge")
+
+    def execute(self, direction, amount, symbol_bp, symbol_hl, priority=Priority.OPEN, config=None, quotes=None,
+                store=None, state_id=1):
+        """
+        挂单 + 对冲执行一笔双边交易 (实盘)，返回 MakerResult。
+        quotes: {'bp': 推送行情客户端, ...} (marketdata / hub 的 client)，给了就不用 REST 查盘口
+        store: 挂单超时后用 execute_dual_trade 补单时记流水
+        """
+        config = config or MakerConfig()
+        sides = dict(zip(('bp', 'hl'), split_direction(direction)))
+        symbols = {'bp': symbol_bp, 'hl': symbol_hl}
+        maker_venue = config.maker_venue
+        hedge_venue = 'hl' if maker_venue == 'bp' else 'bp'
+        result = MakerResult(maker_venue, hedge_venue, symbols[maker_venue], symbols[hedge_venue], sides[maker_venue],
+                             sides[hedge_venue], float(amount))
+        _MakerRun(self, result, config, priority, quotes).run()
+
+        # 挂单超时 (不是中止)：剩余量两边吃单补齐
+        remaining = result.amount - result.pairs
+        if (result.timed_out and result.aborted is None and config.fallback_taker
+                and not self.service.rollbacks.is_dust(maker_venue, result.symbol_maker, remaining)
+                and not self.service.rollbacks.is_dust(hedge_venue, result.symbol_hedge, remaining)):
+            success, logs = execute_dual_trade(self.service, direction, remaining, symbol_bp, symbol_hl, True, store,
+                                               priority, state_id)
+            result.logs.append(f"⌛ 挂单 {config.timeout:g}s 只成交了 {result.pairs:g}，剩余 {remaining:g} 双边吃单补齐")
+            result.logs.extend(logs)
+            if success:
+                result.taker = remaining
+        result.complete = self.service.rollbacks.is_dust(hedge_venue, result.symbol_hedge,
+                                                         result.amount - result.pairs - result.taker)
+        if not result.complete and result.pairs > 0:
+            self._unwind_pairs(result)
+        self.history.append(result)
+        return result
+
+    def _unwind_pairs(self, result):
+        """凑不齐下单数量：已经对冲好的部分两边一起平掉，和 execute_dual_trade 失败时一样不留仓位"""
+        pairs = result.pairs
+        jobs = [(result.maker_venue, result.symbol_maker, opposite(result.maker_side)),
+                (result.hedge_venue, result.symbol_hedge, opposite(result.hedge_side))]
+        futures = [self.pool.submit(self.service.rollbacks.flatten, venue, symbol, side, pairs, reduce_only=False)
+                   for venue, symbol, side in jobs]
+        result.rollbacks.extend(f.result() for f in futures)
+
+    def summary(self):
+        """{'count', 'complete', 'aborted', 'fill_to_send', 'fill_to_ack', 'exposure'} (后三个是直方图 summary)"""
+        results = list(self.history)
+        return {'count': len(results), 'complete': sum(r.complete for r in results),
+                'aborted': sum(r.aborted is not None for r in results), 'fill_to_send': self.fill_to_send.summary(),
+                'fill_to_ack': self.fill_to_ack.summary(), 'exposure': self.exposure.summary()}
+
+    def format_histograms(self):
+        return "\n".join([self.fill_to_send.format("📤 成交 -> 对冲发出"), self.fill_to_ack.format("📥 成交 -> 对冲回报"),
+                          self.exposure.format("🫥 裸敞口持续")])
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False)
+
+
+def _percentile(samples, q):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * q))]
+
+
+def format_maker(result):
+    """挂单 + 对冲的日志行"""
+    maker, hedge = VENUE_NAMES[result.maker_venue], VENUE_NAMES[result.hedge_venue]
+    logs = [f"🪤 {maker} 挂单 {result.maker_side} {result.amount:g}：挂了 {len(result.quotes)} 次 | "
+            f"改价 {result.reprices} 次 | post-only 被拒 {result.rejections} 次 | maker 成交 {result.filled:g}"]
+    if result.hedges:
+        line = (f"🔁 {hedge} 对冲 {result.hedge_side} {result.hedged:g}，{len(result.hedges)} 笔 | "
+                f"最长裸敞口 {result.max_unhedged_ms:.0f}ms")
+        if result.fill_to_ack_ms:
+            line += (f" | 成交 -> 对冲发出 p50 {_percentile(result.fill_to_send_ms, 0.5):.1f}ms"
+                     f" | 成交 -> 对冲回报 p50 {_percentile(result.fill_to_ack_ms, 0.5):.1f}ms"
+                     f" / max {max(result.fill_to_ack_ms):.1f}ms")
+        logs.append(line)
+    if result.aborted:
+        logs.append(f"⛔ 中止：{result.aborted}，撤掉挂单、没对冲的部分在 {maker} 平掉")
+    logs.extend(result.logs)
+    if result.complete:
+        logs.append(f"✅ 挂单+对冲完成! 挂单成交 {result.pairs:g} | 吃单补齐 {result.taker:g}")
+    elif result.pairs > 0:
+        logs.append(f"↩️ 没凑齐 {result.amount:g}，已对冲的 {result.pairs:g} 两边一起平掉")
+    for rollback in result.rollbacks:
+        logs.append(format_rollback(rollback, VENUE_NAMES[rollback.venue]))
+    return logs
+
+
+def execute_maker_taker(service, direction, amount, symbol_bp, symbol_hl, is_real, store=None,
+                        priority=Priority.OPEN, state_id=1, config=None, quotes=None):
+    """
+    execute_dual_trade 的挂单版本，参数和返回值 (success, log_msgs) 一样，可以直接替换。
+    config: MakerConfig (在哪边挂单、改价阈值、裸敞口上限等)
+    模拟模式 (is_real=False) 没有真实盘口可挂，照常走 execute_dual_trade
+    """
+    if not is_real:
+        return execute_dual_trade(service, direction, amount, symbol_bp, symbol_hl, is_real, store, priority, state_id)
+    result = service.maker.execute(direction, amount, symbol_bp, symbol_hl, priority, config, quotes, store, state_id)
+    if store is not None:
+        trade_ref = store.journal_trade(direction, result.hedges, result.complete, symbol_bp, symbol_hl, amount,
+                                        state_id=state_id)
+        for quote in result.quotes:
+            if quote.seen:
+                store.record_fill(trade_ref, result.maker_venue, result.symbol_maker, result.maker_side,
+                                  {'id': quote.id, 'filled': quote.seen, 'average': quote.price,
+                                   'fee': {'cost': quote.fee or ((quote.order or {}).get('fee') or {}).get('cost')}})
+        for rollback in result.rollbacks:
+            for order in rollback.orders:
+                store.record_fill(trade_ref, rollback.venue, rollback.symbol, rollback.side, order)
+    return result.complete, format_maker(result)
+
+
+def demo(rounds=10, amount=0.001, maker_venue='bp', latency="lognormal:30:0.5", faults="partial=0.5",
+         max_unhedged_ms=500.0, timeout=10.0, push=True, seed=0):
+    """模拟交易所上反复开平仓，打印每一笔的日志和延迟直方图"""
+    from .execution import ExecutionService
+    from .mockexchange import mock_exchanges
+    from .ordertracker import OrderTracker
+
+    exchanges = mock_exchanges(latency=latency, faults=faults, seed=seed)
+    tracker = OrderTracker.from_exchanges(exchanges) if push else None
+    service = ExecutionService(exchanges, tracker=tracker)
+    config = MakerConfig(maker_venue=maker_venue, max_unhedged_ms=max_unhedged_ms, timeout=timeout,
+                         poll_interval=0.05)
+    direction = "Long_BP_Short_HL"
+    started = time.perf_counter()
+    try:
+        for i in range(rounds):
+            success, logs = execute_maker_taker(service, direction, amount, "BTC/USDC:USDC", "BTC/USDC:USDC", True,
+                                                priority=Priority.OPEN if i % 2 == 0 else Priority.CLOSE, config=config)
+            print(f"--- 第 {i + 1} 笔 {direction} {'✅' if success else '❌'}")
+            print("\n".join(logs))
+            if success:
+                direction = "Short_BP_Long_HL" if direction == "Long_BP_Short_HL" else "Long_BP_Short_HL"
+    finally:
+        service.shutdown()
+    stats = service.maker.summary()
+    print(f"🪤 {stats['count']} 笔，完成 {stats['complete']} 笔，中止 {stats['aborted']} 笔，"
+          f"用时 {time.perf_counter() - started:.1f} 秒")
+    print(service.maker.format_histograms())
+    for venue, ex in exchanges.items():
+        print(f"{venue}: 请求 {ex.request_count} 次 | 注入故障 {ex.fault_count} | 持仓 {ex.positions} | "
+              f"现金 {ex.cash:.2f}")
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="挂单 + 吃单对冲 (模拟交易所演练)")
+    parser.add_argument("--mock", action="store_true", help="连本地模拟交易所 (目前只支持这个)")
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--amount", type=float, default=0.001)
+    parser.add_argument("--maker", default="bp", choices=["bp", "hl"], help="在哪边挂单")
+    parser.add_argument("--latency", default="lognormal:30:0.5")
+    parser.add_argument("--faults", default="partial=0.5", help="partial 是挂单被部分成交的概率")
+    parser.add_argument("--max-unhedged-ms", type=float, default=MakerConfig.max_unhedged_ms)
+    parser.add_argument("--timeout", type=float, default=10.0, help="挂单最多挂多久 (秒)")
+    parser.add_argument("--no-push", action="store_true", help="不用私有推送，按订单号轮询成交")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    if not args.mock:
+        parser.error("实盘请在 timeloop (--maker) 或 timetest.py 里使用，这里只做模拟演练：加 --mock")
+    demo(args.rounds, args.amount, args.maker, args.latency, args.faults, args.max_unhedged_ms, args.timeout,
+         not args.no_push, args.seed)
+
+
+if __name__ == "__main__":
+    main()
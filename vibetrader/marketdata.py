@@ -0,0 +1,299 @@
+"""
+WebSocket 推送行情 (ccxt.pro watch_order_book / watch_ticker)
+
+REST 轮询每次都要一个 HTTP 往返，还要 sleep 2~3 秒，价差天然是旧的。
+MarketDataStream 在后台线程里跑一个 asyncio 循环，订阅 Backpack 和
+Hyperliquid 的推送，断线后自动重连并重新订阅，最新的盘口顶端缓存在内存里。
+
+对同步代码 (Streamlit 脚本) 来说，stream.client('bp') 返回一个只有
+fetch_ticker(symbol) 的小对象，可以直接替换 ccxt 的 backpack / hyperliquid：
+
+    quote_bp = stream.client('bp')
+    ticker_bp = quote_bp.fetch_ticker('BTC/USDC')   # 读缓存，不发请求
+
+录制与回放：record_dir 会把收到的原始帧写成 {venue}.frames.jsonl，
+配合 vibetrader.replay_server 就能在本地离线回放测试：
+
+    python -m vibetrader.marketdata --record recordings --seconds 60
+    python -m vibetrader.replay_server recordings --port 8765
+    python -m vibetrader.marketdata --replay recordings --ws ws://127.0.0.1:8765
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+
+
+logger = logging.getLogger("vibetrader.marketdata")
+
+VENUES = {'bp': 'backpack', 'hl': 'hyperliquid'}
+
+
+def override_ws_urls(exchange, url):
+    """把 exchange.urls['api']['ws'] 里所有地址都指向 url (本地回放服务器)"""
+    ws = exchange.urls['api']['ws']
+    if isinstance(ws, str):
+        exchange.urls['api']['ws'] = url
+    else:
+        for key in ws:
+            ws[key] = url
+
+
+def book_to_ticker(symbol, book):
+    """把盘口顶端转换成 ticker 结构，'last' 用中间价代替"""
+    bid = book['bids'][0][0] if book['bids'] else None
+    ask = book['asks'][0][0] if book['asks'] else None
+    if bid is not None and ask is not None:
+        last = (bid + ask) / 2
+    else:
+        last = bid if bid is not None else ask
+    return {
+        'symbol': symbol,
+        'timestamp': book.get('timestamp'),
+        'bid': bid,
+        'bidVolume': book['bids'][0][1] if book['bids'] else None,
+        'ask': ask,
+        'askVolume': book['asks'][0][1] if book['asks'] else None,
+        'last': last,
+    }
+
+
+class FrameRecorder:
+    """包住 exchange.handle_message，把每一帧原始消息追加写入 jsonl"""
+
+    def __init__(self, path):
+        self.file = open(path, "a", encoding="utf-8")
+
+    def wrap(self, handle_message):
+        def recording_handle_message(client, message):
+            self.file.write(json.dumps({"t": int(time.time() * 1000), "msg": message}, separators=(",", ":")) + "\n")
+            return handle_message(client, message)
+        return recording_handle_message
+
+    def close(self):
+        self.file.close()
+
+
+class StreamClient:
+    """同步的 fetch_ticker 接口，方便直接替换 ccxt 客户端"""
+
+    def __init__(self, stream, venue):
+        self.stream = stream
+        self.venue = venue
+
+    def fetch_ticker(self, symbol):
+        return self.stream.fetch_ticker(self.venue, symbol)
+
+    def fetch_order_book(self, symbol, limit=None):
+        return self.stream.fetch_order_book(self.venue, symbol)
+
+
+class MarketDataStream:
+    def __init__(self, mode="book", depth=5, ws_urls=None, markets=None, record_dir=None,
+                 first_quote_timeout=10.0):
+        """
+        mode: 'book' 订阅盘口 (有 bid/ask)，'ticker' 订阅 ticker 推送
+        ws_urls: {'bp': url, 'hl': url}，用于指向本地回放服务器
+        markets: {'bp': markets, 'hl': markets}，离线回放时跳过 REST load_markets
+        """
+        self.mode = mode
+        self.depth = depth
+        self.ws_urls = ws_urls or {}
+        self.markets = markets or {}
+        self.record_dir = record_dir
+        self.first_quote_timeout = first_quote_timeout
+
+        self.exchanges = {}
+        self.recorders = []
+        self.quotes = {}          # (venue, symbol) -> ticker dict
+        self.books = {}           # (venue, symbol) -> 最新盘口 (book 模式，前 depth 档的拷贝)
+        self.listeners = []       # callback(venue, symbol, ticker)，在行情线程里调用
+        self.reconnects = 0
+        self._tasks = {}
+        self._cond = threading.Condition()
+        self._loop = None
+        self._thread = None
+        self._running = False
+
+    # --- 生命周期 ---
+    def start(self):
+        if self._thread is not None:
+            return self
+        self._running = True
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="marketdata", daemon=True)
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._open(), self._loop).result()
+        return self
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._running = False
+        asyncio.run_coroutine_threadsafe(self._close(), self._loop).result(timeout=10)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=10)
+        self._thread = None
+        for recorder in self.recorders:
+            recorder.close()
+
+    async def _open(self):
+        import ccxt.pro as ccxtpro   # 只在启动推送时导入 (ordertracker 也从这里取 VENUES，不该连带导入 ccxt.pro)
+
+        for venue, exchange_id in VENUES.items():
+            exchange = getattr(ccxtpro, exchange_id)({'enableRateLimit': True})
+            if venue in self.ws_urls:
+                override_ws_urls(exchange, self.ws_urls[venue])
+            if venue in self.markets:
+                exchange.set_markets(self.markets[venue])
+            if self.record_dir:
+                os.makedirs(self.record_dir, exist_ok=True)
+                recorder = FrameRecorder(os.path.join(self.record_dir, f"{venue}.frames.jsonl"))
+                exchange.handle_message = recorder.wrap(exchange.handle_message)
+                self.recorders.append(recorder)
+            self.exchanges[venue] = exchange
+
+    async def _close(self):
+        for task in self._tasks.values():
+            task.cancel()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+        for exchange in self.exchanges.values():
+            await exchange.close()
+
+    # --- 订阅 ---
+    def subscribe(self, venue, symbol):
+        """订阅一个交易对 (线程安全，重复订阅会被忽略)"""
+        if self._loop is None:
+            self.start()
+        self._loop.call_soon_threadsafe(self._ensure_task, venue, symbol)
+
+    def _ensure_task(self, venue, symbol):
+        key = (venue, symbol)
+        if key not in self._tasks:
+            self._tasks[key] = self._loop.create_task(self._watch(venue, symbol))
+
+    async def _watch(self, venue, symbol):
+        """单个订阅的循环：出错后退避重连，重新订阅"""
+        exchange = self.exchanges[venue]
+        backoff = 0.5
+        while self._running:
+            try:
+                if self.record_dir and venue not in self.markets:
+                    await self._save_markets(venue)
+                if self.mode == "book":
+                    book = await exchange.watch_order_book(symbol, self.depth)
+                    ticker = book_to_ticker(symbol, book)
+                    # ccxt.pro 的盘口对象会被原地修改，留一份前 depth 档的拷贝给读端
+                    book = {'bids': [level[:2] for level in book['bids'][:self.depth]],
+                            'asks': [level[:2] for level in book['asks'][:self.depth]],
+                            'timestamp': book.get('timestamp')}
+                else:
+                    book = None
+                    ticker = dict(await exchange.watch_ticker(symbol))
+                backoff = 0.5
+                self._publish(venue, symbol, ticker, book)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if not self._running:
+                    break
+                self.reconnects += 1
+                logger.warning(f"⚠️ {venue} {symbol} 推送中断，{backoff:.1f}秒后重连: {e}")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 10.0)
+
+    async def _save_markets(self, venue):
+        """录制时顺便保存 markets，回放时就不需要访问 REST 接口"""
+        markets = await self.exchanges[venue].load_markets()
+        with open(os.path.join(self.record_dir, f"{venue}.markets.json"), "w", encoding="utf-8") as f:
+            json.dump(markets, f)
+        self.markets[venue] = markets
+
+    def _publish(self, venue, symbol, ticker, book=None):
+        ticker['recv_ms'] = int(time.time() * 1000)
+        with self._cond:
+            self.quotes[(venue, symbol)] = ticker
+            if book is not None:
+                book['recv_ms'] = ticker['recv_ms']
+                self.books[(venue, symbol)] = book
+            self._cond.notify_all()
+        for listener in self.listeners:
+            listener(venue, symbol, ticker)
+
+    # --- 读取 ---
+    def fetch_ticker(self, venue, symbol, timeout=None):
+        """读取最新推送；第一次读取会自动订阅并等待首条行情"""
+        return self._latest(self.quotes, venue, symbol, timeout)
+
+    def fetch_order_book(self, venue, symbol, timeout=None):
+        """读取最新推送的盘口 (只有 mode='book' 才有)"""
+        if self.mode != "book":
+            raise ValueError("fetch_order_book 需要 mode='book'")
+        return self._latest(self.books, venue, symbol, timeout)
+
+    def _latest(self, cache, venue, symbol, timeout):
+        key = (venue, symbol)
+        value = cache.get(key)
+        if value is not None:
+            return value
+        self.subscribe(venue, symbol)
+        timeout = self.first_quote_timeout if timeout is None else timeout
+        with self._cond:
+            if not self._cond.wait_for(lambda: key in cache, timeout=timeout):
+                raise TimeoutError(f"{venue} {symbol} 在 {timeout} 秒内没有收到推送行情")
+            return cache[key]
+
+    def client(self, venue):
+        return StreamClient(self, venue)
+
+
+def load_recorded_markets(record_dir):
+    """读取录制时保存的 markets，用于离线回放"""
+    markets = {}
+    for venue in VENUES:
+        path = os.path.join(record_dir, f"{venue}.markets.json")
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                markets[venue] = json.load(f)
+    return markets
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="WebSocket 推送行情监控 / 录制 / 回放")
+    parser.add_argument("--symbol-bp", default="BTC/USDC")
+    parser.add_argument("--symbol-hl", default="BTC/USDC")
+    parser.add_argument("--mode", choices=["book", "ticker"], default="book")
+    parser.add_argument("--record", metavar="DIR", help="把原始帧录制到目录")
+    parser.add_argument("--replay", metavar="DIR", help="使用录制目录里的 markets 离线回放")
+    parser.add_argument("--ws", help="回放服务器地址，如 ws://127.0.0.1:8765")
+    parser.add_argument("--seconds", type=float, default=0, help="运行多少秒后退出 (0 = 一直运行)")
+    args = parser.parse_args(argv)
+
+    ws_urls, markets = {}, {}
+    if args.ws:
+        ws_urls = {venue: f"{args.ws.rstrip('/')}/{venue}" for venue in VENUES}
+    if args.replay:
+        markets = load_recorded_markets(args.replay)
+
+    stream = MarketDataStream(mode=args.mode, ws_urls=ws_urls, markets=markets, record_dir=args.record).start()
+    quote_bp, quote_hl = stream.client('bp'), stream.client('hl')
+    started = time.time()
+    try:
+        while not args.seconds or time.time() - started < args.seconds:
+            t_bp = quote_bp.fetch_ticker(args.symbol_bp)
+            t_hl = quote_hl.fetch_ticker(args.symbol_hl)
+            diff = t_bp['last'] - t_hl['last']
+            diff_pct = (diff / t_bp['last']) * 100
+            print(f"Backpack: {t_bp['last']:.2f} | Hyper: {t_hl['last']:.2f} | 差价: ${diff:.2f} | {diff_pct:.4f}%")
+            time.sleep(0.5)
+    except KeyboardInterrupt:
+        print("\n🛑 停止监控。")
+    finally:
+        stream.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+市场信息的磁盘缓存
+
+timetest.py 在 init_exchanges 里对两边各调一次 load_markets()，其他脚本在第一次请求时隐式加载。
+每次进程启动 (包括 Streamlit 的 cache_resource 失效、崩溃后重启) 都要重新下载几百个市场，
+花掉好几秒——崩溃重启后最急着发的那笔平仓单也得先等这一步。
+
+load_markets_cached() 把 markets / currencies 连同交易所需要的辅助字段
+(ccxt 的 options['marketHelperProps'])，按 (交易所, ccxt 版本) 存成一个 JSON 文件：
+
+- 缓存在 ttl 之内：直接 set_markets，不发请求；
+- 缓存过期：先用旧的 (市场信息很少变)，后台线程重新下载后再替换并写回磁盘；
+- 没有缓存或 ccxt 升级了：同步下载一次并写入缓存。
+
+交易对都按 ccxt 的写法直接用 (永续是 'BTC/USDC:USDC')，加载完就是现成的 exchange.markets 字典查找；
+两边叫法不一致的永续合约由 symbols.shared_perps 对齐 (scanner 在用)。
+"""
+import json
+import os
+import threading
+import time
+
+import ccxt
+
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "vibetrader", "markets")
+DEFAULT_TTL = 6 * 3600   # 秒
+
+
+def cache_path(exchange_id, directory=None):
+    return os.path.join(directory or CACHE_DIR, f"{exchange_id}-ccxt{ccxt.__version__}.json")
+
+
+def read_cache(exchange_id, directory=None):
+    """读不到或文件损坏都返回 None"""
+    try:
+        with open(cache_path(exchange_id, directory), encoding="utf-8") as f:
+            payload = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if payload.get('ccxt') != ccxt.__version__ or not payload.get('markets'):
+        return None
+    return payload
+
+
+def write_cache(exchange, directory=None):
+    """把已加载的市场信息写入缓存 (先写临时文件再 rename，其他进程不会读到半个文件)"""
+    path = cache_path(exchange.id, directory)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    helpers = {name: exchange.options.get(name) for name in exchange.options.get('marketHelperProps', [])}
+    payload = {
+        'ccxt': ccxt.__version__,
+        'saved_at': time.time(),
+        'markets': exchange.markets,
+        'currencies': exchange.currencies,
+        'helpers': helpers,
+    }
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(payload, f, separators=(",", ":"))
+    os.replace(tmp, path)
+    return payload
+
+
+def apply_cache(exchange, payload):
+    exchange.set_markets(payload['markets'], payload.get('currencies') or None)
+    for name, value in payload.get('helpers', {}).items():
+        if value is not None:
+            exchange.options[name] = value
+    exchange.markets_saved_at = payload.get('saved_at')
+
+
+def _refresh(exchange, directory):
+    """用一个不带密钥的新实例重新下载，成功后替换到 exchange 上并写回缓存"""
+    fresh = type(exchange)({'enableRateLimit': True})
+    try:
+        fresh.load_markets()
+        payload = write_cache(fresh, directory)
+    except Exception as e:
+        print(f"⚠️ {exchange.id} 后台刷新市场信息失败，继续使用缓存: {e}")
+        return
+    apply_cache(exchange, payload)
+
+
+def load_markets_cached(exchange, ttl=DEFAULT_TTL, directory=None, background=True):
+    """
+    优先从磁盘缓存加载市场信息，返回 exchange.markets。
+    background=False 时缓存过期也同步刷新 (给一次性的命令行工具用)。
+    """
+    payload = read_cache(exchange.id, directory)
+    if payload is None:
+        exchange.load_markets()
+        payload = write_cache(exchange, directory)
+        exchange.markets_saved_at = payload['saved_at']
+        return exchange.markets
+    apply_cache(exchange, payload)
+    if time.time() - payload.get('saved_at', 0) > ttl:
+        if background:
+            threading.Thread(target=_refresh, args=(exchange, directory), name=f"markets-{exchange.id}",
+                             daemon=True).start()
+        else:
+            _refresh(exchange, directory)
+    return exchange.markets
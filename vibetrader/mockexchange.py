@@ -0,0 +1,719 @@
+"""
+本地模拟交易所 (ccxt 接口子集，进程内)
+
+测 execute_dual_trade、单边回滚、11_ghost_order.py 以前只能拿真金白银和真实 API Key。
+MockExchange 实现了我们用到的那部分 ccxt 接口：
+
+    load_markets / fetch_ticker / fetch_tickers / fetch_order_book / create_order /
+    cancel_order / fetch_order / fetch_open_orders / fetch_orders / fetch_balance / fetch_positions
+
+(和真实的 Backpack 一样，backpack 模拟盘的 has['fetchOrder'] 为 False，按客户端订单号查单要翻挂单 / 历史订单)，
+以及私有推送：订单、成交、持仓变化时回调 push_listeners (ordertracker.OrderTracker.attach)，
+默认同步推送，push_delay_ms 可以让推送晚到 (模拟推送比 REST 回报慢、甚至比超时等待还慢)。
+
+并且可以配置：
+- 延迟分布 (LatencyModel)：fixed / uniform / lognormal，带随机种子，结果可复现；
+- 故障注入 (FaultConfig)：429、超时 (成交前 / 成交后回报丢失)、余额不足、部分成交，抛出的是真正的 ccxt 异常类型；
+- 价格路径 (PricePath)：按时间插值的脚本化价格，或者带种子的随机游走。
+
+    exchanges = mock_exchanges(spread_pct=PricePath.from_points([(0, 0), (5, 0.02), (10, 0)]))
+    python -m vibetrader.engine --mock --mock-latency lognormal:30:0.5 --mock-faults rate_limit=0.02,partial=0.05
+    python -m vibetrader.mockexchange --trades 200       # 离线浸泡测试 execute_dual_trade
+    python -m vibetrader.mockexchange --check            # 回报丢失 / 推送迟到这几个固定场景，最后仓位必须是平的
+"""
+import argparse
+import itertools
+import random
+import threading
+import time
+from dataclasses import dataclass
+
+import numpy as np
+from ccxt.base.errors import (ArgumentsRequired, InsufficientFunds, InvalidOrder, OrderNotFound, RateLimitExceeded,
+                              RequestTimeout)
+
+
+# --- 价格路径 ---
+class PricePath:
+    """t (秒，从模拟开始算) -> 价格，分段线性插值；loop=True 时按周期循环"""
+
+    def __init__(self, times, values, loop=False):
+        self.times = np.asarray(times, dtype=np.float64)
+        self.values = np.asarray(values, dtype=np.float64)
+        self.loop = loop
+
+    @classmethod
+    def constant(cls, value):
+        return cls([0.0], [value])
+
+    @classmethod
+    def from_points(cls, points, loop=False):
+        """[(t秒, 价格), ...]"""
+        times, values = zip(*points)
+        return cls(times, values, loop)
+
+    @classmethod
+    def random_walk(cls, start, vol_bps=2.0, seconds=3600, step=0.1, seed=0):
+        """每 step 秒一步、每步波动 vol_bps 个基点的几何随机游走"""
+        rng = np.random.default_rng(seed)
+        steps = int(seconds / step)
+        returns = rng.normal(0.0, vol_bps / 1e4, steps)
+        values = start * np.exp(np.concatenate(([0.0], np.cumsum(returns))))
+        return cls(np.arange(steps + 1) * step, values)
+
+    def __call__(self, t):
+        if self.loop and len(self.times) > 1:
+            t = t % self.times[-1]
+        return float(np.interp(t, self.times, self.values))
+
+
+# --- 延迟与故障 ---
+class LatencyModel:
+    """'fixed:20'、'uniform:10:50'、'lognormal:30:0.5' (中位数 ms, sigma)"""
+
+    def __init__(self, spec="fixed:0", seed=None):
+        self.spec = spec
+        kind, *args = spec.split(":")
+        self.kind = kind
+        self.args = [float(a) for a in args]
+        self.rng = random.Random(seed)
+
+    def sample_ms(self):
+        if self.kind == "fixed":
+            return self.args[0] if self.args else 0.0
+        if self.kind == "uniform":
+            return self.rng.uniform(self.args[0], self.args[1])
+        if self.kind == "lognormal":
+            median, sigma = self.args
+            return self.rng.lognormvariate(np.log(median), sigma)
+        raise ValueError(f"未知的延迟分布: {self.spec}")
+
+
+@dataclass
+class FaultConfig:
+    """每次请求触发各类故障的概率"""
+    rate_limit: float = 0.0          # 429 RateLimitExceeded
+    timeout: float = 0.0             # RequestTimeout (请求发出但不知道是否成交)
+    lost_reply: float = 0.0          # 订单已经成交 (或挂上)，回报丢了，调用方只看到 RequestTimeout
+    insufficient_funds: float = 0.0  # 下单时 InsufficientFunds
+    partial: float = 0.0             # 市价单只成交一部分
+    partial_min: float = 0.2         # 部分成交的比例范围
+    partial_max: float = 0.9
+
+    @classmethod
+    def parse(cls, spec):
+        """'rate_limit=0.01,timeout=0.005,lost_reply=0.005,partial=0.05'"""
+        config = cls()
+        for item in filter(None, (spec or "").split(",")):
+            key, value = item.split("=")
+            setattr(config, key.strip(), float(value))
+        return config
+
+
+# --- 模拟交易所 ---
+class MockExchange:
+    def __init__(self, exchange_id, price_fn, symbols=("BTC/USDC", "BTC/USDC:USDC"), half_spread_bps=0.5,
+                 levels=20, level_size=0.5, latency=None, faults=None, balance=10_000.0, leverage=10,
+                 taker_fee=0.0004, maker_fee=0.0001, seed=0, t0=None, push_delay_ms=0.0):
+        self.id = exchange_id
+        self.price_fn = price_fn
+        self.half_spread = half_spread_bps / 1e4
+        self.levels = levels
+        self.level_size = level_size
+        self.latency = latency or LatencyModel()
+        self.faults = faults or FaultConfig()
+        self.leverage = leverage
+        self.taker_fee = taker_fee
+        self.maker_fee = maker_fee
+        self.rng = random.Random(seed)
+        self.t0 = time.monotonic() if t0 is None else t0
+
+        # 看起来像一个带密钥的 ccxt 实例
+        self.apiKey = "mock"
+        self.walletAddress = "0xmock"
+        self.options = {}
+        self.has = {name: True for name in ("fetchTicker", "fetchTickers", "fetchOrderBook", "createOrder",
+                                            "cancelOrder", "fetchBalance", "fetchPositions", "fetchTime",
+                                            "fetchOrder", "fetchOpenOrders", "fetchOrders")}
+        self.has["fetchOrder"] = exchange_id != "backpack"
+        self.markets = {s: self._market(s) for s in symbols}
+        self.symbols = list(self.markets)
+
+        self.cash = balance
+        self.positions = {}   # symbol -> [带符号数量, 开仓均价]
+        self.orders = {}
+        self.push_listeners = []   # 私有推送 callback(channel, payload)，channel 为 'order' / 'trade' / 'position'
+        self.push_delay_ms = push_delay_ms
+        self.request_count = 0
+        self.fault_count = {}
+        self._ids = itertools.count(1)
+        self._trade_ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _market(symbol):
+        base, rest = symbol.split("/")
+        quote, _, settle = rest.partition(":")
+        swap = bool(settle)
+        return {"id": symbol.replace("/", "_").replace(":", "_"), "symbol": symbol, "base": base, "quote": quote,
+                "settle": settle or None, "type": "swap" if swap else "spot", "spot": not swap, "swap": swap,
+                "active": True, "contractSize": 1.0 if swap else None,
+                "precision": {"amount": 1e-5, "price": 0.1}, "limits": {"amount": {"min": 1e-5}}}
+
+    # --- 通用 ---
+    def _request(self, order_request=False):
+        return self.fetch(order_request=order_request)
+
+    def fetch(self, url=None, method="GET", headers=None, body=None, order_request=False):
+        """
+        一次 “HTTP 请求”：每个接口调用的公共部分，计数、模拟网络延迟、按概率抛异常。
+        和 ccxt 一样所有请求都经过 fetch，限速器和请求计数器可以照常包在外面。
+        """
+        self.request_count += 1
+        delay = self.latency.sample_ms()
+        if delay > 0:
+            time.sleep(delay / 1000)
+        f = self.faults
+        roll = self.rng.random()
+        if roll < f.rate_limit:
+            self._fault("rate_limit")
+            raise RateLimitExceeded(f"{self.id} 429 Too Many Requests (mock)")
+        roll -= f.rate_limit
+        if roll < f.timeout:
+            self._fault("timeout")
+            raise RequestTimeout(f"{self.id} request timed out (mock)")
+        roll -= f.timeout
+        if order_request and roll < f.insufficient_funds:
+            self._fault("insufficient_funds")
+            raise InsufficientFunds(f"{self.id} insufficient balance (mock)")
+
+    def _fault(self, kind):
+        self.fault_count[kind] = self.fault_count.get(kind, 0) + 1
+
+    def _reply(self, order):
+        """下单回报：按 lost_reply 的概率在订单已经记账之后抛超时，模拟 “发出、成交、回报丢了”"""
+        if self.rng.random() < self.faults.lost_reply:
+            self._fault("lost_reply")
+            raise RequestTimeout(f"{self.id} request timed out after the order was accepted (mock)")
+        return dict(order)
+
+    def now(self):
+        return time.monotonic() - self.t0
+
+    def mid(self, symbol=None):
+        return self.price_fn(self.now())
+
+    def _check_symbol(self, symbol):
+        if symbol not in self.markets:
+            raise InvalidOrder(f"{self.id} 没有交易对 {symbol} (mock)")
+
+    def load_markets(self, reload=False, params={}):
+        return self.markets
+
+    def fetch_time(self, params={}):
+        self._request()
+        return int(time.time() * 1000)
+
+    def fetch_status(self, params={}):
+        self._request()
+        return {"status": "ok", "updated": int(time.time() * 1000)}
+
+    # --- 行情 ---
+    def _top(self, mid):
+        return mid * (1 - self.half_spread), mid * (1 + self.half_spread)
+
+    def _ticker(self, symbol):
+        mid = self.mid(symbol)
+        bid, ask = self._top(mid)
+        return {"symbol": symbol, "timestamp": int(time.time() * 1000), "bid": bid, "ask": ask, "last": mid,
+                "close": mid, "bidVolume": self.level_size, "askVolume": self.level_size,
+                "quoteVolume": 1e6 * self.level_size}
+
+    def fetch_ticker(self, symbol, params={}):
+        self._check_symbol(symbol)
+        self._request()
+        with self._lock:
+            self._match_resting()
+            return self._ticker(symbol)
+
+    def fetch_tickers(self, symbols=None, params={}):
+        self._request()
+        with self._lock:
+            self._match_resting()
+            return {s: self._ticker(s) for s in (symbols or self.symbols)}
+
+    def _book(self, mid, limit=None):
+        n = min(limit or self.levels, self.levels)
+        bid, ask = self._top(mid)
+        step = mid * 1e-5
+        sizes = [self.level_size * (1 + i * 0.5) for i in range(n)]
+        bids = [[bid - i * step, sizes[i]] for i in range(n)]
+        asks = [[ask + i * step, sizes[i]] for i in range(n)]
+        return bids, asks
+
+    def fetch_order_book(self, symbol, limit=None, params={}):
+        self._check_symbol(symbol)
+        self._request()
+        with self._lock:
+            self._match_resting()
+        bids, asks = self._book(self.mid(symbol), limit)
+        return {"symbol": symbol, "bids": bids, "asks": asks, "timestamp": int(time.time() * 1000), "nonce": None}
+
+    # --- 交易 ---
+    def _walk_book(self, side, amount, mid):
+        """市价单吃单：沿盘口逐档成交，返回 (成交量, 均价)"""
+        bids, asks = self._book(mid)
+        filled = cost = 0.0
+        for price, size in (asks if side == "buy" else bids):
+            take = min(size, amount - filled)
+            filled += take
+            cost += take * price
+            if filled >= amount:
+                break
+        return filled, (cost / filled if filled else None)
+
+    def _apply_fill(self, symbol, side, filled, price, fee_rate):
+        signed = filled if side == "buy" else -filled
+        qty, entry = self.positions.get(symbol, [0.0, 0.0])
+        new_qty = qty + signed
+        if qty == 0 or (qty > 0) == (signed > 0):
+            entry = (abs(qty) * entry + filled * price) / abs(new_qty)
+        else:
+            closed = min(abs(qty), filled)
+            self.cash += closed * (price - entry) * (1 if qty > 0 else -1)
+            if abs(new_qty) > 1e-12 and (new_qty > 0) != (qty > 0):
+                entry = price   # 反手
+        fee = filled * price * fee_rate
+        self.cash -= fee
+        if abs(new_qty) < 1e-12:
+            self.positions.pop(symbol, None)
+        else:
+            self.positions[symbol] = [new_qty, entry]
+        return fee
+
+    def _push(self, pushes):
+        for channel, payload in pushes:
+            for listener in self.push_listeners:
+                listener(channel, dict(payload))
+
+    def _push_fill(self, order, filled, price, fee):
+        """一笔成交对应的三条推送：订单、成交、持仓 (push_delay_ms > 0 时在后台线程里晚一点送出)"""
+        if not self.push_listeners:
+            return
+        pushes = [("order", dict(order))]
+        if filled:
+            pushes.append(("trade", {"id": f"t{next(self._trade_ids)}", "order": order["id"],
+                                     "clientOrderId": order.get("clientOrderId"), "symbol": order["symbol"],
+                                     "side": order["side"], "amount": filled, "price": price,
+                                     "fee": {"cost": fee, "currency": "USDC"}, "timestamp": int(time.time() * 1000)}))
+            qty, entry = self.positions.get(order["symbol"], [0.0, 0.0])
+            pushes.append(("position", {"symbol": order["symbol"], "side": "long" if qty >= 0 else "short",
+                                        "contracts": abs(qty), "entryPrice": entry or None, "info": {"mock": True}}))
+        if self.push_delay_ms > 0:
+            timer = threading.Timer(self.push_delay_ms / 1000, self._push, (pushes,))
+            timer.daemon = True
+            timer.start()
+        else:
+            self._push(pushes)
+
+    def _used_margin(self):
+        return sum(abs(q) * e for q, e in self.positions.values()) / self.leverage
+
+    def _order(self, symbol, type, side, amount, price, status, filled, average, fee, params):
+        order_id = str(next(self._ids))
+        order = {"id": order_id, "clientOrderId": params.get("clientOrderId"), "timestamp": int(time.time() * 1000),
+                 "symbol": symbol, "type": type, "side": side, "amount": amount, "price": price,
+                 "status": status, "filled": filled, "remaining": amount - filled, "average": average,
+                 "cost": filled * (average or 0.0), "fee": {"cost": fee, "currency": "USDC"},
+                 "reduceOnly": bool(params.get("reduceOnly")), "postOnly": bool(params.get("postOnly")),
+                 "info": {"mock": True}}
+        self.orders[order_id] = order
+        return order
+
+    def create_order(self, symbol, type, side, amount, price=None, params={}):
+        self._check_symbol(symbol)
+        if self.id == "hyperliquid" and type == "market" and price is None:
+            # 和 ccxt 一样：Hyperliquid 市价单要参考价来算滑点上限
+            raise ArgumentsRequired(f"{self.id} market orders require price to calculate the max slippage price (mock)")
+        if type != "market" and price is None:
+            raise InvalidOrder(f"{self.id} {type} 订单必须带价格 (mock)")
+        self._request(order_request=True)
+        with self._lock:
+            self._match_resting()
+            mid = self.mid(symbol)
+            bid, ask = self._top(mid)
+            qty = self.positions.get(symbol, [0.0, 0.0])[0]
+            increases = abs(qty + (amount if side == "buy" else -amount)) > abs(qty)
+            if params.get("reduceOnly"):
+                if qty == 0 or (qty > 0) == (side == "buy"):
+                    raise InvalidOrder(f"{self.id} reduceOnly 订单会增加仓位 (mock)")
+                amount = min(amount, abs(qty))
+            elif increases and self._used_margin() + amount * mid / self.leverage > self.cash:
+                self._fault("insufficient_funds")
+                raise InsufficientFunds(f"{self.id} 保证金不足 (mock)")
+
+            marketable = type == "market" or (side == "buy" and price >= ask) or (side == "sell" and price <= bid)
+            if type != "market" and marketable and params.get("postOnly"):
+                raise InvalidOrder(f"{self.id} post-only 订单会立即成交 (mock)")
+            if not marketable:
+                status = "canceled" if params.get("timeInForce") == "IOC" else "open"
+                order = self._order(symbol, type, side, amount, price, status, 0.0, None, 0.0, params)
+                self._push_fill(order, 0.0, None, 0.0)
+                return self._reply(order)
+
+            filled, average = self._walk_book(side, amount, mid)
+            if type != "market":
+                # 限价单不会比限价更差
+                average = min(average, price) if side == "buy" else max(average, price)
+            if self.rng.random() < self.faults.partial:
+                self._fault("partial")
+                filled = round(filled * self.rng.uniform(self.faults.partial_min, self.faults.partial_max), 8)
+            fee = self._apply_fill(symbol, side, filled, average, self.taker_fee)
+            status = "closed" if filled >= amount else ("canceled" if type == "market" or params.get("timeInForce") == "IOC" else "open")
+            order = self._order(symbol, type, side, amount, price, status, filled, average, fee, params)
+            self._push_fill(order, filled, average, fee)
+            return self._reply(order)
+
+    def _match_resting(self):
+        """
+        挂单在价格穿过时按限价以 maker 成交；每次请求都会撮合一遍，所以挂单在有人看盘口 / 查单时才成交。
+        按 partial 的概率只成交剩余量的一部分，剩下的继续挂着 (下一次请求再撮合)
+        """
+        for order in self.orders.values():
+            if order["status"] != "open":
+                continue
+            bid, ask = self._top(self.mid(order["symbol"]))
+            crossed = (order["side"] == "buy" and ask <= order["price"]) or (order["side"] == "sell" and bid >= order["price"])
+            if crossed:
+                qty = order["remaining"]
+                if self.rng.random() < self.faults.partial:
+                    self._fault("partial")
+                    qty = round(qty * self.rng.uniform(self.faults.partial_min, self.faults.partial_max), 8)
+                fee = self._apply_fill(order["symbol"], order["side"], qty, order["price"], self.maker_fee)
+                filled = order["filled"] + qty
+                order.update(status="closed" if qty >= order["remaining"] else "open", filled=filled,
+                             remaining=order["amount"] - filled, average=order["price"], cost=filled * order["price"],
+                             fee={"cost": order["fee"]["cost"] + fee, "currency": "USDC"})
+                self._push_fill(order, qty, order["price"], fee)
+
+    def cancel_order(self, id, symbol=None, params={}):
+        self._request()
+        with self._lock:
+            self._match_resting()
+            order = self.orders.get(str(id))
+            if order is None or order["status"] != "open":
+                raise OrderNotFound(f"{self.id} order {id} not found or not open (mock)")
+            order["status"] = "canceled"
+            self._push_fill(order, 0.0, None, 0.0)
+            return dict(order)
+
+    def fetch_order(self, id, symbol=None, params={}):
+        """按订单号查；params 带 clientOrderId 时按客户端订单号查 (和 ccxt 的 Hyperliquid 一样)"""
+        self._request()
+        with self._lock:
+            self._match_resting()
+            client_id = params.get("clientOrderId")
+            if client_id is not None:
+                found = [o for o in self.orders.values() if str(o["clientOrderId"]) == str(client_id)]
+                id = found[0]["id"] if found else None
+            if str(id) not in self.orders:
+                raise OrderNotFound(f"{self.id} order {client_id or id} not found (mock)")
+            return dict(self.orders[str(id)])
+
+    def fetch_open_orders(self, symbol=None, since=None, limit=None, params={}):
+        self._request()
+        with self._lock:
+            self._match_resting()
+            return [dict(o) for o in self.orders.values()
+                    if o["status"] == "open" and (symbol is None or o["symbol"] == symbol)]
+
+    def fetch_orders(self, symbol=None, since=None, limit=None, params={}):
+        """最近的订单 (包括已完结的)，新的在后"""
+        self._request()
+        with self._lock:
+            self._match_resting()
+            orders = [dict(o) for o in self.orders.values() if symbol is None or o["symbol"] == symbol]
+            return orders[-limit:] if limit else orders
+
+    # --- 账户 ---
+    def _unrealized(self):
+        return sum(q * (self.mid(s) - e) for s, (q, e) in self.positions.items())
+
+    def fetch_balance(self, params={}):
+        self._request()
+        with self._lock:
+            self._match_resting()
+            total = self.cash + self._unrealized()
+            used = self._used_margin()
+            usdc = {"free": total - used, "used": used, "total": total}
+            return {"USDC": usdc, "free": {"USDC": usdc["free"]}, "used": {"USDC": used},
+                    "total": {"USDC": total}, "info": {"mock": True}}
+
+    def fetch_positions(self, symbols=None, params={}):
+        self._request()
+        with self._lock:
+            self._match_resting()
+            result = []
+            for symbol, (qty, entry) in self.positions.items():
+                if symbols and symbol not in symbols:
+                    continue
+                mark = self.mid(symbol)
+                result.append({"symbol": symbol, "side": "long" if qty > 0 else "short", "contracts": abs(qty),
+                               "entryPrice": entry, "markPrice": mark, "notional": abs(qty) * mark,
+                               "unrealizedPnl": qty * (mark - entry), "leverage": self.leverage, "info": {"mock": True}})
+            return result
+
+
+class MockPrebuiltOrder:
+    """和 signing.PrebuiltOrder 一样的接口 (valid / send / client_order_id)，send() 时才在模拟交易所上下市价单"""
+
+    def __init__(self, exchange, symbol, side, amount, reduce_only=True, client_order_id=None):
+        self.exchange = exchange
+        self.symbol = symbol
+        self.side = side
+        self.client_order_id = client_order_id
+        self.params = {'reduceOnly': True} if reduce_only else {}
+        if client_order_id is not None:
+            self.params['clientOrderId'] = client_order_id
+        self.request = {'action': {'orders': [{'s': str(amount)}]}}   # rollback.prebuilt_amount 读这里
+        self.sent = False
+
+    @property
+    def valid(self):
+        return not self.sent
+
+    def send(self):
+        self.sent = True
+        amount = float(self.request['action']['orders'][0]['s'])
+        return self.exchange.create_order(self.symbol, 'market', self.side, amount, self.exchange.mid(self.symbol),
+                                          self.params)
+
+
+def mock_exchanges(price=None, spread_pct=None, latency="fixed:0", faults=None, seed=0, **kwargs):
+    """
+    一对模拟交易所 {'bp': ..., 'hl': ...}，两边共用同一个时钟起点。
+    price: HL 的中间价路径 (默认 BTC 约 90000 的随机游走)
+    spread_pct: BP 相对 HL 的溢价路径 (%)，即 strategy.compute_spread 的 diff_pct
+    latency / faults: LatencyModel 的写法 / FaultConfig 或它的字符串写法
+    """
+    price = price or PricePath.random_walk(90_000.0, seed=seed)
+    spread_pct = spread_pct or PricePath.from_points([(0, 0.0), (5, 0.02), (10, 0.0), (15, -0.02), (20, 0.0)], loop=True)
+    faults = FaultConfig.parse(faults) if isinstance(faults, str) or faults is None else faults
+    t0 = time.monotonic()
+
+    def price_hl(t):
+        return price(t)
+
+    def price_bp(t):
+        # diff_pct = (p_bp - p_hl) / p_bp * 100  ->  p_bp = p_hl / (1 - diff_pct / 100)
+        return price(t) / (1 - spread_pct(t) / 100)
+
+    return {
+        'bp': MockExchange("backpack", price_bp, latency=LatencyModel(latency, seed), faults=faults,
+                           seed=seed, t0=t0, **kwargs),
+        'hl': MockExchange("hyperliquid", price_hl, latency=LatencyModel(latency, seed + 1), faults=faults,
+                           seed=seed + 1, t0=t0, **kwargs),
+    }
+
+
+def soak(trades=100, latency="lognormal:30:0.5", faults="rate_limit=0.02,timeout=0.01,partial=0.05", seed=0,
+         track=True):
+    """离线浸泡测试：反复开平仓，统计成功 / 双边失败 / 单边回滚的次数；track=False 时不接私有推送 (只靠 REST)"""
+    from .execution import ExecutionService
+    from .ordertracker import OrderTracker
+    from .priority import Priority
+    from .trading import execute_dual_trade
+
+    exchanges = mock_exchanges(latency=latency, faults=faults, seed=seed)
+    tracker = OrderTracker.from_exchanges(exchanges) if track else None
+    service = ExecutionService(exchanges, tracker=tracker)
+    outcomes = {"success": 0, "both_failed": 0, "rollback": 0}
+    direction = "Short_BP_Long_HL"
+    started = time.perf_counter()
+    try:
+        for _ in range(trades):
+            # 相当于引擎每轮把行情快照交给下单服务 (不发请求)
+            for venue, ex in exchanges.items():
+                service.note_price(venue, "BTC/USDC:USDC", ex.mid())
+            # 反方向的那一笔是平仓 (回滚它等于重新开仓，不能带 reduceOnly)
+            priority = Priority.OPEN if direction == "Short_BP_Long_HL" else Priority.CLOSE
+            success, logs = execute_dual_trade(service, direction, 0.001, "BTC/USDC:USDC", "BTC/USDC:USDC", True,
+                                               priority=priority)
+            if success:
+                outcomes["success"] += 1
+                direction = "Long_BP_Short_HL" if direction == "Short_BP_Long_HL" else "Short_BP_Long_HL"
+            elif any("单边成交" in l for l in logs):
+                outcomes["rollback"] += 1
+            else:
+                outcomes["both_failed"] += 1
+    finally:
+        service.shutdown()
+    elapsed = time.perf_counter() - started
+    legs = [leg for leg in service.history if leg.ok]
+    ack = sorted(leg.send_to_ack_ms for leg in legs)
+    print(f"🧪 {trades} 笔双边交易，用时 {elapsed:.1f} 秒 | {outcomes}")
+    if ack:
+        print(f"⏱️ 回报耗时 p50 {ack[len(ack) // 2]:.1f}ms | p99 {ack[int(len(ack) * 0.99)]:.1f}ms")
+    for name, stats in service.queue_stats.summary().items():
+        print(f"🚦 {name}: {stats['count']} 次 | 排队 p50 {stats['p50_ms']:.2f}ms | p99 {stats['p99_ms']:.2f}ms")
+    requests = {}
+    for leg in service.history:
+        requests[leg.requests] = requests.get(leg.requests, 0) + 1
+    print(f"🔢 每腿 HTTP 请求数: {dict(sorted(requests.items()))} (应该全部是 1)")
+    if tracker is not None:
+        pushed = tracker.summary()
+        states = {}
+        for order in tracker.orders.values():
+            states[order.state] = states.get(order.state, 0) + 1
+        line = f"📨 私有推送: 跟踪 {pushed['orders']} 笔 | 推送确认 {pushed['push_confirmed']} 笔 | 状态 {states}"
+        if pushed['push_confirmed']:
+            line += f" | 发出 -> 确认 p50 {pushed['p50_ms']:.1f}ms | p99 {pushed['p99_ms']:.1f}ms"
+        print(line)
+    rollbacks = service.rollbacks.summary()
+    if rollbacks['count']:
+        line = f"🧯 回滚 {rollbacks['count']} 次 | 平掉 {rollbacks['flat']} 次 | 各级下单 {rollbacks['stages']}"
+        if rollbacks['flat']:
+            line += (f" | time-to-flat p50 {rollbacks['p50_ms']:.0f}ms | p99 {rollbacks['p99_ms']:.0f}ms"
+                     f" | max {rollbacks['max_ms']:.0f}ms")
+        print(line)
+    for venue, ex in exchanges.items():
+        print(f"{venue}: 请求 {ex.request_count} 次 | 注入故障 {ex.fault_count} | 持仓 {ex.positions}")
+    return outcomes
+
+
+def _net(exchanges, symbol="BTC/USDC:USDC"):
+    """{venue: 带符号持仓}"""
+    return {venue: round(ex.positions.get(symbol, [0.0, 0.0])[0], 8) for venue, ex in exchanges.items()}
+
+
+def _unreachable(*args, **kwargs):
+    raise RequestTimeout("order lookup timed out (mock)")
+
+
+def _wait_until(condition, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.02)
+    return condition()
+
+
+def check_lost_reply_rest():
+    """两边的下单回报都丢了、没有私有推送：按客户端订单号查 REST 认回两腿，开仓成功且两边对冲"""
+    from .execution import ExecutionService
+    from .trading import execute_dual_trade
+
+    exchanges = mock_exchanges(faults="lost_reply=1.0")
+    service = ExecutionService(exchanges)
+    try:
+        for venue, ex in exchanges.items():
+            service.note_price(venue, "BTC/USDC:USDC", ex.mid())
+        success, logs = execute_dual_trade(service, "Short_BP_Long_HL", 0.001, "BTC/USDC:USDC", "BTC/USDC:USDC", True)
+    finally:
+        service.shutdown()
+    net = _net(exchanges)
+    return success and net == {'bp': -0.001, 'hl': 0.001}, f"success={success} 持仓 {net}"
+
+
+def check_late_push():
+    """
+    HL 腿回报丢了，推送比 ambiguous_wait 还晚、REST 也查不到：这一腿先按没成交处理 (BP 腿回滚)，
+    推送到了以后迟到的 HL 成交也要被平掉，最后两边都是平的
+    """
+    from .execution import ExecutionService
+    from .ordertracker import OrderTracker
+    from .trading import execute_dual_trade
+
+    exchanges = mock_exchanges()
+    hl = exchanges['hl']
+    hl.faults, hl.push_delay_ms = FaultConfig(lost_reply=1.0), 1000
+    hl.fetch_order = _unreachable
+    service = ExecutionService(exchanges, tracker=OrderTracker.from_exchanges(exchanges))
+    try:
+        for venue, ex in exchanges.items():
+            service.note_price(venue, "BTC/USDC:USDC", ex.mid())
+        success, logs = execute_dual_trade(service, "Short_BP_Long_HL", 0.001, "BTC/USDC:USDC", "BTC/USDC:USDC", True)
+        hl.faults = FaultConfig()   # 回滚单照常回报
+        flat = _wait_until(lambda: _net(exchanges) == {'bp': 0.0, 'hl': 0.0})
+    finally:
+        service.shutdown()
+    return not success and flat, f"success={success} 持仓 {_net(exchanges)}"
+
+
+def _prebuilt_rollback(exchanges, tracker=None):
+    """HL 上先开 0.001 多仓，然后用预签的回滚单平掉：预签单成交了但回报丢了，返回 (RollbackResult, 回滚下了几笔单)"""
+    from .execution import ExecutionService
+    from .ordertracker import new_client_order_id
+
+    hl = exchanges['hl']
+    hl.create_order("BTC/USDC:USDC", 'market', 'buy', 0.001, hl.mid(), {})
+    orders = len(hl.orders)
+    hl.faults = FaultConfig(lost_reply=1.0)
+    service = ExecutionService(exchanges, tracker=tracker)
+    try:
+        service.note_price('hl', "BTC/USDC:USDC", hl.mid())
+        prebuilt = MockPrebuiltOrder(hl, "BTC/USDC:USDC", 'sell', 0.001, client_order_id=new_client_order_id('hl'))
+        # 和 flatten_leg 回滚开仓腿一样：成交量确认过 (不带 reduceOnly)，方向是减仓
+        result = service.rollbacks.flatten('hl', "BTC/USDC:USDC", 'sell', 0.001, prebuilt=prebuilt, reduce_only=False,
+                                           reduces=True)
+    finally:
+        service.shutdown()
+    return result, len(hl.orders) - orders
+
+
+def check_prebuilt_lost_reply():
+    """预签的回滚单成交了、回报丢了 (没有私有推送)：按客户端订单号查 REST 认回成交，不再加码重复平"""
+    exchanges = mock_exchanges()
+    result, orders = _prebuilt_rollback(exchanges)
+    net = _net(exchanges)
+    stages = [a.stage for a in result.attempts]
+    return result.flat and orders == 1 and net['hl'] == 0.0, f"flat={result.flat} 下单 {orders} 笔 {stages} 持仓 {net}"
+
+
+def check_prebuilt_unresolved():
+    """
+    预签的回滚单成交了，推送迟到、REST 也查不到：后面加码的各级强制 reduceOnly，
+    重复发出去也只会被拒 (或平到零)，仓位不会被反手
+    """
+    from .ordertracker import OrderTracker
+
+    exchanges = mock_exchanges()
+    hl = exchanges['hl']
+    hl.push_delay_ms = 1000
+    hl.fetch_order = _unreachable
+    result, orders = _prebuilt_rollback(exchanges, OrderTracker.from_exchanges(exchanges))
+    net = _net(exchanges)
+    # 后面各级带了 reduceOnly，模拟盘上已经没有仓位可平，会被拒掉
+    forced = len(result.attempts) > 1 and all("reduceOnly" in (a.error or "") for a in result.attempts[1:])
+    stages = [a.stage for a in result.attempts]
+    return net['hl'] == 0.0 and forced, f"下单 {orders} 笔 {stages} (后续全部 reduceOnly: {forced}) 持仓 {net}"
+
+
+CHECKS = (check_lost_reply_rest, check_late_push, check_prebuilt_lost_reply, check_prebuilt_unresolved)
+
+
+def check():
+    """跑一遍 CHECKS，全部通过返回 True"""
+    passed = True
+    for scenario in CHECKS:
+        ok, detail = scenario()
+        passed = passed and ok
+        print(f"{'✅' if ok else '❌'} {scenario.__name__}: {detail}")
+    return passed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="模拟交易所离线浸泡测试")
+    parser.add_argument("--trades", type=int, default=100)
+    parser.add_argument("--latency", default="lognormal:30:0.5")
+    parser.add_argument("--faults", default="rate_limit=0.02,timeout=0.01,partial=0.05")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-tracker", action="store_true", help="不接私有推送，结果不明的订单只靠 REST 查")
+    parser.add_argument("--check", action="store_true", help="只跑固定的故障场景，有一个不通过就以退出码 1 结束")
+    args = parser.parse_args(argv)
+    if args.check:
+        raise SystemExit(0 if check() else 1)
+    soak(args.trades, args.latency, args.faults, args.seed, track=not args.no_tracker)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+"""
+增量维护的 L2 盘口 (数组价格梯子)
+
+每轮 fetch_order_book 拉一次全量快照既重又慢。两边交易所都推送增量深度：
+
+- Backpack `depth.<symbol>`：{"U": 首个更新号, "u": 末个更新号, "b": [[价, 量]], "a": [...]}，
+  数量为 "0" 表示删除该档；下一条的 U 必须等于上一条的 u + 1，否则就是丢包；
+- Hyperliquid `l2Book`：每条都是前 20 档的完整快照，只需按时间戳丢弃乱序的旧消息。
+
+BookSide 把一边的价格梯子放在预分配的 NumPy 数组里，按 “越优越靠前” 排好序，
+增量更新用二分查找定位后原地插入/修改/删除。最优价是下标 0，O(1)；
+累计深度在有更新后第一次读取时重算一次，之后 O(1)。
+
+L2Book 负责序号检查：发现缺口就标记为未同步，缓存后续增量，
+调用 snapshot_fn (通常是 REST 的 fetch_order_book) 重新拉快照并回放缓存。
+快照必须带更新序号 (nonce)，不然不知道缓存里哪些增量已经包含在快照里。
+
+注意：实时行情 (marketdata.MarketDataStream) 目前用的是 ccxt.pro 自带的 watch_order_book，
+没有接这里的 L2Book；这个模块现在只有 benchmarks/bench_orderbook.py 在用，
+要接原始 WebSocket 消息时再用 on_backpack_depth / on_hyperliquid_l2book 喂进来。
+"""
+import time
+
+import numpy as np
+
+from .depth import DepthBook, vwap
+
+
+class SequenceGap(Exception):
+    """增量的序号不连续，盘口需要重新同步"""
+
+
+class BookSide:
+    def __init__(self, is_bid, capacity=256):
+        self.is_bid = is_bid
+        # keys 升序：买盘存 -price，卖盘存 price，这样下标 0 总是最优价
+        self.keys = np.empty(capacity)
+        self.sizes = np.empty(capacity)
+        self.n = 0
+        self._cum = None
+
+    def __len__(self):
+        return self.n
+
+    def _key(self, price):
+        return -price if self.is_bid else price
+
+    def _grow(self):
+        capacity = len(self.keys) * 2
+        self.keys = np.resize(self.keys, capacity)
+        self.sizes = np.resize(self.sizes, capacity)
+
+    def update(self, price, size):
+        """设置一档的数量；size == 0 删除该档"""
+        key = self._key(price)
+        n = self.n
+        i = int(np.searchsorted(self.keys[:n], key))
+        exists = i < n and self.keys[i] == key
+        if size > 0:
+            if exists:
+                self.sizes[i] = size
+            else:
+                if n == len(self.keys):
+                    self._grow()
+                self.keys[i + 1:n + 1] = self.keys[i:n]
+                self.sizes[i + 1:n + 1] = self.sizes[i:n]
+                self.keys[i] = key
+                self.sizes[i] = size
+                self.n = n + 1
+        elif exists:
+            self.keys[i:n - 1] = self.keys[i + 1:n]
+            self.sizes[i:n - 1] = self.sizes[i + 1:n]
+            self.n = n - 1
+        self._cum = None
+
+    def replace(self, levels):
+        """整边替换 (快照)，levels 是 [[价, 量], ...]，顺序不限"""
+        arr = np.asarray(levels, dtype=np.float64).reshape(-1, 2) if len(levels) else np.empty((0, 2))
+        arr = arr[arr[:, 1] > 0]
+        while len(arr) > len(self.keys):
+            self._grow()
+        keys = -arr[:, 0] if self.is_bid else arr[:, 0]
+        order = np.argsort(keys, kind="stable")
+        self.n = len(arr)
+        self.keys[:self.n] = keys[order]
+        self.sizes[:self.n] = arr[order, 1]
+        self._cum = None
+
+    # --- 读取 ---
+    def best(self):
+        """(价, 量)，空盘口返回 (None, None)"""
+        if not self.n:
+            return None, None
+        return float(self._price(0)), float(self.sizes[0])
+
+    def _price(self, i):
+        return -self.keys[i] if self.is_bid else self.keys[i]
+
+    def prices(self):
+        return -self.keys[:self.n] if self.is_bid else self.keys[:self.n].copy()
+
+    def cumulative(self):
+        """前 i 档累计数量 (有更新后首次读取时重算)"""
+        if self._cum is None:
+            self._cum = np.cumsum(self.sizes[:self.n])
+        return self._cum
+
+    def depth(self, levels):
+        """前 levels 档的累计数量"""
+        cum = self.cumulative()
+        if not len(cum):
+            return 0.0
+        return float(cum[min(levels, len(cum)) - 1])
+
+    def levels(self, limit=None):
+        """(n, 2) 数组 [[价, 量], ...]，最优价在前"""
+        n = self.n if limit is None else min(limit, self.n)
+        return np.column_stack((self.prices()[:n], self.sizes[:n]))
+
+
+class L2Book:
+    def __init__(self, venue, symbol, snapshot_fn=None, capacity=256, min_resync_interval=1.0):
+        """
+        snapshot_fn: 无参函数，返回 ccxt 格式的快照 {'bids', 'asks', 'nonce', 'timestamp'}，nonce 不能为 None
+        """
+        self.venue = venue
+        self.symbol = symbol
+        self.bids = BookSide(True, capacity)
+        self.asks = BookSide(False, capacity)
+        self.seq = None
+        self.timestamp = None
+        self.synced = False
+        self.snapshot_fn = snapshot_fn
+        self.min_resync_interval = min_resync_interval
+        self.updates = 0      # 已应用的档位变更数
+        self.gaps = 0
+        self.resyncs = 0
+        self._buffer = []
+        self._last_resync = 0.0
+
+    # --- 快照与增量 ---
+    def apply_snapshot(self, bids, asks, seq=None, timestamp=None):
+        self.bids.replace(bids)
+        self.asks.replace(asks)
+        self.seq = seq
+        self.timestamp = timestamp
+        self.synced = True
+
+    def apply_levels(self, bids, asks):
+        for price, size in bids:
+            self.bids.update(float(price), float(size))
+        for price, size in asks:
+            self.asks.update(float(price), float(size))
+        self.updates += len(bids) + len(asks)
+
+    def apply_diff(self, bids, asks, first_seq, last_seq, timestamp=None):
+        """
+        应用一条增量。序号不连续时抛 SequenceGap (盘口已标记为未同步)；
+        已经包含在当前盘口里的旧增量直接忽略，返回 False。
+        """
+        if self.seq is not None and last_seq <= self.seq:
+            return False
+        if self.seq is not None and first_seq > self.seq + 1:
+            self.synced = False
+            self.gaps += 1
+            raise SequenceGap(f"{self.venue} {self.symbol} 丢失增量 {self.seq + 1}..{first_seq - 1}")
+        self.apply_levels(bids, asks)
+        self.seq = last_seq
+        if timestamp is not None:
+            self.timestamp = timestamp
+        return True
+
+    def resync(self):
+        """用 snapshot_fn 重新拉快照，再回放缓存的增量"""
+        if self.snapshot_fn is None or time.monotonic() - self._last_resync < self.min_resync_interval:
+            return False
+        self._last_resync = time.monotonic()
+        snapshot = self.snapshot_fn()
+        if snapshot.get('nonce') is None:
+            # 没有序号就没法判断缓存的增量哪些已经在快照里，关掉缺口检查硬回放会把盘口弄错
+            raise ValueError(f"{self.venue} {self.symbol} 的盘口快照没有更新序号 (nonce)，不能和增量对齐")
+        self.resyncs += 1
+        self.apply_snapshot(snapshot['bids'], snapshot['asks'], snapshot.get('nonce'), snapshot.get('timestamp'))
+        buffered, self._buffer = self._buffer, []
+        try:
+            for args in buffered:
+                self.apply_diff(*args)
+        except SequenceGap:
+            return False  # 快照比缓存的增量还旧，等下一次重新同步
+        return True
+
+    def on_diff(self, bids, asks, first_seq, last_seq, timestamp=None):
+        """带自动重新同步的增量入口：未同步时先缓存，再尝试拉快照"""
+        if self.synced:
+            try:
+                return self.apply_diff(bids, asks, first_seq, last_seq, timestamp)
+            except SequenceGap:
+                pass
+        self._buffer.append((bids, asks, first_seq, last_seq, timestamp))
+        del self._buffer[:-1000]   # 一直同步不上时只留最近的增量
+        self.resync()
+        return self.synced
+
+    # --- 各交易所的消息格式 ---
+    def on_backpack_depth(self, data):
+        """Backpack depth 推送的 data 部分 (T 是微秒)"""
+        timestamp = int(data['T']) // 1000 if data.get('T') else None
+        return self.on_diff(data.get('b', []), data.get('a', []), int(data['U']), int(data['u']), timestamp)
+
+    def on_hyperliquid_l2book(self, data):
+        """Hyperliquid l2Book 推送的 data 部分：整本快照，按时间戳丢弃乱序消息"""
+        timestamp = data.get('time')
+        if timestamp is not None and self.timestamp is not None and timestamp < self.timestamp:
+            return False
+        bids, asks = data['levels']
+        self.apply_snapshot([(level['px'], level['sz']) for level in bids],
+                            [(level['px'], level['sz']) for level in asks], None, timestamp)
+        self.updates += len(bids) + len(asks)
+        return True
+
+    # --- 读取 ---
+    def best_bid(self):
+        return self.bids.best()[0]
+
+    def best_ask(self):
+        return self.asks.best()[0]
+
+    def mid(self):
+        bid, ask = self.best_bid(), self.best_ask()
+        if bid is None or ask is None:
+            return None
+        return (bid + ask) / 2
+
+    def vwap_buy(self, amount):
+        return vwap(self.asks.levels(), amount)
+
+    def vwap_sell(self, amount):
+        return vwap(self.bids.levels(), amount)
+
+    def to_depth_book(self, limit=None):
+        """转成 depth.DepthBook，直接用于 executable_spread"""
+        return DepthBook(self.venue, self.symbol, self.bids.levels(limit), self.asks.levels(limit), self.timestamp)
+
+    def to_ccxt(self, limit=None):
+        return {'symbol': self.symbol, 'bids': self.bids.levels(limit).tolist(), 'asks': self.asks.levels(limit).tolist(),
+                'timestamp': self.timestamp, 'nonce': self.seq}
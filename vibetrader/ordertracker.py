@@ -0,0 +1,514 @@
+"""
+私有推送的订单 / 成交 / 持仓跟踪 (ccxt.pro watch_orders / watch_my_trades / watch_positions)
+
+订单发出去以后，我们只知道 create_order 返回的那个字典：11_ghost_order.py 撤单前写死 time.sleep(3)，
+回滚要确认原单成交了多少只能再查一次 REST，手续费和持仓变化没有任何地方确认。
+
+OrderTracker 在后台线程里跑一个 asyncio 循环 (和 marketdata.MarketDataStream 一样)，
+订阅两个交易所的私有频道，断线后退避重连；内存里维护一张订单表，按 (交易所, 客户端订单号) 索引：
+
+- 下单前 track() 登记客户端订单号，推送比 REST 回报先到也能对上；
+- 订单推送更新状态：pending -> open -> partially_filled -> filled / cancelled / rejected，终态不会被乱序的旧推送改回去；
+- 成交推送累加手续费和成交量 (Hyperliquid 的 userFills；Backpack 没有成交频道，成交信息在订单推送里)；
+- 持仓推送更新 positions；
+- wait() 阻塞等待订单进入某个状态 (默认终态)，带超时，代替轮询和 sleep：一条推送就能确认成交；
+- REST 回报和下单异常也记进表里 (bind / reject)，记录每笔订单从发出到确认终态的耗时；
+- 下单超时这类结果不明的订单先保持 pending，settle() 等一小会儿推送，还不清楚就由调用方按客户端订单号查 REST
+  (find_order) 再 resolve()；下单报错后超过 pending_timeout 还没有任何推送的订单，expire() 先查 REST 核实，
+  确认交易所没有这笔单才记成 rejected (summary() 会顺手清理)，之后真有推送来还会改回来；
+- 调用方已经按某个成交量处理完的订单 (abandon) 后来又报出成交 (推送迟到)，多出来的部分交给 late_fill_listeners
+  (ExecutionService 在那里把它反向平掉)。
+
+    tracker = OrderTracker.from_exchanges({'bp': backpack, 'hl': hyperliquid}).start()
+    cid = new_client_order_id('bp')
+    tracker.track('bp', cid, 'BTC/USDC', 'buy', 0.001)
+    order = backpack.create_order('BTC/USDC', 'limit', 'buy', 0.001, price, {'clientOrderId': cid})
+    tracker.bind('bp', cid, order)
+    tracker.wait('bp', cid, timeout=5).state      # 'filled' / 'cancelled' / 'rejected'
+
+模拟交易所 (mockexchange.MockExchange) 没有 WebSocket，from_exchanges 会直接挂到它的进程内推送上。
+"""
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+
+from ccxt.base.errors import DDoSProtection, NetworkError, OrderNotFound, RateLimitExceeded
+
+from .marketdata import VENUES, override_ws_urls
+
+logger = logging.getLogger("vibetrader.ordertracker")
+
+TERMINAL = ('filled', 'cancelled', 'rejected')
+_ORDER_STATES = {'closed': 'filled', 'canceled': 'cancelled', 'cancelled': 'cancelled', 'expired': 'cancelled',
+                 'rejected': 'rejected'}
+
+_bp_ids = random.Random()
+_bp_lock = threading.Lock()
+
+
+def is_ambiguous(error):
+    """超时、断线这类网络错误：请求可能已经到了交易所 (429 限速是明确拒绝，不算)"""
+    return isinstance(error, NetworkError) and not isinstance(error, (RateLimitExceeded, DDoSProtection))
+
+
+def find_order(exchange, symbol, client_order_id, recent=100):
+    """
+    按客户端订单号用 REST 查一笔订单：找到返回 ccxt 订单结构，交易所确认没有这笔单返回 None，查询出错时异常原样抛出。
+    Hyperliquid 的 fetch_order 可以直接按 cloid 查 (查不到时返回空订单)；Backpack 没有 fetchOrder，
+    先看挂单，再翻最近 recent 笔历史订单
+    """
+    client_order_id = str(client_order_id)
+    if exchange.has.get('fetchOrder'):
+        try:
+            order = exchange.fetch_order(client_order_id, symbol, {'clientOrderId': client_order_id})
+        except OrderNotFound:
+            return None
+        return order if order and order.get('id') is not None else None
+    for fetch in (exchange.fetch_open_orders, exchange.fetch_orders):
+        for order in fetch(symbol, None, recent):
+            if str(order.get('clientOrderId')) == client_order_id:
+                return order
+    return None
+
+
+def new_client_order_id(venue):
+    """
+    交易所能接受的客户端订单号 (字符串)：
+    Backpack 要 uint32，Hyperliquid 要 128 位十六进制 (0x + 32 位)
+    """
+    if venue == 'bp':
+        with _bp_lock:
+            return str(_bp_ids.randrange(1, 2 ** 32))
+    return '0x' + os.urandom(16).hex()
+
+
+@dataclass
+class TrackedOrder:
+    venue: str
+    client_id: str
+    symbol: str = None
+    side: str = None
+    amount: float = None
+    id: str = None
+    state: str = 'pending'
+    filled: float = 0.0
+    average: float = None
+    fee: float = 0.0
+    fee_currency: str = None
+    error: str = None
+    sent_ns: int = 0       # track() 的时刻
+    done_ns: int = 0       # 进入终态的时刻
+    confirmed_by: str = None   # 终态来自 'push' 还是 'rest'
+    handled: float = None  # abandon() 时调用方已经处理的成交量，之后多出来的成交交给 late_fill_listeners
+    pushes: int = 0        # 收到的推送条数 (订单 + 成交)
+    trade_ids: set = field(default_factory=set)
+    trade_filled: float = 0.0
+    trade_cost: float = 0.0
+
+    @property
+    def done(self):
+        return self.state in TERMINAL
+
+    @property
+    def confirm_ms(self):
+        """发出 -> 确认终态的耗时"""
+        return (self.done_ns - self.sent_ns) / 1e6 if self.done_ns and self.sent_ns else None
+
+    def as_order(self):
+        """按推送整理出的 ccxt 订单结构，下单回报丢了的时候代替 REST 回报"""
+        status = {'filled': 'closed', 'cancelled': 'canceled', 'rejected': 'rejected'}.get(self.state, 'open')
+        return {'id': self.id, 'clientOrderId': self.client_id, 'symbol': self.symbol, 'side': self.side,
+                'amount': self.amount, 'filled': self.filled, 'average': self.average, 'status': status,
+                'fee': {'cost': self.fee, 'currency': self.fee_currency}, 'info': {'tracker': True}}
+
+
+class OrderTracker:
+    def __init__(self, credentials=None, ws_urls=None, channels=('orders', 'trades', 'positions'), keep=5000,
+                 pending_timeout=30.0):
+        """
+        credentials: {'bp': {'apiKey': ..., 'secret': ...}, 'hl': {'walletAddress': ..., 'privateKey': ...}}
+        ws_urls: {'bp': url, 'hl': url}，指向本地回放服务器
+        channels: 订阅哪些私有频道
+        keep: 订单表最多保留多少笔 (超过后丢掉最早的已完结订单)
+        pending_timeout: 下单请求报错后多少秒还没有任何推送，expire() 就按客户端订单号查 REST 核实
+        """
+        self.credentials = credentials or {}
+        self.ws_urls = ws_urls or {}
+        self.channels = channels
+        self.keep = keep
+        self.pending_timeout = pending_timeout
+        self.exchanges = {}
+        self.orders = {}          # (venue, 客户端订单号) -> TrackedOrder
+        self.positions = {}       # (venue, symbol) -> ccxt 持仓结构
+        self.listeners = []       # callback(TrackedOrder)，状态变化时在推送线程里调用
+        self.late_fill_listeners = []   # callback(TrackedOrder, 数量)，已经 abandon 的订单又报出成交
+        self.rest = {}            # venue -> REST 客户端，expire() 用它核实结果不明的订单
+        self.reconnects = 0
+        self.confirm_times = deque(maxlen=500)
+        self._by_id = {}          # (venue, 交易所订单号) -> 客户端订单号
+        self._orphan_trades = {}  # (venue, 交易所订单号) -> [成交]，订单号还没对上时先存着
+        self._tasks = []
+        self._cond = threading.Condition()
+        self._loop = None
+        self._thread = None
+        self._running = False
+
+    @classmethod
+    def from_exchanges(cls, exchanges, **kwargs):
+        """用 REST 客户端的密钥订阅推送 (REST 客户端留着给 expire() 核实订单)；模拟交易所直接挂到它的进程内推送上"""
+        credentials, mocks = {}, {}
+        for venue, exchange in exchanges.items():
+            if hasattr(exchange, 'push_listeners'):
+                mocks[venue] = exchange
+            elif exchange.id == 'hyperliquid' and exchange.walletAddress:
+                credentials[venue] = {'walletAddress': exchange.walletAddress, 'privateKey': exchange.privateKey}
+            elif exchange.apiKey and exchange.secret:
+                credentials[venue] = {'apiKey': exchange.apiKey, 'secret': exchange.secret}
+        tracker = cls(credentials, **kwargs)
+        tracker.rest = dict(exchanges)
+        for venue, exchange in mocks.items():
+            tracker.attach(venue, exchange)
+        return tracker
+
+    def attach(self, venue, exchange):
+        """挂到模拟交易所的进程内推送 (不用 WebSocket)"""
+        handlers = {'order': self.on_order, 'trade': self.on_trade, 'position': lambda v, p: self.on_positions(v, [p])}
+        exchange.push_listeners.append(lambda channel, payload: handlers[channel](venue, payload))
+        return self
+
+    # --- 生命周期 ---
+    def start(self):
+        if self._thread is not None or not self.credentials:
+            return self
+        self._running = True
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="ordertracker", daemon=True)
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._open(), self._loop).result()
+        return self
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._running = False
+        asyncio.run_coroutine_threadsafe(self._close(), self._loop).result(timeout=10)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=10)
+        self._thread = None
+
+    async def _open(self):
+        # ccxt.pro 只在真的要连推送时才导入：下单服务 / 回滚只用到这里的 new_client_order_id、is_ambiguous
+        import ccxt.pro as ccxtpro
+
+        for venue, credentials in self.credentials.items():
+            exchange = getattr(ccxtpro, VENUES[venue])(dict(credentials, enableRateLimit=True))
+            if venue in self.ws_urls:
+                override_ws_urls(exchange, self.ws_urls[venue])
+            self.exchanges[venue] = exchange
+            for channel in self.channels:
+                method = {'orders': 'watchOrders', 'trades': 'watchMyTrades', 'positions': 'watchPositions'}[channel]
+                if exchange.has.get(method):
+                    self._tasks.append(self._loop.create_task(self._watch(venue, channel)))
+
+    async def _close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        for exchange in self.exchanges.values():
+            await exchange.close()
+
+    async def _watch(self, venue, channel):
+        """单个私有频道的循环：出错后退避重连，重新订阅"""
+        exchange = self.exchanges[venue]
+        backoff = 0.5
+        while self._running:
+            try:
+                if channel == 'orders':
+                    for order in await exchange.watch_orders():
+                        self.on_order(venue, order)
+                elif channel == 'trades':
+                    for trade in await exchange.watch_my_trades():
+                        self.on_trade(venue, trade)
+                else:
+                    self.on_positions(venue, await exchange.watch_positions())
+                backoff = 0.5
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if not self._running:
+                    break
+                self.reconnects += 1
+                logger.warning(f"⚠️ {venue} 私有推送 ({channel}) 中断，{backoff:.1f}秒后重连: {e}")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 10.0)
+
+    # --- 登记 / REST 回报 ---
+    def track(self, venue, client_id, symbol=None, side=None, amount=None):
+        """下单前登记，返回 TrackedOrder"""
+        with self._cond:
+            entry = self.orders.get((venue, client_id))
+            if entry is None:
+                entry = self.orders[(venue, client_id)] = TrackedOrder(venue, client_id)
+                self._trim()
+            entry.symbol, entry.side = symbol or entry.symbol, side or entry.side
+            entry.amount = float(amount) if amount is not None else entry.amount
+            entry.sent_ns = entry.sent_ns or time.perf_counter_ns()
+            return entry
+
+    def bind(self, venue, client_id, order):
+        """create_order 的 REST 回报：对上交易所订单号，回报里已经是终态 (比如 IOC) 就直接确认"""
+        if order:
+            self._apply_order(venue, client_id, order, 'rest')
+
+    def reject(self, venue, client_id, error):
+        """
+        下单请求直接报错 (余额不足等)：交易所不会有推送，在这里记成 rejected。
+        超时这类网络错误不算 —— 订单可能已经到了交易所，保持 pending 等推送来确认 (429 限速是明确拒绝，照常记)
+        """
+        with self._cond:
+            entry = self.orders.get((venue, client_id))
+            if entry is None:
+                return
+            entry.error = str(error)
+            if entry.done or entry.id is not None or is_ambiguous(error):
+                return   # 已经有推送说明订单其实到了交易所，不能只凭 REST 报错判定
+            self._finish(entry, 'rejected', 'rest')
+
+    def settle(self, venue, client_id, timeout=0.5):
+        """
+        下单请求结果不明 (超时、连接断开) 时调用：最多等 timeout 秒，直到有推送说明订单的下落。
+        返回 TrackedOrder (可能已经成交，回报只是丢了)；还是 pending 说明推送没来，
+        不能就此当成没到交易所 —— 调用方按客户端订单号查 REST (find_order) 后交给 resolve()
+        """
+        key = (venue, str(client_id))
+        with self._cond:
+            self._cond.wait_for(lambda: key not in self.orders or self.orders[key].state != 'pending',
+                                timeout=timeout)
+            return self.orders.get(key)
+
+    def resolve(self, venue, client_id, order):
+        """
+        find_order 的结果：查到订单就和 REST 回报一样处理；确认交易所没有这笔单 (None) 且一直没有推送，记成 rejected。
+        返回 TrackedOrder
+        """
+        if order is not None:
+            self.bind(venue, client_id, order)
+            return self.get(venue, client_id)
+        with self._cond:
+            entry = self.orders.get((venue, str(client_id)))
+            if entry is None or entry.state != 'pending' or entry.pushes:
+                return entry
+            entry.error = f"{entry.error} (REST 查不到这笔订单，按未到达交易所处理)"
+            self._finish(entry, 'rejected', 'rest')
+        self._notify(entry)
+        return entry
+
+    def abandon(self, venue, client_id, handled):
+        """
+        调用方已经按成交量 handled 处理完这笔订单 (比如结果不明的开仓腿已经回滚 / 对冲)，
+        之后推送再报出来的成交 (超过 handled 的部分) 交给 late_fill_listeners
+        """
+        with self._cond:
+            entry = self.orders.get((venue, str(client_id)))
+            if entry is None:
+                return None
+            entry.handled = float(handled)
+        self._notify(entry)   # abandon 之前推送就已经多报了的，也在这里补上
+        return entry
+
+    def expire(self):
+        """
+        下单报错后超过 pending_timeout 仍没有任何推送的订单，按客户端订单号查一次 REST：
+        查到就按 REST 结果更新，确认交易所没有才记成 rejected；没有 REST 客户端或者查询出错的继续等。返回核实了几笔
+        """
+        deadline = time.perf_counter_ns() - int(self.pending_timeout * 1e9)
+        with self._cond:
+            stale = [o for o in self.orders.values()
+                     if o.state == 'pending' and o.error is not None and o.sent_ns < deadline and o.venue in self.rest]
+        resolved = 0
+        for entry in stale:
+            try:
+                order = find_order(self.rest[entry.venue], entry.symbol, entry.client_id)
+            except Exception as e:
+                logger.warning(f"⚠️ {entry.venue} 订单 {entry.client_id} 结果不明，REST 核实失败: {e}")
+                continue
+            self.resolve(entry.venue, entry.client_id, order)
+            resolved += 1
+        return resolved
+
+    def _revive(self, entry):
+        """没有推送、按 rejected 处理的订单后来又有推送：说明订单其实到了交易所，恢复成未完结，照常处理这条推送"""
+        if entry.state == 'rejected' and entry.confirmed_by != 'push':
+            entry.state, entry.done_ns, entry.confirmed_by = 'pending', 0, None
+
+    # --- 推送 ---
+    def on_order(self, venue, order):
+        """一条订单推送 (ccxt 订单结构)"""
+        client_id = order.get('clientOrderId')
+        with self._cond:
+            if client_id is None:
+                client_id = self._by_id.get((venue, str(order.get('id'))), f"id:{order.get('id')}")
+        self._apply_order(venue, str(client_id), order, 'push')
+
+    def on_trade(self, venue, trade):
+        """一条成交推送：按成交 id 去重后累加成交量、成交额和手续费"""
+        order_id = str(trade.get('order'))
+        with self._cond:
+            client_id = trade.get('clientOrderId') or self._by_id.get((venue, order_id))
+            entry = self.orders.get((venue, str(client_id))) if client_id else None
+            if entry is None:
+                self._orphan_trades.setdefault((venue, order_id), []).append(trade)
+                return
+            self._apply_trade(entry, trade)
+            self._cond.notify_all()
+        self._notify(entry)
+
+    def on_positions(self, venue, positions):
+        with self._cond:
+            for position in positions:
+                self.positions[(venue, position['symbol'])] = position
+            self._cond.notify_all()
+
+    def _apply_order(self, venue, client_id, order, source):
+        with self._cond:
+            entry = self.orders.get((venue, client_id))
+            if entry is None:
+                entry = self.orders[(venue, client_id)] = TrackedOrder(venue, client_id)
+                self._trim()
+            if source == 'push':
+                entry.pushes += 1
+                self._revive(entry)
+            if order.get('id') is not None and entry.id is None:
+                entry.id = str(order['id'])
+                self._by_id[(venue, entry.id)] = client_id
+                for trade in self._orphan_trades.pop((venue, entry.id), []):
+                    self._apply_trade(entry, trade)
+            entry.symbol = entry.symbol or order.get('symbol')
+            entry.side = entry.side or order.get('side')
+            if entry.amount is None and order.get('amount') is not None:
+                entry.amount = float(order['amount'])
+            filled, average, fee = order_progress(venue, order)
+            if filled is not None and filled >= entry.filled:
+                entry.filled = filled
+                entry.average = average or entry.average
+            if fee:
+                entry.fee += fee
+                entry.fee_currency = (order.get('fee') or {}).get('currency') or entry.fee_currency
+            if not entry.done:
+                state = _ORDER_STATES.get(order.get('status'))
+                if state is None and order.get('status') == 'open':
+                    state = 'partially_filled' if entry.filled > 0 else 'open'
+                if state in TERMINAL:
+                    self._finish(entry, state, source)
+                elif state is not None:
+                    entry.state = state
+                self._check_filled(entry, source)
+            self._cond.notify_all()
+        self._notify(entry)
+
+    def _apply_trade(self, entry, trade):
+        trade_id = trade.get('id')
+        if trade_id is not None and trade_id in entry.trade_ids:
+            return
+        entry.trade_ids.add(trade_id)
+        entry.pushes += 1
+        self._revive(entry)
+        amount = float(trade.get('amount') or 0.0)
+        entry.trade_filled += amount
+        entry.trade_cost += amount * float(trade.get('price') or 0.0)
+        entry.fee += float((trade.get('fee') or {}).get('cost') or 0.0)
+        entry.fee_currency = (trade.get('fee') or {}).get('currency') or entry.fee_currency
+        if entry.trade_filled > entry.filled:
+            entry.filled = entry.trade_filled
+            entry.average = entry.trade_cost / entry.trade_filled
+        if not entry.done:
+            if entry.state in ('pending', 'open'):
+                entry.state = 'partially_filled'
+            self._check_filled(entry, 'push')
+
+    def _check_filled(self, entry, source):
+        if not entry.done and entry.amount and entry.filled >= entry.amount - 1e-12:
+            self._finish(entry, 'filled', source)
+
+    def _finish(self, entry, state, source):
+        entry.state = state
+        entry.done_ns = time.perf_counter_ns()
+        entry.confirmed_by = source
+        if entry.confirm_ms is not None:
+            self.confirm_times.append((source, entry.confirm_ms))
+        self._cond.notify_all()
+
+    def _trim(self):
+        if len(self.orders) <= self.keep:
+            return
+        for key in [k for k, o in self.orders.items() if o.done][:len(self.orders) - self.keep]:
+            entry = self.orders.pop(key)
+            self._by_id.pop((entry.venue, entry.id), None)
+
+    def _notify(self, entry):
+        late = 0.0
+        with self._cond:
+            if entry.handled is not None and entry.filled > entry.handled + 1e-12:
+                late, entry.handled = entry.filled - entry.handled, entry.filled
+        for listener in self.listeners:
+            listener(entry)
+        if late:
+            for listener in self.late_fill_listeners:
+                listener(entry, late)
+
+    # --- 读取 ---
+    def get(self, venue, client_id):
+        return self.orders.get((venue, str(client_id)))
+
+    def wait(self, venue, client_id, states=TERMINAL, timeout=5.0, require_push=False):
+        """
+        阻塞等待订单进入 states 里的某个状态，返回 TrackedOrder；超时抛 TimeoutError。
+        require_push: 只认推送 (比如挂单要等交易所推送确认它真的挂在盘口上)
+        """
+        key = (venue, str(client_id))
+
+        def reached():
+            entry = self.orders.get(key)
+            return entry is not None and entry.state in states and (entry.pushes > 0 or not require_push)
+
+        with self._cond:
+            if not self._cond.wait_for(reached, timeout=timeout):
+                entry = self.orders.get(key)
+                state = entry.state if entry else '未登记'
+                raise TimeoutError(f"{venue} 订单 {client_id} 在 {timeout} 秒内没有进入 {states} (当前 {state})")
+            return self.orders[key]
+
+    def position(self, venue, symbol):
+        return self.positions.get((venue, symbol))
+
+    def summary(self):
+        """{'orders', 'open', 'push_confirmed', 'p50_ms', 'p99_ms'}，耗时是发出 -> 确认终态"""
+        self.expire()
+        with self._cond:
+            entries = list(self.orders.values())
+            times = sorted(ms for source, ms in self.confirm_times if source == 'push')
+        summary = {'orders': len(entries), 'open': sum(not o.done for o in entries), 'push_confirmed': len(times)}
+        if times:
+            summary.update(p50_ms=times[len(times) // 2], p99_ms=times[min(len(times) - 1, int(len(times) * 0.99))])
+        return summary
+
+
+def order_progress(venue, order):
+    """
+    (累计成交量, 均价, 这条推送带来的手续费)。
+    ccxt 解析 Backpack 订单推送时 filled 取的是这一笔成交的量 ('l')，累计量在 info['z']，
+    这一笔成交的手续费在 info['n'] (币种 info['N'] 不一定是 USDC)
+    """
+    info = order.get('info') or {}
+    if venue == 'bp' and isinstance(info, dict) and info.get('z') is not None:
+        filled = float(info['z'])
+        cost = float(info.get('Z') or 0.0)
+        fee = float(info['n']) if info.get('e') == 'orderFill' and info.get('n') else 0.0
+        return filled, (cost / filled if filled else None), fee
+    filled = order.get('filled')
+    return (None if filled is None else float(filled)), order.get('average'), 0.0
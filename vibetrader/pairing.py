@@ -0,0 +1,142 @@
+"""
+两边行情同时取、带时间戳的配对快照
+
+以前先取 Backpack 再取 Hyperliquid，HL 的报价总比 BP 晚一个完整的网络往返，
+diff_pct 其实是两个不同时刻的价格相减。这里用常驻线程池同时发出两个请求，
+每一腿都记下本地发送/接收时间和交易所时间戳，快照里给出明确的时差 (skew)。
+太旧或时差太大的快照在进入开平仓判断之前就被拒绝 (StaleSnapshotError)。
+
+depth > 0 时取的是 L2 盘口而不是 ticker，快照可以直接算可成交价差 (vibetrader.depth)。
+"""
+import concurrent.futures
+import time
+from dataclasses import dataclass
+
+from .depth import DepthBook, executable_spread
+from .strategy import compute_spread
+
+
+class StaleSnapshotError(Exception):
+    """快照太旧或两腿时差太大，不能拿来做决策"""
+
+
+def now_ms():
+    return time.time() * 1000
+
+
+@dataclass
+class LegQuote:
+    venue: str
+    symbol: str
+    bid: float
+    ask: float
+    last: float
+    exchange_ts: float  # 交易所给的时间戳 (ms)，可能为 None
+    sent_ms: float      # 本地发出请求的时间
+    recv_ms: float      # 本地收到回报的时间
+    book: DepthBook = None  # 按深度取行情时的 L2 盘口
+    bid_size: float = None  # 买一/卖一挂单量，交易所没给时为 None
+    ask_size: float = None
+
+    @property
+    def latency_ms(self):
+        return self.recv_ms - self.sent_ms
+
+    @property
+    def local_ms(self):
+        """没有交易所时间戳时，用往返的中点估计报价时刻"""
+        return (self.sent_ms + self.recv_ms) / 2
+
+
+@dataclass
+class PairedSnapshot:
+    bp: LegQuote
+    hl: LegQuote
+
+    @property
+    def use_exchange_clock(self):
+        # 两边都有交易所时间戳才用交易所时钟，避免混用两套时钟
+        return self.bp.exchange_ts is not None and self.hl.exchange_ts is not None
+
+    def quote_ms(self, leg):
+        return leg.exchange_ts if self.use_exchange_clock else leg.local_ms
+
+    @property
+    def skew_ms(self):
+        """两腿报价时刻之差"""
+        return abs(self.quote_ms(self.bp) - self.quote_ms(self.hl))
+
+    def age_ms(self, now=None):
+        """较旧那一腿距今多久"""
+        now = now_ms() if now is None else now
+        return now - min(self.quote_ms(self.bp), self.quote_ms(self.hl))
+
+    @property
+    def spread(self):
+        """(diff, diff_pct)，与 strategy.compute_spread 相同"""
+        return compute_spread(self.bp.last, self.hl.last)
+
+    def executable(self, amount):
+        """按两边盘口算 amount 数量真正能成交的价差 (需要以 depth > 0 取快照)"""
+        return executable_spread(self.bp.book, self.hl.book, amount)
+
+
+def _fetch_leg(venue, client, symbol, depth=0):
+    sent = now_ms()
+    book = None
+    if depth:
+        book = DepthBook.from_ccxt(venue, symbol, client.fetch_order_book(symbol, depth), depth)
+        ticker = book.ticker()
+    else:
+        ticker = client.fetch_ticker(symbol)
+    recv = now_ms()
+    if 'recv_ms' in ticker:
+        # 推送行情读的是缓存，报价时刻是推送到达的时间，而不是这次读取
+        sent = recv = ticker['recv_ms']
+    return LegQuote(venue, symbol, ticker.get('bid'), ticker.get('ask'), ticker['last'],
+                    ticker.get('timestamp'), sent, recv, book,
+                    ticker.get('bidVolume'), ticker.get('askVolume'))
+
+
+def fetch_paired(pool, client_bp, symbol_bp, client_hl, symbol_hl, depth=0):
+    """在常驻线程池上同时取两边行情，返回 PairedSnapshot；depth > 0 时取 L2 盘口"""
+    future_bp = pool.submit(_fetch_leg, 'bp', client_bp, symbol_bp, depth)
+    future_hl = pool.submit(_fetch_leg, 'hl', client_hl, symbol_hl, depth)
+    return PairedSnapshot(future_bp.result(), future_hl.result())
+
+
+class SnapshotGuard:
+    def __init__(self, max_age_ms=1500, max_skew_ms=300):
+        self.max_age_ms = max_age_ms
+        self.max_skew_ms = max_skew_ms
+        self.rejected = 0
+
+    def check(self, snapshot, now=None):
+        """不合格就抛 StaleSnapshotError，合格原样返回"""
+        age = snapshot.age_ms(now)
+        skew = snapshot.skew_ms
+        if age > self.max_age_ms:
+            self.rejected += 1
+            raise StaleSnapshotError(f"行情太旧: {age:.0f}ms > {self.max_age_ms}ms")
+        if skew > self.max_skew_ms:
+            self.rejected += 1
+            raise StaleSnapshotError(f"两腿时差太大: {skew:.0f}ms > {self.max_skew_ms}ms")
+        return snapshot
+
+
+class PairedQuoteFetcher:
+    """持有两边的行情客户端和常驻线程池，fetch() 直接返回检查过的快照"""
+
+    def __init__(self, client_bp, client_hl, max_age_ms=1500, max_skew_ms=300, depth=0):
+        self.client_bp = client_bp
+        self.client_hl = client_hl
+        self.depth = depth
+        self.guard = SnapshotGuard(max_age_ms, max_skew_ms)
+        self.pool = concurrent.futures.ThreadPoolExecutor(max_workers=2, thread_name_prefix="quotes")
+
+    def fetch(self, symbol_bp, symbol_hl):
+        snapshot = fetch_paired(self.pool, self.client_bp, symbol_bp, self.client_hl, symbol_hl, self.depth)
+        return self.guard.check(snapshot)
+
+    def close(self):
+        self.pool.shutdown(wait=False)
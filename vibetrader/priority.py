@@ -0,0 +1,171 @@
+"""
+按优先级排队的下单执行器
+
+额度紧张的时候，execute_dual_trade 里的每个请求都和行情轮询平等地抢令牌，
+包括 “单边成交” 之后那笔保命的回滚 create_order。这里把请求分成五类：
+
+    ROLLBACK (回滚/紧急平仓) > CLOSE (计划平仓) > OPEN (开仓) > MARKET_DATA (行情) > QUERY (余额/界面查询)
+
+- PriorityExecutor 用堆代替 FIFO 队列，空出来的工作线程总是先拿最高优先级的任务；
+  ROLLBACK 不进普通队列，由单独的紧急线程立即执行，不会排在已经占着线程的低优先级请求后面
+  (已经发出去的 HTTP 请求无法打断，只能保证不再排队)；
+- 每一类请求在共享令牌桶里拿令牌时都要给更高的类留出一部分额度 (RESERVE，占桶容量的比例)，
+  ROLLBACK 不留，所以低优先级请求永远抢不走最后那几个令牌；
+- 记录每一类从提交到开始执行的排队时间。
+
+当前线程的请求类别用 request_priority() 设置，ratelimit.install_rate_limiter 装的 throttle 会读取它。
+"""
+import concurrent.futures
+import contextlib
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+from enum import IntEnum
+
+
+class Priority(IntEnum):
+    ROLLBACK = 0
+    CLOSE = 1
+    OPEN = 2
+    MARKET_DATA = 3
+    QUERY = 4
+
+
+# 拿完令牌后桶里至少要剩下的比例 (留给更高优先级)
+RESERVE = {
+    Priority.ROLLBACK: 0.0,
+    Priority.CLOSE: 0.1,
+    Priority.OPEN: 0.2,
+    Priority.MARKET_DATA: 0.3,
+    Priority.QUERY: 0.4,
+}
+DEFAULT_PRIORITY = Priority.MARKET_DATA   # 没标记的请求 (看板刷新行情等) 按行情算
+
+_context = threading.local()
+
+
+def current_priority():
+    return getattr(_context, 'priority', DEFAULT_PRIORITY)
+
+
+def reserve_fraction():
+    """当前线程的请求需要给更高优先级留出的额度比例"""
+    return RESERVE[current_priority()]
+
+
+@contextlib.contextmanager
+def request_priority(priority):
+    """with request_priority(Priority.QUERY): exchange.fetch_balance()"""
+    previous = getattr(_context, 'priority', None)
+    _context.priority = Priority(priority)
+    try:
+        yield
+    finally:
+        if previous is None:
+            del _context.priority
+        else:
+            _context.priority = previous
+
+
+class QueueStats:
+    """每一类请求的排队时间 (提交 -> 开始执行)"""
+
+    def __init__(self, window=500):
+        self._samples = {p: deque(maxlen=window) for p in Priority}
+        self._counts = {p: 0 for p in Priority}
+        self._lock = threading.Lock()
+
+    def record(self, priority, delay_ms):
+        with self._lock:
+            self._samples[priority].append(delay_ms)
+            self._counts[priority] += 1
+
+    def summary(self):
+        """{类别名: {'count', 'p50_ms', 'p99_ms', 'max_ms'}}，只包含出现过的类别"""
+        with self._lock:
+            items = [(p, list(s), self._counts[p]) for p, s in self._samples.items() if self._counts[p]]
+        result = {}
+        for priority, samples, count in items:
+            samples.sort()
+            result[priority.name] = {
+                'count': count,
+                'p50_ms': samples[len(samples) // 2],
+                'p99_ms': samples[min(len(samples) - 1, int(len(samples) * 0.99))],
+                'max_ms': samples[-1],
+            }
+        return result
+
+
+class PriorityExecutor:
+    def __init__(self, workers=2, thread_name_prefix="prio", stats=None):
+        self.stats = stats or QueueStats()
+        self._heap = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._shutdown = False
+        self._threads = [
+            threading.Thread(target=self._worker, name=f"{thread_name_prefix}-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+        # 回滚专用：不跟其他请求抢工作线程
+        self._emergency = concurrent.futures.ThreadPoolExecutor(1, thread_name_prefix=f"{thread_name_prefix}-rollback")
+        self._emergency.submit(int)   # 线程是懒创建的，先起好，第一笔回滚不用等
+
+    def submit(self, fn, *args, priority=Priority.QUERY, **kwargs):
+        priority = Priority(priority)
+        future = concurrent.futures.Future()
+        task = (priority, time.perf_counter_ns(), future, fn, args, kwargs)
+        if priority == Priority.ROLLBACK:
+            self._emergency.submit(self._run, task)
+            return future
+        with self._cond:
+            if self._shutdown:
+                raise RuntimeError("PriorityExecutor 已关闭")
+            heapq.heappush(self._heap, (priority, next(self._seq), task))
+            self._cond.notify()
+        return future
+
+    def pending(self):
+        """{类别名: 排队中的任务数}"""
+        with self._cond:
+            counts = {}
+            for priority, _, _ in self._heap:
+                counts[priority.name] = counts.get(priority.name, 0) + 1
+        return counts
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while not self._heap and not self._shutdown:
+                    self._cond.wait()
+                if not self._heap:
+                    return
+                _, _, task = heapq.heappop(self._heap)
+            self._run(task)
+
+    def _run(self, task):
+        priority, submit_ns, future, fn, args, kwargs = task
+        if not future.set_running_or_notify_cancel():
+            return
+        self.stats.record(priority, (time.perf_counter_ns() - submit_ns) / 1e6)
+        try:
+            with request_priority(priority):
+                result = fn(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+        else:
+            future.set_result(result)
+
+    def shutdown(self, wait=True):
+        """不再接新任务，已排队的任务照常跑完"""
+        with self._cond:
+            self._shutdown = True
+            self._cond.notify_all()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+        self._emergency.shutdown(wait=wait)
@@ -0,0 +1,205 @@
+"""
+跨线程、跨进程共享的令牌桶限速器
+
+以前每个脚本各自 new 一个 ccxt 客户端，各自的 enableRateLimit 互不知情：
+看板、定时机器人、查余额脚本一起开，合起来的请求频率就超了交易所的限额；
+timetest.py 里遇到 429 只会匹配字符串然后整整 sleep(20)。
+
+现在每个 (交易所, API Key) 对应一个令牌桶，状态放在临时目录下一个 32 字节的文件里，
+各进程 mmap 同一个文件，用 fcntl.flock 做进程间互斥、threading.Lock 做线程间互斥。
+
+- 每个接口的权重沿用 ccxt 自带的表 (calculate_rate_limiter_cost，如 HL 的 l2Book=2)，
+  也可以用 weights 覆盖；
+- 收到 429 时读取 Retry-After 头 (秒数或 HTTP 日期)，整个桶在这段时间内暂停发放令牌，
+  所有进程一起退避，之后照常按满额度发请求；
+- 按当前线程的请求类别 (priority.request_priority) 给更高优先级预留额度，回滚请求不用排在行情刷新后面。
+
+    exchange = install_rate_limiter(ccxt.backpack({...}))
+"""
+import contextlib
+import email.utils
+import hashlib
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows：只做进程内限速
+    fcntl = None
+
+from ccxt.base.errors import DDoSProtection, RateLimitExceeded
+
+from .priority import reserve_fraction
+
+STATE = struct.Struct("<dddd")   # 剩余令牌, 上次补充时间, 暂停到, 累计 429 次数
+DEFAULT_BACKOFF = 5.0            # 429 没带 Retry-After 时的退避秒数
+
+
+def parse_retry_after(value):
+    """Retry-After 可以是秒数，也可以是 HTTP 日期；解析失败返回 None"""
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class SharedTokenBucket:
+    def __init__(self, name, rate, capacity, directory=None):
+        """
+        rate: 每秒补充的令牌数；capacity: 桶容量 (允许的突发量)
+        同名的桶在同一台机器上的所有进程之间共享
+        """
+        self.name = name
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.path = os.path.join(directory or tempfile.gettempdir(), f"vibetrader-ratelimit-{name}.bucket")
+        self.waited = 0.0        # 本进程累计等待秒数
+        self._lock = threading.Lock()
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        with self._lock:
+            self._flock(True)
+            try:
+                fresh = os.fstat(self._fd).st_size < STATE.size
+                if fresh:
+                    os.ftruncate(self._fd, STATE.size)
+                self._map = mmap.mmap(self._fd, STATE.size)
+                if fresh:
+                    self._map[:] = STATE.pack(self.capacity, time.time(), 0.0, 0.0)
+            finally:
+                self._flock(False)
+
+    def _flock(self, exclusive):
+        if fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_UN)
+
+    @contextlib.contextmanager
+    def _locked(self):
+        """线程锁 + 文件锁，期间可以读写共享状态"""
+        with self._lock:
+            self._flock(True)
+            try:
+                yield self._map
+            finally:
+                self._flock(False)
+
+    def _refill(self, state, now):
+        tokens, updated, blocked_until, penalties = state
+        tokens = min(self.capacity, tokens + max(0.0, now - updated) * self.rate)
+        return tokens, now, blocked_until, penalties
+
+    def try_acquire(self, cost=1.0, floor=0.0):
+        """
+        不等待：拿到令牌返回 0，否则返回建议的等待秒数。
+        floor: 拿完之后桶里至少要剩这么多 (给更高优先级的请求预留额度)
+        """
+        cost = min(float(cost), self.capacity)
+        floor = min(floor, self.capacity - cost)
+        with self._locked() as m:
+            now = time.time()
+            tokens, updated, blocked_until, penalties = self._refill(STATE.unpack(m[:STATE.size]), now)
+            if now < blocked_until:
+                wait = blocked_until - now
+            elif tokens - cost >= floor:
+                tokens -= cost
+                wait = 0.0
+            else:
+                wait = (cost + floor - tokens) / self.rate
+            m[:STATE.size] = STATE.pack(tokens, updated, blocked_until, penalties)
+        return wait
+
+    def acquire(self, cost=1.0, floor=0.0):
+        """阻塞直到拿到 cost 个令牌，返回等待了多少秒"""
+        waited = 0.0
+        while True:
+            wait = self.try_acquire(cost, floor)
+            if wait <= 0:
+                self.waited += waited
+                return waited
+            time.sleep(min(wait, 1.0))
+            waited += min(wait, 1.0)
+
+    def penalize(self, retry_after=None):
+        """收到 429：清空令牌，在 retry_after 秒内所有进程都不再发请求"""
+        retry_after = DEFAULT_BACKOFF if retry_after is None else retry_after
+        with self._locked() as m:
+            tokens, updated, blocked_until, penalties = STATE.unpack(m[:STATE.size])
+            now = time.time()
+            m[:STATE.size] = STATE.pack(0.0, now, max(blocked_until, now + retry_after), penalties + 1)
+        return retry_after
+
+    def snapshot(self):
+        """{'tokens', 'blocked_for', 'penalties'}，用于看板展示"""
+        with self._locked() as m:
+            now = time.time()
+            tokens, _, blocked_until, penalties = self._refill(STATE.unpack(m[:STATE.size]), now)
+        return {"tokens": tokens, "blocked_for": max(0.0, blocked_until - now), "penalties": int(penalties)}
+
+
+def bucket_name(exchange):
+    """同一个交易所 + 同一个 Key 共用一个桶；没有 Key 的公共请求按 IP 算，共用 public 桶"""
+    identity = getattr(exchange, 'apiKey', None) or getattr(exchange, 'walletAddress', None) or "public"
+    digest = hashlib.sha1(str(identity).encode()).hexdigest()[:12]
+    return f"{exchange.id}-{digest}"
+
+
+def install_rate_limiter(exchange, burst_seconds=1.0, weights=None, directory=None):
+    """
+    给 ccxt 实例装上共享限速器，返回同一个实例。
+    weights: {接口 path: 权重}，覆盖 ccxt 自带的权重表
+    """
+    if getattr(exchange, 'shared_limiter', None) is not None:
+        return exchange
+    rate = 1000.0 / exchange.rateLimit   # ccxt 的 rateLimit 是每个权重单位的毫秒数
+    bucket = SharedTokenBucket(bucket_name(exchange), rate, max(rate * burst_seconds, 1.0), directory)
+    exchange.enableRateLimit = True
+    exchange.shared_limiter = bucket
+
+    def throttle(cost=None):
+        # 低优先级请求拿完令牌后要给更高优先级留出 reserve_fraction() 的额度
+        return bucket.acquire(1 if cost is None else cost, reserve_fraction() * bucket.capacity)
+    exchange.throttle = throttle
+
+    if weights:
+        calculate_cost = exchange.calculate_rate_limiter_cost
+
+        def weighted_cost(api, method, path, params, config={}):
+            if path in weights:
+                return weights[path]
+            return calculate_cost(api, method, path, params, config)
+        exchange.calculate_rate_limiter_cost = weighted_cost
+
+    handle_errors = exchange.handle_errors
+    fetch = exchange.fetch
+    penalized = threading.local()
+
+    def handle_errors_with_retry_after(code, reason, url, method, headers, body, response, request_headers, request_body):
+        if code in (429, 418):
+            retry_after = parse_retry_after((headers or {}).get('Retry-After') or (headers or {}).get('retry-after'))
+            bucket.penalize(retry_after)
+            penalized.flag = True
+        return handle_errors(code, reason, url, method, headers, body, response, request_headers, request_body)
+
+    def fetch_with_backoff(url, method='GET', headers=None, body=None):
+        penalized.flag = False
+        try:
+            return fetch(url, method, headers, body)
+        except (RateLimitExceeded, DDoSProtection):
+            # 交易所用错误码 (而不是 HTTP 429) 报限频时，也按默认时长退避
+            if not getattr(penalized, 'flag', False):
+                bucket.penalize()
+            raise
+
+    exchange.handle_errors = handle_errors_with_retry_after
+    exchange.fetch = fetch_with_backoff
+    return exchange
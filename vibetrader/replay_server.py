@@ -0,0 +1,102 @@
+"""
+本地 WebSocket 回放服务器 (交易所替身)
+
+读取 MarketDataStream 录制的 {venue}.frames.jsonl，客户端连上 ws://host:port/{venue}
+并发出第一条订阅消息后，按原始时间间隔 (可用 --speed 加速) 把帧原样推回去。
+帧是交易所原始格式，所以 ccxt.pro 的解析逻辑和线上完全一样。
+
+    python -m vibetrader.replay_server recordings --port 8765 --speed 10 --loop
+"""
+import argparse
+import asyncio
+import json
+import os
+
+from websockets.asyncio.server import serve
+from websockets.exceptions import ConnectionClosed
+
+
+def load_frames(path):
+    frames = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                frames.append(json.loads(line))
+    return frames
+
+
+class ReplayServer:
+    def __init__(self, record_dir, host="127.0.0.1", port=8765, speed=1.0, loop=False):
+        self.host = host
+        self.port = port
+        self.speed = speed
+        self.loop = loop
+        self.frames = {}
+        for name in os.listdir(record_dir):
+            if name.endswith(".frames.jsonl"):
+                venue = name.split(".")[0]
+                self.frames[venue] = load_frames(os.path.join(record_dir, name))
+
+    async def handler(self, connection):
+        venue = connection.request.path.strip("/")
+        frames = self.frames.get(venue)
+        if not frames:
+            await connection.close(code=1008, reason=f"no recording for {venue}")
+            return
+
+        # 等客户端发出订阅，再开始推送
+        try:
+            await connection.recv()
+        except ConnectionClosed:
+            return
+        replies = asyncio.create_task(self._answer_pings(connection))
+        try:
+            while True:
+                prev_t = frames[0]["t"]
+                for frame in frames:
+                    delay = (frame["t"] - prev_t) / 1000 / self.speed
+                    prev_t = frame["t"]
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                    await connection.send(json.dumps(frame["msg"]))
+                if not self.loop:
+                    break
+        except ConnectionClosed:
+            pass  # 客户端断开 (测试结束或模拟重连)
+        finally:
+            replies.cancel()
+
+    async def _answer_pings(self, connection):
+        """回应心跳，其余消息 (重复订阅等) 忽略"""
+        async for raw in connection:
+            try:
+                msg = json.loads(raw)
+            except ValueError:
+                continue
+            if isinstance(msg, dict) and msg.get("method") == "ping":
+                await connection.send(json.dumps({"channel": "pong"}))
+
+    async def serve_forever(self):
+        async with serve(self.handler, self.host, self.port) as server:
+            print(f"🎞️ 回放服务器已启动: ws://{self.host}:{self.port}/{{{','.join(self.frames)}}}")
+            await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="本地 WebSocket 行情回放服务器")
+    parser.add_argument("record_dir")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--speed", type=float, default=1.0, help="回放倍速")
+    parser.add_argument("--loop", action="store_true", help="播完后从头循环")
+    args = parser.parse_args(argv)
+    server = ReplayServer(args.record_dir, args.host, args.port, args.speed, args.loop)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        print("\n🛑 回放结束。")
+
+
+if __name__ == "__main__":
+    main()
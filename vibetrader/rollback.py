@@ -0,0 +1,356 @@
+"""
+单边成交回滚：按实际成交量、逐级加码、带时间预算
+
+以前的回滚就是在已成交的那一边按下单数量 amount 反向发一笔市价单，失败了打一行
+"💀 致命错误…请手动操作" 就不管了：部分成交时会多平 (甚至反手)，原单到底成交了多少也没确认，
+一笔 429 就让仓位裸奔到人来处理。
+
+RollbackEngine 的做法：
+
+- 先确认原单的实际成交量：订单回报里的 filled，没有就等私有推送 (ExecutionService.tracker)，再没有就按订单号查一次 (fetch_order)，
+  还查不到才按下单数量算 (RollbackResult.assumed)，这时回滚单带 reduceOnly 兜底不会多平；
+  成交量确认过就不带 reduceOnly —— 同一个交易对上可能还有别的实例的仓位，净仓位方向不一定是这一笔的；
+- 只平掉确认的成交量，逐级加码：IOC 限价 (参考价 ±0.3%) -> 更宽的 IOC (±1%) -> 市价，
+  每一级只补上一级没成交的剩余量；开仓时预先签好的回滚单 (signing.PrebuiltOrder) 数量对得上就先发它；
+- 所有请求都走 Priority.ROLLBACK 的专用线程；两边都要回滚时 (flatten_legs) 各交易所并发进行；
+  同一个交易所上逐级串行 (IOC 的回报就是最终结果，不会有两笔回滚单同时在路上导致多平)；
+  被限速/超时后按指数退避重试最后一级，InvalidOrder 这种重试也没用的错误直接放弃；
+  每一级回滚单 (包括预签的) 都带客户端订单号，超时的那一级先等推送、再按客户端订单号查 REST (查询失败在预算内重试)，
+  确认成交了多少再加码 (回报丢了也不会重复平)；减仓方向的回滚出现过一次结果不明，后面每一级都强制 reduceOnly，
+  就算没查清楚重复平了，最多平到零不会反手；重新开仓方向 (回滚平仓腿) 带不了 reduceOnly，查不清楚就停下报错；
+- 有硬性时间预算 (budget 秒)，到点不管平没平都返回，剩余量写进结果和日志；
+- 记录 time-to-flat：从已成交那一腿收到回报 (裸露敞口开始) 到剩余量归零的耗时，
+  这个数决定了裸敞口尾部有多长，summary() 给出分位数。
+
+    result = service.rollbacks.flatten_leg(leg_bp)
+    result.flat, result.remaining, result.time_to_flat_ms
+"""
+import concurrent.futures
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+
+from ccxt.base.errors import InvalidOrder
+
+from .ordertracker import is_ambiguous, new_client_order_id
+from .priority import Priority
+from .trading import fill_price, needs_reference_price
+
+# (级别名, 相对参考价的滑点)；'market' 级别对 Hyperliquid 来说还是带滑点上限的 IOC，只是给得很宽
+STAGES = (('ioc', 0.003), ('ioc_wide', 0.01), ('market', 0.05))
+
+
+@dataclass
+class RollbackAttempt:
+    stage: str
+    amount: float
+    price: float = None
+    filled: float = 0.0
+    order: dict = None
+    error: str = None
+    ms: float = 0.0
+
+
+@dataclass
+class RollbackResult:
+    venue: str
+    symbol: str
+    side: str              # 回滚单的方向
+    target: float          # 要平掉的数量 (确认过的成交量)
+    filled: float = 0.0
+    assumed: bool = False  # 原单成交量没确认到，按下单数量算的
+    attempts: list = field(default_factory=list)
+    exposure_ns: int = 0   # 裸敞口开始 (已成交那一腿收到回报)
+    flat_ns: int = 0       # 剩余量归零的时刻，没平掉为 0
+    error: str = None
+
+    @property
+    def remaining(self):
+        return max(0.0, self.target - self.filled)
+
+    @property
+    def flat(self):
+        return self.flat_ns > 0
+
+    @property
+    def time_to_flat_ms(self):
+        return (self.flat_ns - self.exposure_ns) / 1e6 if self.flat else None
+
+    @property
+    def orders(self):
+        return [a.order for a in self.attempts if a.order and a.filled]
+
+
+def order_filled(order):
+    """订单回报里的成交量，没有这个字段返回 None"""
+    if not order:
+        return None
+    filled = order.get('filled')
+    return None if filled is None else float(filled)
+
+
+class RollbackEngine:
+    def __init__(self, service, stages=STAGES, budget=5.0, dust=1e-9, retry_pause=0.05, keep=500, confirm_timeout=1.0):
+        """
+        service: ExecutionService (用它的交易所、参考价和 ROLLBACK 专用线程)
+        stages: 逐级加码的 (级别名, 滑点)
+        budget: 每次回滚的硬性时间预算 (秒)
+        dust: 剩余量小于它 (或按交易所精度取整后为 0) 就算平掉了
+        retry_pause: 下单出错后稍等多久再试 (连续出错时翻倍，最多 0.5 秒)
+        confirm_timeout: 回报里没有成交量时，最多等私有推送多少秒
+        """
+        self.service = service
+        self.stages = stages
+        self.budget = budget
+        self.dust = dust
+        self.retry_pause = retry_pause
+        self.confirm_timeout = confirm_timeout
+        self.history = deque(maxlen=keep)
+        self._pool = concurrent.futures.ThreadPoolExecutor(4, thread_name_prefix="rollback-ctl")
+        self._lock = threading.Lock()
+
+    # --- 成交量 ---
+    def confirmed_fill(self, leg):
+        """(实际成交量, 是否只是按下单数量估的)；回报里没有 filled 时先等推送，再按订单号查一次"""
+        filled = order_filled(leg.order)
+        tracker = getattr(self.service, 'tracker', None)
+        if filled is None and tracker is not None and leg.client_id:
+            try:
+                filled = tracker.wait(leg.venue, leg.client_id, timeout=self.confirm_timeout).filled
+            except TimeoutError:
+                filled = None
+        if filled is None and leg.order and leg.order.get('id'):
+            try:
+                order = self._call(leg.venue, self.service.exchanges[leg.venue].fetch_order, leg.order['id'],
+                                   leg.symbol, timeout=self.budget)
+                filled = order_filled(order)
+            except Exception:
+                filled = None
+        if filled is None:
+            return leg.amount, True
+        return filled, False
+
+    def is_dust(self, venue, symbol, amount):
+        """数量小到可以忽略 (或按交易所精度取整后为 0)"""
+        if amount <= self.dust:
+            return True
+        exchange = self.service.exchanges[venue]
+        if hasattr(exchange, 'amount_to_precision'):
+            try:
+                return float(exchange.amount_to_precision(symbol, amount)) <= 0
+            except Exception:
+                return True   # 低于交易所最小下单量，发不出去，也只能算平掉
+        return False
+
+    # --- 下单 ---
+    def _call(self, venue, fn, *args, timeout=None):
+        future = self.service.pools[venue].submit(fn, *args, priority=Priority.ROLLBACK)
+        return future.result(timeout=timeout)
+
+    def _base_price(self, result, filled_order):
+        """加码的基准价：最新行情，没有就用原单成交价，都没有才查一次"""
+        price = self.service.reference_price(result.venue, result.symbol) or fill_price(filled_order)
+        if price is None:
+            price = self.service.exchanges[result.venue].fetch_ticker(result.symbol)['last']
+            self.service.note_price(result.venue, result.symbol, price)
+        return float(price)
+
+    def _send(self, result, stage, slippage, amount, base, reduce_only, prebuilt, client_id=None):
+        exchange = self.service.exchanges[result.venue]
+        if prebuilt is not None:
+            return prebuilt.send(), None
+        params = {'reduceOnly': True} if reduce_only else {}
+        if client_id is not None:
+            params['clientOrderId'] = client_id
+        if stage == 'market':
+            if needs_reference_price(exchange):
+                return exchange.create_order(result.symbol, 'market', result.side, amount, base,
+                                             dict(params, slippage=slippage)), base
+            return exchange.create_order(result.symbol, 'market', result.side, amount, None, params), None
+        price = base * (1 + slippage) if result.side == 'buy' else base * (1 - slippage)
+        if hasattr(exchange, 'price_to_precision'):
+            price = float(exchange.price_to_precision(result.symbol, price))
+        return exchange.create_order(result.symbol, 'limit', result.side, amount, price,
+                                     dict(params, timeInForce='IOC')), price
+
+    def _resolve(self, attempt, venue, symbol, client_id, deadline, retry=True):
+        """
+        回滚单结果不明：等推送 / 按客户端订单号查 REST，确认它到底成交了多少，回报丢了也按实际成交算，下一级只补剩下的。
+        retry: 查询失败就在时间预算内退避重试；返回是否查清楚了
+        """
+        pause = self.retry_pause
+        while True:
+            left = deadline - time.monotonic()
+            if left <= 0:
+                return False
+            order, known = self.service.resolve_order(venue, symbol, client_id, Priority.ROLLBACK, left)
+            if known:
+                break
+            if not retry:
+                return False
+            time.sleep(min(pause, max(0.0, deadline - time.monotonic())))
+            pause = min(pause * 2, 0.5)
+        filled = order_filled(order)
+        if filled:
+            attempt.order = order
+            attempt.filled = min(filled, attempt.amount)
+        return True
+
+    def flatten(self, venue, symbol, side, amount, filled_order=None, prebuilt=None, exposure_ns=None,
+                reduce_only=True, assumed=False, budget=None, reduces=False):
+        """
+        在 venue 上按 side 成交 amount (回滚单)，逐级加码直到成交完或者用完时间预算，返回 RollbackResult。
+        filled_order: 需要回滚的原单 (用它的成交价做基准价)
+        prebuilt: 预先签好的回滚单，数量和 amount 一致且还有效时作为第一级发出
+        reduce_only: 回滚单带 reduceOnly
+        budget: 这一次的时间预算 (秒)，默认用 self.budget
+        reduces: 回滚单是在减仓 (回滚开仓腿)。这时某一级结果不明 (超时、回报丢了) 之后的各级都强制带 reduceOnly；
+                 不是减仓 (或者不知道) 的话结果查不清楚就停下，不冒重复下单的险
+        """
+        started = time.perf_counter_ns()
+        tracker = getattr(self.service, 'tracker', None)
+        budget = self.budget if budget is None else budget
+        deadline = time.monotonic() + budget
+        result = RollbackResult(venue, symbol, side, float(amount), assumed=assumed,
+                                exposure_ns=exposure_ns or started)
+        if prebuilt is not None and (not prebuilt.valid or abs(prebuilt_amount(prebuilt) - amount) > self.dust):
+            prebuilt = None
+        stages = ([('prebuilt', None)] if prebuilt is not None else []) + list(self.stages)
+        base = None
+        index = 0
+        errors = 0
+        while not self.is_dust(venue, symbol, result.remaining):
+            left = deadline - time.monotonic()
+            if left <= 0:
+                result.error = f"超过时间预算 {budget:.1f}s，剩余 {result.remaining:g}"
+                break
+            stage, slippage = stages[min(index, len(stages) - 1)]
+            index += 1
+            attempt = RollbackAttempt(stage, result.remaining)
+            attempt_started = time.perf_counter()
+            client_id = prebuilt.client_order_id if stage == 'prebuilt' else new_client_order_id(venue)
+            if tracker is not None and client_id is not None:
+                tracker.track(venue, client_id, symbol, side, attempt.amount)
+            ambiguous = False
+            try:
+                if base is None and stage != 'prebuilt':
+                    base = self._call(venue, self._base_price, result, filled_order, timeout=left)
+                    left = deadline - time.monotonic()
+                order, attempt.price = self._call(venue, self._send, result, stage, slippage, attempt.amount, base,
+                                                  reduce_only, prebuilt if stage == 'prebuilt' else None, client_id,
+                                                  timeout=left)
+                attempt.order = order
+                attempt.filled = min(order_filled(order) or 0.0, attempt.amount)
+                if tracker is not None and client_id is not None:
+                    tracker.bind(venue, client_id, order)
+            except concurrent.futures.TimeoutError:
+                attempt.error = "请求在时间预算内没有返回 (可能已经成交)"
+                ambiguous = True
+            except InvalidOrder as e:
+                attempt.error = str(e)
+                if index >= len(stages):
+                    result.error = f"回滚单被拒绝: {e}"   # 最后一级也被拒，重试没用
+            except Exception as e:
+                attempt.error = str(e)
+                ambiguous = is_ambiguous(e)
+                if tracker is not None and client_id is not None:
+                    tracker.reject(venue, client_id, e)
+            if ambiguous:
+                # 这一级可能已经成交了：先查清楚成交了多少；减仓方向后面重发的各级再靠 reduceOnly 兜底 (不用反复查)，不会反手
+                reduce_only = reduce_only or reduces
+                known = client_id is not None and self._resolve(attempt, venue, symbol, client_id, deadline,
+                                                                 retry=not reduce_only)
+                if not known and not reduce_only:
+                    result.error = f"{stage} 回滚单结果不明 (可能已经成交)，查不清楚，不再加码以免重复下单"
+            attempt.ms = (time.perf_counter() - attempt_started) * 1000
+            result.attempts.append(attempt)
+            result.filled += attempt.filled
+            if result.error:
+                break
+            errors = errors + 1 if attempt.error else 0
+            if errors and self.retry_pause:
+                pause = min(self.retry_pause * 2 ** (errors - 1), 0.5)
+                time.sleep(min(pause, max(0.0, deadline - time.monotonic())))
+        if self.is_dust(venue, symbol, result.remaining):
+            result.flat_ns = time.perf_counter_ns()
+            result.error = None
+        with self._lock:
+            self.history.append(result)
+        return result
+
+    def submit(self, venue, symbol, side, amount, **kwargs):
+        """在回滚线程池上异步 flatten (比如推送线程里发现迟到的成交)，返回 Future"""
+        return self._pool.submit(self.flatten, venue, symbol, side, amount, **kwargs)
+
+    def flatten_leg(self, leg, reduce_only=True, amount=None):
+        """
+        把已成交的一腿 (ExecutionService 的 LegResult) 按实际成交量反向平掉。
+        amount: 只平这么多 (两腿成交量不一致时平掉多出来的部分)，默认是确认过的成交量
+        reduce_only: 回滚开仓腿时为 True (成交量没确认到时才真的带 reduceOnly)；
+                     回滚平仓腿 (重新开回去) 时必须为 False
+        """
+        filled, assumed = self.confirmed_fill(leg)
+        side = 'sell' if leg.side == 'buy' else 'buy'
+        return self.flatten(leg.venue, leg.symbol, side, filled if amount is None else amount, leg.order,
+                            leg.rollback if reduce_only else None, leg.ack_ns or None, reduce_only and assumed,
+                            assumed, reduces=reduce_only)
+
+    def flatten_legs(self, jobs):
+        """[(leg, 数量或 None), ...] 在各自交易所并发回滚，返回 RollbackResult 列表 (顺序同 jobs)"""
+        futures = [self._pool.submit(self.flatten_leg, leg, True, amount) for leg, amount in jobs]
+        return [f.result() for f in futures]
+
+    def rebalance(self, leg_a, leg_b, reduce_only=True):
+        """
+        两腿都有回报但成交量不一致 (部分成交) 时，把多成交的那一腿平掉差额，返回 RollbackResult；
+        两边一致返回 None
+        """
+        filled_a, assumed_a = self.confirmed_fill(leg_a)
+        filled_b, assumed_b = self.confirmed_fill(leg_b)
+        excess = filled_a - filled_b
+        if self.is_dust(leg_a.venue, leg_a.symbol, abs(excess)):
+            return None
+        leg = leg_a if excess > 0 else leg_b
+        side = 'sell' if leg.side == 'buy' else 'buy'
+        assumed = assumed_a or assumed_b
+        return self.flatten(leg.venue, leg.symbol, side, abs(excess), leg.order, None, max(leg_a.ack_ns, leg_b.ack_ns),
+                            reduce_only and assumed, assumed, reduces=reduce_only)
+
+    # --- 统计 ---
+    def summary(self):
+        """{'count', 'flat', 'p50_ms', 'p99_ms', 'max_ms', 'stages': {级别: 次数}}，时间是 time-to-flat"""
+        with self._lock:
+            results = list(self.history)
+        times = sorted(r.time_to_flat_ms for r in results if r.flat)
+        stages = {}
+        for r in results:
+            for a in r.attempts:
+                stages[a.stage] = stages.get(a.stage, 0) + 1
+        summary = {'count': len(results), 'flat': len(times), 'stages': stages}
+        if times:
+            summary.update(p50_ms=times[len(times) // 2], p99_ms=times[min(len(times) - 1, int(len(times) * 0.99))],
+                           max_ms=times[-1])
+        return summary
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False)
+
+
+def prebuilt_amount(prebuilt):
+    """预签 Hyperliquid 订单里的数量"""
+    try:
+        return float(prebuilt.request['action']['orders'][0]['s'])
+    except (KeyError, IndexError, TypeError, ValueError):
+        return -1.0
+
+
+def format_rollback(result, name):
+    """一行回滚日志：成交了多少、用了哪几级、time-to-flat"""
+    stages = " -> ".join(f"{a.stage}{'✓' if a.filled else '✗'}" for a in result.attempts) or "无"
+    note = " (原单成交量未确认，按下单数量回滚)" if result.assumed else ""
+    if result.flat:
+        return (f"✅ 回滚成功：{name} 已平掉 {result.filled:g}/{result.target:g}{note} | {stages} | "
+                f"time-to-flat {result.time_to_flat_ms:.0f}ms")
+    return (f"💀 致命错误：回滚 {name} 没有平完！剩余 {result.remaining:g}/{result.target:g}，请手动操作！{note} | "
+            f"{stages} | {result.error}")
@@ -0,0 +1,119 @@
+"""
+多币种跨所价差扫描
+
+启动时两边各 load_markets 一次，建好共有永续合约的索引 (symbols.shared_perps)；
+之后每一轮每个交易所只发一个 fetch_tickers 请求，拿到全部报价后在本地算价差排名。
+盯 100 多个币对的 API 消耗和盯一个币对一样，都是每轮两个请求。
+
+    python -m vibetrader.scanner --top 20 --interval 5
+"""
+import argparse
+import concurrent.futures
+import time
+from dataclasses import dataclass
+
+from .strategy import compute_spread
+from .symbols import shared_perps
+
+
+@dataclass
+class ScanRow:
+    key: str            # 归一化后的键，如 'PEPE/USDC:USDC'
+    symbol_bp: str
+    symbol_hl: str
+    price_bp: float     # 已按合约乘数换算成 1 个币的价格
+    price_hl: float
+    diff: float         # 美元价差 (每个币)
+    diff_pct: float
+    volume_usd: float   # 两边 24h 成交额较小的一边
+
+
+def ticker_price(ticker):
+    """fetch_tickers 的结构里 last 不一定有 (HL 给 mid，BP 给 last)，依次兜底"""
+    if not ticker:
+        return None
+    price = ticker.get("last") or ticker.get("close")
+    if price is None and ticker.get("bid") and ticker.get("ask"):
+        price = (ticker["bid"] + ticker["ask"]) / 2
+    return price
+
+
+class SpreadScanner:
+    def __init__(self, client_bp, client_hl):
+        self.client_bp = client_bp
+        self.client_hl = client_hl
+        self.pool = concurrent.futures.ThreadPoolExecutor(max_workers=2, thread_name_prefix="scanner")
+        # 市场列表只加载一次
+        markets_bp, markets_hl = self.pool.map(lambda c: c.load_markets(), (client_bp, client_hl))
+        self.index = shared_perps(markets_bp, markets_hl)
+
+    def fetch_all(self):
+        """每个交易所一个 fetch_tickers，同时发出"""
+        future_bp = self.pool.submit(self.client_bp.fetch_tickers)
+        future_hl = self.pool.submit(self.client_hl.fetch_tickers, None, {"type": "swap"})
+        return future_bp.result(), future_hl.result()
+
+    def scan(self, min_volume_usd=0.0, sort_by="pct"):
+        """返回按 |价差| 从大到小排好的 ScanRow 列表；sort_by 为 'pct' 或 'usd'"""
+        tickers_bp, tickers_hl = self.fetch_all()
+        rows = []
+        for key, ((symbol_bp, mult_bp), (symbol_hl, mult_hl)) in self.index.items():
+            t_bp, t_hl = tickers_bp.get(symbol_bp), tickers_hl.get(symbol_hl)
+            p_bp, p_hl = ticker_price(t_bp), ticker_price(t_hl)
+            if not p_bp or not p_hl:
+                continue
+            p_bp, p_hl = p_bp / mult_bp, p_hl / mult_hl
+            volume = min(t_bp.get("quoteVolume") or 0.0, t_hl.get("quoteVolume") or 0.0)
+            if volume < min_volume_usd:
+                continue
+            diff, diff_pct = compute_spread(p_bp, p_hl)
+            rows.append(ScanRow(key, symbol_bp, symbol_hl, p_bp, p_hl, diff, diff_pct, volume))
+        if sort_by == "usd":
+            rows.sort(key=lambda r: abs(r.diff), reverse=True)
+        else:
+            rows.sort(key=lambda r: abs(r.diff_pct), reverse=True)
+        return rows
+
+    def close(self):
+        self.pool.shutdown(wait=False)
+
+
+def main(argv=None):
+    from .exchanges import init_exchanges
+
+    parser = argparse.ArgumentParser(description="Backpack / Hyperliquid 共有永续合约的价差扫描")
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--interval", type=float, default=5.0)
+    parser.add_argument("--min-volume", type=float, default=0.0, help="24h 成交额下限 (USDC)")
+    parser.add_argument("--sort", choices=("pct", "usd"), default="pct")
+    parser.add_argument("--once", action="store_true")
+    args = parser.parse_args(argv)
+
+    exchanges = init_exchanges()
+    scanner = SpreadScanner(exchanges['bp'], exchanges['hl'])
+    print(f"📚 两边共有 {len(scanner.index)} 个永续合约")
+    try:
+        while True:
+            started = time.perf_counter()
+            try:
+                rows = scanner.scan(args.min_volume, args.sort)
+            except Exception as e:
+                print(f"⚠️ 扫描失败: {e}")
+                rows = None
+            if rows is not None:
+                elapsed = (time.perf_counter() - started) * 1000
+                print(f"\n⏱️ {time.strftime('%H:%M:%S')} | {len(rows)} 个币对 | 2 个请求 | {elapsed:.0f}ms")
+                for r in rows[:args.top]:
+                    print(f"{r.key:<20} BP {r.price_bp:>14.6f}  HL {r.price_hl:>14.6f}  "
+                          f"{r.diff_pct:+.4f}%  ${r.diff:+.6f}  量 ${r.volume_usd:,.0f}")
+            if args.once:
+                break
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        print("\n🛑 停止扫描。")
+    finally:
+        scanner.close()
+
+
+if __name__ == "__main__":
+    main()
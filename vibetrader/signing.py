@@ -0,0 +1,269 @@
+"""
+下单签名：密钥只解析一次 + 线程安全的本地 nonce + 预先签好的订单
+
+ccxt 每下一笔 Hyperliquid 订单都要在调用线程上用纯 Python 做一遍 EIP-712：
+msgpack 打包、9 次 keccak (域分隔符、类型哈希这些常量每次都重算)、再重新解析一次私钥做 secp256k1 签名，
+一笔单 5ms 左右，全部落在 execute_dual_trade 的发单路径上。Backpack 每个私有请求也要重新解析一次 ED25519 私钥。
+而且 ccxt 的 incrementing_nonce 加锁是空操作，多线程同时下单可能拿到同一个 nonce。
+
+install_signer() 给 ccxt 实例换上缓存过的签名器：
+
+- 私钥只解析一次 (coincurve / cryptography 的密钥对象常驻)；
+- Hyperliquid 的域分隔符和 Agent 类型哈希只算一次，每笔单只剩 3 次 keccak
+  (装了 pycryptodome 时用它的 C 实现 keccak，否则用 ccxt 自带的)；
+- NonceManager：同一个签名身份在进程内共用一个严格递增的毫秒 nonce，加锁保证并发安全；
+- prebuild()：提前把一笔 Hyperliquid 订单构造好并签名，send() 时只剩一个 HTTP 请求，
+  下单服务用它在 Barrier 之前签好开仓单、在开仓请求飞行期间签好对应的回滚单；
+- 每次签名的耗时按交易所记入 SigningStats，和网络耗时分开统计。
+
+安装时会拿同一个动作分别用 ccxt 原版和缓存版签一次，签名不一致就不替换，保持 ccxt 原样。
+"""
+import base64
+import logging
+import threading
+import time
+from collections import deque
+
+try:
+    from Crypto.Hash import keccak as _fast_keccak   # pycryptodome (可选)
+except ImportError:
+    _fast_keccak = None
+
+logger = logging.getLogger("vibetrader.signing")
+
+_local = threading.local()
+
+
+def thread_signing_ms():
+    """当前线程累计的签名耗时 (毫秒)，用来算出某一腿里签名占了多少"""
+    return getattr(_local, 'sign_ms', 0.0)
+
+
+class SigningStats:
+    """每个交易所的单次签名耗时"""
+
+    def __init__(self, window=500):
+        self._samples = {}
+        self._counts = {}
+        self._window = window
+        self._lock = threading.Lock()
+
+    def record(self, venue, ms):
+        _local.sign_ms = thread_signing_ms() + ms
+        with self._lock:
+            self._samples.setdefault(venue, deque(maxlen=self._window)).append(ms)
+            self._counts[venue] = self._counts.get(venue, 0) + 1
+
+    def summary(self):
+        """{交易所: {'count', 'p50_ms', 'p99_ms', 'max_ms'}}"""
+        with self._lock:
+            items = [(venue, sorted(s), self._counts[venue]) for venue, s in self._samples.items()]
+        return {
+            venue: {
+                'count': count,
+                'p50_ms': samples[len(samples) // 2],
+                'p99_ms': samples[min(len(samples) - 1, int(len(samples) * 0.99))],
+                'max_ms': samples[-1],
+            }
+            for venue, samples, count in items
+        }
+
+
+class NonceManager:
+    """严格递增的毫秒 nonce，线程安全；for_identity() 让同一个签名身份在进程内共用一个"""
+    _registry = {}
+    _registry_lock = threading.Lock()
+
+    def __init__(self):
+        self._last = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_identity(cls, exchange_id, identity):
+        with cls._registry_lock:
+            return cls._registry.setdefault((exchange_id, identity), cls())
+
+    def next(self, now_ms=None):
+        now = int(time.time() * 1000) if now_ms is None else int(now_ms)
+        with self._lock:
+            self._last = max(now, self._last + 1)
+            return self._last
+
+
+class PrebuiltOrder:
+    """
+    提前签好的 Hyperliquid 订单：send() 时只剩一个 HTTP 请求；只能发一次，超过 max_age 秒作废。
+    client_order_id: 签进订单里的客户端订单号，回报丢了可以按它查推送 / REST
+    """
+
+    def __init__(self, exchange, symbol, request, max_age=30.0, client_order_id=None):
+        self.exchange = exchange
+        self.symbol = symbol
+        self.request = request
+        self.max_age = max_age
+        self.client_order_id = client_order_id
+        self.created = time.monotonic()
+        self.sent = False
+
+    @property
+    def valid(self):
+        return not self.sent and time.monotonic() - self.created < self.max_age
+
+    def send(self):
+        """发出预签好的请求，返回 ccxt 格式的订单 (解析方式和 ccxt 的 create_orders 一致)"""
+        self.sent = True
+        response = self.exchange.privatePostExchange(self.request)
+        data = (response.get('response') or {}).get('data') or {}
+        statuses = [{'status': s} if s == 'waitingForTrigger' else s for s in data.get('statuses', [])]
+        orders = self.exchange.parse_orders(statuses)
+        order = orders[0] if orders else None
+        if order is not None and not order.get('symbol'):
+            order['symbol'] = self.symbol
+        return order
+
+
+class HyperliquidSigner:
+    can_prebuild = True
+
+    def __init__(self, exchange, venue, stats):
+        import coincurve
+        self.exchange = exchange
+        self.venue = venue
+        self.stats = stats
+        self._key = coincurve.PrivateKey(bytes.fromhex(exchange.privateKey[-64:]))
+        self._nonces = NonceManager.for_identity(exchange.id, (exchange.walletAddress or exchange.privateKey).lower())
+        # 常量部分只算一次：域分隔符 (从 ccxt 的 EIP-712 编码结果里取) 和 Agent 的类型哈希
+        domain = {'chainId': 1337, 'name': 'Exchange', 'verifyingContract': exchange.safe_string(exchange.options, 'zeroAddress'),
+                  'version': '1'}
+        types = {'Agent': [{'name': 'source', 'type': 'string'}, {'name': 'connectionId', 'type': 'bytes32'}]}
+        encoded = exchange.eth_encode_structured_data(domain, types, {'source': 'a', 'connectionId': b'\x00' * 32})
+        self._prefix = encoded[:34]   # b'\x19\x01' + 域分隔符
+        self._agent_type = self.keccak(b'Agent(string source,bytes32 connectionId)')
+        self._source_hash = {source: self.keccak(source.encode()) for source in ('a', 'b')}
+
+    def keccak(self, data):
+        if _fast_keccak is not None:
+            return _fast_keccak.new(data=data, digest_bits=256).digest()
+        return self.exchange.hash(data, 'keccak', 'binary')
+
+    def action_hash(self, action, vault_address, nonce, expires_after=None):
+        """和 ccxt 的 action_hash 逐字节一致，只是换了 keccak 实现"""
+        ex = self.exchange
+        data = ex.binary_to_base16(ex.packb(action)) + '00000' + ex.int_to_base16(nonce)
+        data += '00' if vault_address is None else '01' + vault_address
+        if expires_after is not None:
+            data += '00' + '00000' + ex.int_to_base16(expires_after)
+        return self.keccak(bytes.fromhex(data))
+
+    def _sign_l1_action(self, action, nonce, vault_address=None, expires_after=None):
+        connection_id = self.action_hash(action, vault_address, nonce, expires_after)
+        source = 'b' if self.exchange.safe_bool(self.exchange.options, 'sandboxMode', False) else 'a'
+        struct_hash = self.keccak(self._agent_type + self._source_hash[source] + connection_id)
+        digest = self.keccak(self._prefix + struct_hash)
+        sig = self._key.sign_recoverable(digest, hasher=None)
+        return {'r': '0x' + sig[:32].hex(), 's': '0x' + sig[32:64].hex(), 'v': 27 + sig[64]}
+
+    def sign_l1_action(self, action, nonce, vault_address=None, expires_after=None):
+        started = time.perf_counter()
+        signature = self._sign_l1_action(action, nonce, vault_address, expires_after)
+        self.stats.record(self.venue, (time.perf_counter() - started) * 1000)
+        return signature
+
+    def incrementing_nonce(self):
+        return self._nonces.next(self.exchange.nonce())
+
+    def install(self):
+        ex = self.exchange
+        sample = {'type': 'order', 'orders': [{'a': 0, 'b': True, 'p': '90000', 's': '0.001', 'r': False,
+                                               't': {'limit': {'tif': 'Ioc'}}}], 'grouping': 'na'}
+        if self._sign_l1_action(sample, 1700000000000) != ex.sign_l1_action(sample, 1700000000000):
+            logger.warning(f"⚠️ {self.venue} 缓存签名和 ccxt 不一致，保持 ccxt 原样")
+            return None
+        ex.sign_l1_action = self.sign_l1_action
+        ex.incrementing_nonce = self.incrementing_nonce
+        return self
+
+    def prebuild(self, symbol, side, amount, price, slippage, reduce_only=False, max_age=30.0, client_order_id=None):
+        """构造并签好一笔市价单 (IOC 限价，价格 = price 加减 slippage)，返回 PrebuiltOrder"""
+        ex = self.exchange
+        if ex.markets is None:
+            ex.load_markets()
+        ex.initialize_client()   # 已经初始化过就不发请求
+        params = {'slippage': slippage}
+        if reduce_only:
+            params['reduceOnly'] = True
+        if client_order_id is not None:
+            params['clientOrderId'] = client_order_id
+        request = ex.create_orders_request([{'symbol': symbol, 'type': 'market', 'side': side, 'amount': amount,
+                                             'price': price, 'params': params}])
+        return PrebuiltOrder(ex, symbol, request, max_age, client_order_id)
+
+
+class BackpackSigner:
+    can_prebuild = False   # Backpack 的签名带时间窗口 (X-Window)，而且 ED25519 本身只要几十微秒，没必要预签
+
+    def __init__(self, exchange, venue, stats):
+        from cryptography.hazmat.primitives.asymmetric import ed25519
+        self.exchange = exchange
+        self.venue = venue
+        self.stats = stats
+        self._seed = base64.b64decode(exchange.secret)[:32]
+        self._key = ed25519.Ed25519PrivateKey.from_private_bytes(self._seed)
+        self._nonces = NonceManager.for_identity(exchange.id, exchange.apiKey)
+        self._inner_eddsa = exchange.eddsa
+        self._inner_sign = exchange.sign
+        self._inner_nonce = exchange.nonce
+
+    def eddsa(self, request, secret, curve='ed25519', url_encode=False):
+        if curve != 'ed25519' or bytes(secret) != self._seed:
+            return self._inner_eddsa(request, secret, curve, url_encode)
+        signature = self._key.sign(request)
+        if url_encode:
+            return self.exchange.binary_to_urlencoded_base64(signature)
+        return self.exchange.binary_to_base64(signature)
+
+    def sign(self, path, api='public', method='GET', params={}, headers=None, body=None):
+        if api != 'private':
+            return self._inner_sign(path, api, method, params, headers, body)
+        started = time.perf_counter()
+        result = self._inner_sign(path, api, method, params, headers, body)
+        self.stats.record(self.venue, (time.perf_counter() - started) * 1000)
+        return result
+
+    def nonce(self):
+        return self._nonces.next(self._inner_nonce())
+
+    def install(self):
+        ex = self.exchange
+        payload = b'instruction=orderExecute&timestamp=1700000000000&window=5000'
+        if self.eddsa(payload, self._seed) != self._inner_eddsa(payload, self._seed, 'ed25519'):
+            logger.warning(f"⚠️ {self.venue} 缓存签名和 ccxt 不一致，保持 ccxt 原样")
+            return None
+        ex.eddsa = self.eddsa
+        ex.sign = self.sign
+        ex.nonce = self.nonce
+        return self
+
+
+def install_signer(exchange, venue=None, stats=None):
+    """
+    给带密钥的 ccxt 实例装上缓存签名器，返回签名器 (HyperliquidSigner / BackpackSigner)；
+    没有密钥、不是这两个交易所 (比如模拟交易所) 或者自检不通过时返回 None，exchange 保持原样。
+    """
+    venue = venue or exchange.id
+    stats = stats or SigningStats()
+    existing = getattr(exchange, '_vibetrader_signer', None)
+    if existing is not None:
+        return existing
+    try:
+        if exchange.id == 'hyperliquid' and getattr(exchange, 'privateKey', None) and hasattr(exchange, 'sign_l1_action'):
+            signer = HyperliquidSigner(exchange, venue, stats).install()
+        elif exchange.id == 'backpack' and getattr(exchange, 'secret', None) and hasattr(exchange, 'eddsa'):
+            signer = BackpackSigner(exchange, venue, stats).install()
+        else:
+            return None
+    except Exception as e:
+        logger.warning(f"⚠️ {venue} 缓存签名器安装失败，继续用 ccxt 原版: {e}")
+        return None
+    exchange._vibetrader_signer = signer
+    return signer
@@ -0,0 +1,218 @@
+"""
+SQLite 状态库 (常驻 WAL 连接 + 只追加的成交流水)
+
+以前每次 get_state / update_state 都要开一次连接、关一次连接，而且默认是
+rollback journal 模式，全部状态只有 bot_state 里被反复覆盖的一行。现在：
+
+- 整个进程只有一条长连接，WAL 模式，SQL 语句固定写成常量走语句缓存；
+- 当前状态 (bot_state) 在内存里有一份副本，get_state() 是微秒级的字典拷贝；
+- trades / fills 两张带索引的流水表记录完整历史，可以随时查询；
+- 流水、心跳、日志这类非关键写入交给后台线程批量提交，
+  只有 update_state 这种关键写入才同步落盘。
+
+看板页面用 read_only=True 打开 (独立的只读连接)，WAL 下读写互不阻塞。
+"""
+import itertools
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+STATE_COLUMNS = ("status", "direction", "entry_spread", "amount", "timestamp", "open_time")
+
+SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS bot_state
+       (id INTEGER PRIMARY KEY, status TEXT, direction TEXT,
+        entry_spread REAL, amount REAL, timestamp TEXT)''',
+    '''CREATE TABLE IF NOT EXISTS trades
+       (id INTEGER PRIMARY KEY AUTOINCREMENT, ref TEXT, ts TEXT, state_id INTEGER,
+        direction TEXT, symbol_bp TEXT, symbol_hl TEXT, amount REAL, success INTEGER)''',
+    '''CREATE TABLE IF NOT EXISTS fills
+       (id INTEGER PRIMARY KEY AUTOINCREMENT, trade_ref TEXT, ts TEXT, venue TEXT, symbol TEXT,
+        side TEXT, amount REAL, price REAL, fee REAL, order_id TEXT)''',
+    '''CREATE TABLE IF NOT EXISTS engine_status
+       (id INTEGER PRIMARY KEY, updated_at TEXT, price_bp REAL, price_hl REAL,
+        diff_pct REAL, cycle_ms REAL, ticks INTEGER)''',
+    '''CREATE TABLE IF NOT EXISTS engine_log
+       (id INTEGER PRIMARY KEY AUTOINCREMENT, ts TEXT, msg TEXT)''',
+    "CREATE INDEX IF NOT EXISTS idx_trades_ts ON trades (ts)",
+    "CREATE INDEX IF NOT EXISTS idx_trades_ref ON trades (ref)",
+    "CREATE INDEX IF NOT EXISTS idx_fills_trade ON fills (trade_ref)",
+    "CREATE INDEX IF NOT EXISTS idx_fills_ts ON fills (ts)",
+]
+
+SQL_SELECT_STATE = "SELECT id, status, direction, entry_spread, amount, timestamp, open_time FROM bot_state"
+SQL_UPSERT_STATE = '''INSERT INTO bot_state (id, status, direction, entry_spread, amount, timestamp, open_time)
+                      VALUES (?, ?, ?, ?, ?, ?, ?)
+                      ON CONFLICT(id) DO UPDATE SET status=excluded.status, direction=excluded.direction,
+                      entry_spread=excluded.entry_spread, amount=excluded.amount,
+                      timestamp=excluded.timestamp, open_time=excluded.open_time'''
+SQL_INSERT_TRADE = '''INSERT INTO trades (ref, ts, state_id, direction, symbol_bp, symbol_hl, amount, success)
+                      VALUES (?, ?, ?, ?, ?, ?, ?, ?)'''
+SQL_INSERT_FILL = '''INSERT INTO fills (trade_ref, ts, venue, symbol, side, amount, price, fee, order_id)
+                     VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)'''
+SQL_UPDATE_STATUS = '''UPDATE engine_status SET updated_at=?, price_bp=?, price_hl=?, diff_pct=?,
+                       cycle_ms=?, ticks=? WHERE id=1'''
+SQL_INSERT_LOG = "INSERT INTO engine_log (ts, msg) VALUES (?, ?)"
+
+
+def _now_str():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _empty_state():
+    return {"status": "EMPTY", "direction": "NONE", "entry_spread": 0.0,
+            "amount": 0.0, "timestamp": "", "open_time": ""}
+
+
+class StateStore:
+    def __init__(self, db_file, read_only=False, batch_interval=0.2):
+        self.db_file = db_file
+        self.read_only = read_only
+        self._lock = threading.RLock()
+        self._ref_seq = itertools.count()
+        if read_only:
+            self.conn = sqlite3.connect(f"file:{db_file}?mode=ro", uri=True, check_same_thread=False)
+            return
+
+        self.conn = sqlite3.connect(db_file, check_same_thread=False, cached_statements=64)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA busy_timeout=5000")
+        self.init_db()
+        self._states = {row[0]: dict(zip(STATE_COLUMNS, row[1:])) for row in self.conn.execute(SQL_SELECT_STATE)}
+
+        # 后台批量写线程
+        self.batch_interval = batch_interval
+        self._queue = queue.Queue()
+        self._closed = threading.Event()
+        self._writer = threading.Thread(target=self._write_loop, name="state-writer", daemon=True)
+        self._writer.start()
+
+    # --- 建表与迁移 ---
+    def init_db(self):
+        with self._lock, self.conn:
+            for sql in SCHEMA:
+                self.conn.execute(sql)
+            # 旧库 (taolitest1 / timetest 各自的 bot_state) 缺的列补上
+            existing = {row[1] for row in self.conn.execute("PRAGMA table_info(bot_state)")}
+            for column, kind in (("entry_spread", "REAL"), ("amount", "REAL"), ("timestamp", "TEXT"), ("open_time", "TEXT")):
+                if column not in existing:
+                    self.conn.execute(f"ALTER TABLE bot_state ADD COLUMN {column} {kind}")
+            self.conn.execute("UPDATE bot_state SET entry_spread=COALESCE(entry_spread, 0.0), "
+                              "timestamp=COALESCE(timestamp, ''), open_time=COALESCE(open_time, '')")
+            if self.conn.execute("SELECT count(*) FROM bot_state").fetchone()[0] == 0:
+                self.conn.execute(SQL_UPSERT_STATE, (1, "EMPTY", "NONE", 0.0, 0.0, "", ""))
+            self.conn.execute("INSERT OR IGNORE INTO engine_status VALUES (1, '', 0.0, 0.0, 0.0, 0.0, 0)")
+
+    # --- 当前状态 (关键写入，同步落盘) ---
+    def get_state(self, state_id=1):
+        if self.read_only:
+            with self._lock:
+                row = self.conn.execute(SQL_SELECT_STATE + " WHERE id=?", (state_id,)).fetchone()
+            return dict(zip(STATE_COLUMNS, row[1:])) if row else _empty_state()
+        state = self._states.get(state_id)
+        return dict(state) if state else _empty_state()
+
+    def update_state(self, status, direction, entry_spread=0.0, amount=0.0, open_time="", state_id=1):
+        state = {"status": status, "direction": direction, "entry_spread": entry_spread,
+                 "amount": amount, "timestamp": _now_str(), "open_time": open_time}
+        with self._lock, self.conn:
+            self.conn.execute(SQL_UPSERT_STATE, (state_id,) + tuple(state[c] for c in STATE_COLUMNS))
+        self._states[state_id] = state
+
+    # --- 流水 (非关键写入，后台批量提交) ---
+    def journal_trade(self, direction, legs, success, symbol_bp="", symbol_hl="", amount=0.0, state_id=1):
+        """记一笔交易和它的每一腿成交 (legs 是 ExecutionService 的 LegResult)，返回流水号"""
+        ref = f"{int(time.time() * 1000)}-{next(self._ref_seq)}"
+        ts = _now_str()
+        for leg in legs:
+            if leg.venue == 'bp':
+                symbol_bp = symbol_bp or leg.symbol
+            else:
+                symbol_hl = symbol_hl or leg.symbol
+            amount = amount or leg.amount
+        self._queue.put((SQL_INSERT_TRADE, (ref, ts, state_id, direction, symbol_bp, symbol_hl, amount, int(success))))
+        for leg in legs:
+            if leg.order:
+                self.record_fill(ref, leg.venue, leg.symbol, leg.side, leg.order, leg.amount)
+        return ref
+
+    def record_fill(self, trade_ref, venue, symbol, side, order, amount=0.0):
+        """从 ccxt 的订单回报里取成交量/均价/手续费记一条 fill；回报里没有 filled 时才按 amount 记"""
+        filled = order.get('filled')
+        filled = amount if filled is None else filled
+        price = order.get('average') or order.get('price') or 0.0
+        fee = (order.get('fee') or {}).get('cost') or 0.0
+        self._queue.put((SQL_INSERT_FILL, (trade_ref, _now_str(), venue, symbol, side, filled, price, fee, str(order.get('id')))))
+
+    def update_status(self, price_bp, price_hl, diff_pct, cycle_ms, ticks):
+        """引擎心跳：最新行情与决策耗时"""
+        self._queue.put((SQL_UPDATE_STATUS, (_now_str(), price_bp, price_hl, diff_pct, cycle_ms, ticks)))
+
+    def add_log(self, msg):
+        self._queue.put((SQL_INSERT_LOG, (_now_str(), msg)))
+
+    def _write_loop(self):
+        while not self._closed.is_set():
+            self._closed.wait(self.batch_interval)
+            self.flush()
+
+    def flush(self):
+        """把排队的写入在一个事务里提交"""
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if not batch:
+            return
+        with self._lock, self.conn:
+            for sql, params in batch:
+                self.conn.execute(sql, params)
+
+    def close(self):
+        if not self.read_only:
+            self._closed.set()
+            self._writer.join(timeout=5)
+            self.flush()
+        self.conn.close()
+
+    # --- 查询 ---
+    def _query(self, sql, params=()):
+        with self._lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def get_status(self):
+        row = self._query("SELECT * FROM engine_status WHERE id=1")[0]
+        return {
+            "updated_at": row[1],
+            "price_bp": row[2],
+            "price_hl": row[3],
+            "diff_pct": row[4],
+            "cycle_ms": row[5],
+            "ticks": row[6]
+        }
+
+    def recent_logs(self, limit=50):
+        return self._query("SELECT ts, msg FROM engine_log ORDER BY id DESC LIMIT ?", (limit,))
+
+    def trades(self, limit=100, since=""):
+        """最近的交易流水 (新的在前)，since 为 'YYYY-mm-dd HH:MM:SS'"""
+        rows = self._query("SELECT ref, ts, state_id, direction, symbol_bp, symbol_hl, amount, success FROM trades "
+                           "WHERE ts >= ? ORDER BY id DESC LIMIT ?", (since, limit))
+        keys = ("ref", "ts", "state_id", "direction", "symbol_bp", "symbol_hl", "amount", "success")
+        return [dict(zip(keys, row)) for row in rows]
+
+    def fills(self, trade_ref=None, limit=100):
+        """某笔交易 (或最近) 的成交明细"""
+        if trade_ref is not None:
+            rows = self._query("SELECT trade_ref, ts, venue, symbol, side, amount, price, fee, order_id FROM fills "
+                               "WHERE trade_ref=? ORDER BY id", (trade_ref,))
+        else:
+            rows = self._query("SELECT trade_ref, ts, venue, symbol, side, amount, price, fee, order_id FROM fills "
+                               "ORDER BY id DESC LIMIT ?", (limit,))
+        keys = ("trade_ref", "ts", "venue", "symbol", "side", "amount", "price", "fee", "order_id")
+        return [dict(zip(keys, row)) for row in rows]
@@ -0,0 +1,62 @@
+"""
+价差策略的信号函数 (与 taolitest1.py 的开平仓逻辑完全一致)
+
+这里的函数只用加减、比较和 abs()，所以既能传入单个 float，
+也能直接传入 NumPy 数组做批量计算。实盘引擎和回测共用同一套判断，
+避免两边的逻辑悄悄跑偏。
+"""
+
+LONG_BP_SHORT_HL = "Long_BP_Short_HL"
+SHORT_BP_LONG_HL = "Short_BP_Long_HL"
+
+
+def compute_spread(p_bp, p_hl):
+    """返回 (diff, diff_pct)，diff_pct > 0 表示 Backpack 贵"""
+    diff = p_bp - p_hl
+    diff_pct = (diff / p_bp) * 100
+    return diff, diff_pct
+
+
+def should_open(diff_pct, open_threshold):
+    """空仓时：价差绝对值超过开仓阈值就开仓"""
+    return abs(diff_pct) > open_threshold
+
+
+def open_direction(diff_pct):
+    """BP 贵就卖 BP 买 HL，反之买 BP 卖 HL"""
+    return SHORT_BP_LONG_HL if diff_pct > 0 else LONG_BP_SHORT_HL
+
+
+def should_close(direction, diff_pct, close_threshold):
+    """持仓时：价差回归到平仓阈值以内就平仓"""
+    if "Short_BP" in direction:
+        # 原本 BP 贵 (diff > 0)，现在希望 diff 变小
+        return diff_pct < close_threshold
+    # 原本 HL 贵 (diff < 0)，现在希望 diff 变大 (接近0或变正)
+    return abs(diff_pct) < close_threshold
+
+
+def close_direction(direction):
+    """平仓其实就是反向开仓"""
+    return LONG_BP_SHORT_HL if "Short_BP" in direction else SHORT_BP_LONG_HL
+
+
+def split_direction(direction):
+    """把方向字符串拆成 (side_bp, side_hl)"""
+    if direction == LONG_BP_SHORT_HL:
+        return 'buy', 'sell'
+    return 'sell', 'buy'
+
+
+def decide(status, direction, diff_pct, open_threshold, close_threshold):
+    """
+    单步决策。返回 (action, trade_direction)：
+    action 为 'OPEN' / 'CLOSE' / None，trade_direction 是要下单的方向。
+    """
+    if status == "EMPTY":
+        if should_open(diff_pct, open_threshold):
+            return "OPEN", open_direction(diff_pct)
+    elif status == "HOLDING":
+        if should_close(direction, diff_pct, close_threshold):
+            return "CLOSE", close_direction(direction)
+    return None, None
@@ -0,0 +1,177 @@
+"""
+参数扫描 (多进程 + 共享内存)
+
+在录制的行情上批量回测 OPEN_THRESHOLD / CLOSE_THRESHOLD / 持仓时长 (HOLD_DURATION_MIN)
+的组合，代替在侧边栏里一个个手调。
+
+对齐好的行情数组只在主进程里算一次，放进一块 multiprocessing.shared_memory，
+工作进程启动时挂上去直接得到 NumPy 视图，不用把几百 MB 的数组 pickle 给每个任务。
+
+    python -m vibetrader.sweep --root ticks --open 0.005:0.03:0.0025 --close 0:0.01:0.001 --hold-min 0,5,10,30
+    python -m vibetrader.sweep --root ticks --random 2000 --out sweep.csv
+"""
+import argparse
+import csv
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from .backtest import align_ticks, run_backtest
+from .strategy import compute_spread
+from .ticks import load_ticks
+
+RESULT_COLUMNS = ("open_threshold", "close_threshold", "hold_min", "pnl", "trades", "win_rate",
+                  "fees", "max_drawdown", "time_in_position")
+
+
+class SharedMarket:
+    """把 {'ts': ..., 'last_bp': ...} 这组数组整体放进一块共享内存"""
+
+    def __init__(self, market):
+        self.layout = {}
+        offset = 0
+        for name, arr in market.items():
+            arr = np.ascontiguousarray(arr)
+            self.layout[name] = (offset, arr.dtype.str, arr.shape)
+            offset += (arr.nbytes + 63) // 64 * 64   # 按 64 字节对齐
+        self.shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+        for name, arr in market.items():
+            self.view(self.shm, self.layout[name])[...] = arr
+
+    @staticmethod
+    def view(shm, spec):
+        offset, dtype, shape = spec
+        return np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=offset)
+
+    @property
+    def handle(self):
+        """传给工作进程的描述 (只有名字和布局，很小)"""
+        return self.shm.name, self.layout
+
+    def close(self):
+        self.shm.close()
+        self.shm.unlink()
+
+
+# --- 工作进程 ---
+_MARKET = None
+_SHM = None
+_COSTS = None
+
+
+def _init_worker(handle, fee_bps, slippage_bps, amount):
+    global _MARKET, _SHM, _COSTS
+    name, layout = handle
+    _SHM = shared_memory.SharedMemory(name=name)
+    _MARKET = {key: SharedMarket.view(_SHM, spec) for key, spec in layout.items()}
+    _COSTS = (fee_bps, slippage_bps, amount)
+
+
+def _evaluate(params):
+    open_th, close_th, hold_min = params
+    fee_bps, slippage_bps, amount = _COSTS
+    max_hold_ms = hold_min * 60_000 if hold_min else None
+    result = run_backtest(_MARKET, open_th, close_th, amount, None, fee_bps, slippage_bps, max_hold_ms)
+    summary = result.summary()
+    summary.update(open_threshold=open_th, close_threshold=close_th, hold_min=hold_min)
+    return summary
+
+
+# --- 参数组合 ---
+def parse_values(text):
+    """'0.005:0.03:0.0025' (起:止:步长，含止) 或 '0,5,10'"""
+    if ":" in text:
+        start, stop, step = (float(x) for x in text.split(":"))
+        return [round(v, 10) for v in np.arange(start, stop + step / 2, step)]
+    return [float(x) for x in text.split(",")]
+
+
+def grid(open_values, close_values, hold_values):
+    """网格搜索；平仓阈值不小于开仓阈值的组合没有意义，直接跳过"""
+    return [(o, c, h) for o, c, h in itertools.product(open_values, close_values, hold_values) if c < o]
+
+
+def random_search(n, open_range, close_range, hold_values, seed=None):
+    rng = np.random.default_rng(seed)
+    opens = rng.uniform(*open_range, n)
+    closes = rng.uniform(close_range[0], np.minimum(close_range[1], opens))
+    holds = rng.choice(hold_values, n)
+    return [(round(float(o), 6), round(float(c), 6), float(h)) for o, c, h in zip(opens, closes, holds)]
+
+
+def run_sweep(market, combos, workers=None, fee_bps=4.0, slippage_bps=1.0, amount=0.001):
+    """并行评估所有参数组合，按净盈亏从高到低返回 summary 列表"""
+    market = dict(market)
+    _, market["diff_pct"] = compute_spread(market["last_bp"], market["last_hl"])
+    shared = SharedMarket(market)
+    workers = workers or os.cpu_count()
+    try:
+        with ProcessPoolExecutor(workers, initializer=_init_worker,
+                                 initargs=(shared.handle, fee_bps, slippage_bps, amount)) as pool:
+            chunksize = max(1, len(combos) // (workers * 8))
+            results = list(pool.map(_evaluate, combos, chunksize=chunksize))
+    finally:
+        shared.close()
+    results.sort(key=lambda r: r["pnl"], reverse=True)
+    return results
+
+
+def write_results_csv(path, results):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(("rank",) + RESULT_COLUMNS)
+        for rank, r in enumerate(results, 1):
+            writer.writerow([rank] + [r[c] for c in RESULT_COLUMNS])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="开/平仓阈值与持仓时长的参数扫描")
+    parser.add_argument("--root", default="ticks")
+    parser.add_argument("--symbol-bp", default="BTC/USDC")
+    parser.add_argument("--symbol-hl", default="BTC/USDC")
+    parser.add_argument("--start", help="起始日期 YYYYMMDD")
+    parser.add_argument("--end", help="结束日期 YYYYMMDD")
+    parser.add_argument("--open", default="0.005:0.03:0.0025", help="开仓阈值 (%%)，起:止:步长 或 逗号分隔")
+    parser.add_argument("--close", default="0:0.01:0.001", help="平仓阈值 (%%)")
+    parser.add_argument("--hold-min", default="0", help="最长持仓分钟数，0 表示不限")
+    parser.add_argument("--random", type=int, default=0, help="随机搜索 N 组 (在 --open/--close 的范围内取值)")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--amount", type=float, default=0.001)
+    parser.add_argument("--fee-bps", type=float, default=4.0)
+    parser.add_argument("--slippage-bps", type=float, default=1.0)
+    parser.add_argument("--max-skew-ms", type=float, default=300)
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--out", default="sweep.csv")
+    args = parser.parse_args(argv)
+
+    ticks_bp = load_ticks(args.root, "bp", args.symbol_bp, args.start, args.end)
+    ticks_hl = load_ticks(args.root, "hl", args.symbol_hl, args.start, args.end)
+    market = align_ticks(ticks_bp, ticks_hl, args.max_skew_ms)
+
+    open_values, close_values, hold_values = parse_values(args.open), parse_values(args.close), parse_values(args.hold_min)
+    if args.random:
+        combos = random_search(args.random, (min(open_values), max(open_values)),
+                               (min(close_values), max(close_values)), hold_values, args.seed)
+    else:
+        combos = grid(open_values, close_values, hold_values)
+
+    print(f"🔬 {len(market['ts']):,} 个时刻 x {len(combos)} 组参数")
+    started = time.perf_counter()
+    results = run_sweep(market, combos, args.workers, args.fee_bps, args.slippage_bps, args.amount)
+    elapsed = time.perf_counter() - started
+    print(f"✅ 用时 {elapsed:.1f} 秒 ({len(combos) / elapsed * 60:,.0f} 组/分钟)")
+
+    write_results_csv(args.out, results)
+    for rank, r in enumerate(results[:args.top], 1):
+        print(f"{rank:>3}. 开 {r['open_threshold']:.4f}% 平 {r['close_threshold']:.4f}% 持仓 {r['hold_min']:g}min | "
+              f"${r['pnl']:.2f} | {r['trades']} 笔 | 回撤 ${r['max_drawdown']:.2f} | 持仓 {r['time_in_position']:.1%}")
+    print(f"📄 完整排名已写入 {args.out}")
+
+
+if __name__ == "__main__":
+    main()
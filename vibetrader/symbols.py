@@ -0,0 +1,55 @@
+"""
+交易对命名归一化
+
+两边交易所对同一个永续合约的叫法不完全一样：
+- ccxt 的永续统一写成 'BTC/USDC:USDC'，但脚本里常写成 'BTC/USDC'；
+- 小币种会用 1000 倍合约，Hyperliquid 写 'kPEPE'，Backpack 写 '1000PEPE'。
+
+canonical_key() 把它们都归到 'PEPE/USDC:USDC' 这样的键上，同时给出合约乘数，
+比较价格前先除以乘数，才是同一单位的价格。
+"""
+
+MULTIPLIER_PREFIXES = (("1000000", 1_000_000), ("1000", 1000), ("k", 1000))
+
+
+def split_base(base):
+    """'kPEPE' -> ('PEPE', 1000)，'1000BONK' -> ('BONK', 1000)，'BTC' -> ('BTC', 1)"""
+    for prefix, multiplier in MULTIPLIER_PREFIXES:
+        rest = base[len(prefix):]
+        # 'k' 前缀后面必须是大写字母，避免误伤本来就以 k 开头的币 (如 'KAS')
+        if base.startswith(prefix) and rest and (prefix != "k" or rest[0].isupper()):
+            return rest.upper(), multiplier
+    return base.upper(), 1
+
+
+def perp_symbol(symbol, settle="USDC"):
+    """'BTC/USDC' -> 'BTC/USDC:USDC'；已经带结算币的原样返回"""
+    if ":" in symbol:
+        return symbol
+    quote = symbol.split("/")[1] if "/" in symbol else settle
+    return f"{symbol}:{quote}"
+
+
+def canonical_key(market):
+    """ccxt market -> ('PEPE/USDC:USDC', 1000)；不是永续合约返回 (None, 1)"""
+    if not market.get("swap") or not market.get("active", True):
+        return None, 1
+    base, multiplier = split_base(market["base"])
+    return f"{base}/{market['quote']}:{market.get('settle') or market['quote']}", multiplier
+
+
+def perp_index(markets):
+    """{canonical_key: (ccxt symbol, 乘数)}，只含永续合约"""
+    index = {}
+    for symbol, market in markets.items():
+        key, multiplier = canonical_key(market)
+        if key is not None:
+            index[key] = (symbol, multiplier)
+    return index
+
+
+def shared_perps(markets_bp, markets_hl):
+    """两边都有的永续合约：{canonical_key: ((symbol_bp, 乘数), (symbol_hl, 乘数))}"""
+    index_bp = perp_index(markets_bp)
+    index_hl = perp_index(markets_hl)
+    return {key: (index_bp[key], index_hl[key]) for key in sorted(index_bp.keys() & index_hl.keys())}
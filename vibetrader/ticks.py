@@ -0,0 +1,227 @@
+"""
+列式 tick 录制 (定长记录，只追加，读端内存映射)
+
+每个交易所、每个交易对、每天一个分段文件：
+
+    {root}/{venue}/{BTC_USDC}/{YYYYMMDD}.ticks
+
+文件是 16 字节文件头 + 一串 56 字节的定长记录 (TICK_DTYPE)。写端只做追加，
+内存占用固定；读端用 np.memmap 直接映射，正在写的文件也能读，不需要拷贝。
+
+    python -m vibetrader.ticks record --root ticks                 # WebSocket 推送，每条都记
+    python -m vibetrader.ticks record --root ticks --rest --interval 0.5
+    python -m vibetrader.ticks info --root ticks
+"""
+import argparse
+import os
+import struct
+import threading
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+MAGIC = b"VTTICK01"
+HEADER = struct.Struct("<8sII")   # magic, 记录长度, 保留
+TICK_DTYPE = np.dtype([
+    ("ts", "<i8"),        # 交易所时间戳 (ms)，没有就用本地接收时间
+    ("recv", "<i8"),      # 本地接收时间 (ms)
+    ("bid", "<f8"),
+    ("ask", "<f8"),
+    ("last", "<f8"),
+    ("bid_size", "<f8"),
+    ("ask_size", "<f8"),
+])
+RECORD = struct.Struct("<qqddddd")
+assert RECORD.size == TICK_DTYPE.itemsize
+
+NAN = float("nan")
+
+
+def symbol_dir(symbol):
+    """'BTC/USDC:USDC' -> 'BTC_USDC_USDC'，可以安全地当目录名"""
+    return symbol.replace("/", "_").replace(":", "_")
+
+
+def segment_path(root, venue, symbol, ts_ms):
+    day = datetime.fromtimestamp(ts_ms / 1000, tz=timezone.utc).strftime("%Y%m%d")
+    return os.path.join(root, venue, symbol_dir(symbol), f"{day}.ticks")
+
+
+def _num(value):
+    return NAN if value is None else float(value)
+
+
+class TickWriter:
+    """按天滚动的追加写入器，每个 (venue, symbol) 同时只开一个文件"""
+
+    def __init__(self, root, flush_every=256, flush_interval=1.0):
+        self.root = root
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.count = 0
+        self._files = {}     # (venue, symbol) -> [path, file, 未刷新条数, 上次刷新时间]
+        self._lock = threading.Lock()
+
+    def _segment(self, venue, symbol, ts_ms):
+        key = (venue, symbol)
+        path = segment_path(self.root, venue, symbol, ts_ms)
+        seg = self._files.get(key)
+        if seg is not None and seg[0] == path:
+            return seg
+        if seg is not None:
+            seg[1].close()  # 跨天了，关掉旧分段
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        f = open(path, "ab")
+        if f.tell() == 0:
+            f.write(HEADER.pack(MAGIC, TICK_DTYPE.itemsize, 0))
+        seg = [path, f, 0, time.monotonic()]
+        self._files[key] = seg
+        return seg
+
+    def append(self, venue, symbol, ts_ms, bid, ask, last, bid_size=None, ask_size=None, recv_ms=None):
+        recv_ms = int(time.time() * 1000) if recv_ms is None else int(recv_ms)
+        ts_ms = recv_ms if ts_ms is None else int(ts_ms)
+        record = RECORD.pack(ts_ms, recv_ms, _num(bid), _num(ask), _num(last), _num(bid_size), _num(ask_size))
+        with self._lock:
+            seg = self._segment(venue, symbol, ts_ms)
+            seg[1].write(record)
+            seg[2] += 1
+            self.count += 1
+            now = time.monotonic()
+            # 攒一批再刷到磁盘，读端最多晚 flush_interval 秒看到
+            if seg[2] >= self.flush_every or now - seg[3] >= self.flush_interval:
+                seg[1].flush()
+                seg[2] = 0
+                seg[3] = now
+
+    def append_ticker(self, venue, symbol, ticker):
+        """直接记录 ccxt 的 ticker 结构 (或 MarketDataStream 推送的盘口顶端)"""
+        self.append(venue, symbol, ticker.get("timestamp"), ticker.get("bid"), ticker.get("ask"),
+                    ticker.get("last"), ticker.get("bidVolume"), ticker.get("askVolume"), ticker.get("recv_ms"))
+
+    def flush(self):
+        with self._lock:
+            for seg in self._files.values():
+                seg[1].flush()
+                seg[2] = 0
+
+    def close(self):
+        with self._lock:
+            for seg in self._files.values():
+                seg[1].close()
+            self._files.clear()
+
+
+# --- 读取 ---
+def open_segment(path):
+    """把一个分段文件映射成只读的结构化数组 (不拷贝)；写到一半的记录会被忽略"""
+    with open(path, "rb") as f:
+        magic, itemsize, _ = HEADER.unpack(f.read(HEADER.size))
+    if magic != MAGIC or itemsize != TICK_DTYPE.itemsize:
+        raise ValueError(f"{path} 不是 tick 文件或版本不匹配")
+    count = (os.path.getsize(path) - HEADER.size) // itemsize
+    if count == 0:
+        return np.empty(0, dtype=TICK_DTYPE)
+    return np.memmap(path, dtype=TICK_DTYPE, mode="r", offset=HEADER.size, shape=(count,))
+
+
+def list_segments(root, venue, symbol, start=None, end=None):
+    """按日期排序的分段文件路径；start / end 是 'YYYYMMDD' (含)"""
+    folder = os.path.join(root, venue, symbol_dir(symbol))
+    if not os.path.isdir(folder):
+        return []
+    paths = []
+    for name in sorted(os.listdir(folder)):
+        if not name.endswith(".ticks"):
+            continue
+        day = name[:-6]
+        if (start and day < start) or (end and day > end):
+            continue
+        paths.append(os.path.join(folder, name))
+    return paths
+
+
+def load_ticks(root, venue, symbol, start=None, end=None):
+    """把一段日期的 tick 拼成一个数组 (单个分段时直接返回内存映射)"""
+    segments = [open_segment(p) for p in list_segments(root, venue, symbol, start, end)]
+    if not segments:
+        return np.empty(0, dtype=TICK_DTYPE)
+    if len(segments) == 1:
+        return segments[0]
+    return np.concatenate(segments)
+
+
+# --- 录制模式 ---
+def record(root, symbol_bp, symbol_hl, rest=False, interval=0.5, seconds=0):
+    from .marketdata import MarketDataStream
+
+    writer = TickWriter(root)
+    started = time.time()
+    stream = None
+    try:
+        if rest:
+            from .exchanges import init_exchanges
+            from .pairing import PairedQuoteFetcher, StaleSnapshotError
+            exchanges = init_exchanges()
+            quotes = PairedQuoteFetcher(exchanges['bp'], exchanges['hl'])
+            while not seconds or time.time() - started < seconds:
+                try:
+                    snapshot = quotes.fetch(symbol_bp, symbol_hl)
+                except StaleSnapshotError:
+                    # 丢弃的快照也要等一个周期，不然会连着发配对请求
+                    time.sleep(interval)
+                    continue
+                for leg in (snapshot.bp, snapshot.hl):
+                    writer.append(leg.venue, leg.symbol, leg.exchange_ts, leg.bid, leg.ask, leg.last,
+                                  bid_size=leg.bid_size, ask_size=leg.ask_size, recv_ms=leg.recv_ms)
+                time.sleep(interval)
+        else:
+            stream = MarketDataStream()
+            stream.listeners.append(writer.append_ticker)
+            stream.start()
+            stream.subscribe('bp', symbol_bp)
+            stream.subscribe('hl', symbol_hl)
+            while not seconds or time.time() - started < seconds:
+                time.sleep(5)
+                print(f"📼 已录制 {writer.count} 条 tick")
+    except KeyboardInterrupt:
+        print("\n🛑 停止录制。")
+    finally:
+        if stream:
+            stream.stop()
+        writer.close()
+        print(f"✅ 共录制 {writer.count} 条 tick -> {root}")
+
+
+def info(root):
+    for venue in sorted(os.listdir(root)):
+        for sym in sorted(os.listdir(os.path.join(root, venue))):
+            for name in sorted(os.listdir(os.path.join(root, venue, sym))):
+                ticks = open_segment(os.path.join(root, venue, sym, name))
+                span = (ticks["ts"][-1] - ticks["ts"][0]) / 1000 if len(ticks) else 0
+                print(f"{venue:>3} {sym:<16} {name}  {len(ticks):>10,} 条  {span / 3600:6.2f} 小时")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="tick 录制与查看")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_rec = sub.add_parser("record", help="录制两边的行情")
+    p_rec.add_argument("--root", default="ticks")
+    p_rec.add_argument("--symbol-bp", default="BTC/USDC")
+    p_rec.add_argument("--symbol-hl", default="BTC/USDC")
+    p_rec.add_argument("--rest", action="store_true", help="用 REST 轮询代替 WebSocket 推送")
+    p_rec.add_argument("--interval", type=float, default=0.5, help="REST 轮询间隔 (秒)")
+    p_rec.add_argument("--seconds", type=float, default=0)
+    p_info = sub.add_parser("info", help="列出已录制的分段")
+    p_info.add_argument("--root", default="ticks")
+    args = parser.parse_args(argv)
+
+    if args.cmd == "record":
+        record(args.root, args.symbol_bp, args.symbol_hl, args.rest, args.interval, args.seconds)
+    else:
+        info(args.root)
+
+
+if __name__ == "__main__":
+    main()
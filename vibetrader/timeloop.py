@@ -0,0 +1,333 @@
+"""
+多实例定时双开调度器
+
+timetest.py 一次只能跑一个循环：一行 id=1 的状态、一个方向、一个持仓时长，
+靠 Streamlit 每 5 秒 rerun 一次去看 “时间到了没有”，平仓最多要晚 5 秒。
+
+TimeLoopScheduler 在一个 asyncio 事件循环里跑任意多个独立的定时循环
+(不同交易对、数量、方向、持仓时长)：
+
+- 所有实例的下一个开/平仓时刻放在一个最小堆里，事件循环只睡到堆顶的截止时间，
+  没有轮询，100 个实例和 1 个实例的 CPU 占用一样；
+- 到点的动作交给线程池里的 execute_dual_trade，多个实例同时到点也互不拖累；
+- 每个实例在状态库里有自己的一行 (state_id)，开仓时间精确到毫秒，
+  重启后按原来的开仓时间恢复平仓时刻；
+- 平仓前自动安排心跳焐热连接；记录每次下单相对计划时刻晚了多少毫秒；
+- maker_venue 设了的实例改用挂单 + 吃单对冲 (maker.execute_maker_taker)，只付一边的 taker 手续费。
+
+    python -m vibetrader.timeloop --mock --instances 100 --hold 5 --stagger 0.05 --duration 60
+    python -m vibetrader.timeloop --mock --instances 5 --hold 5 --duration 60 --maker bp
+    python -m vibetrader.timeloop --config loops.json --real
+
+loops.json 是实例列表，字段同 LoopConfig，没写的字段用命令行参数的值：
+
+    [{"state_id": 1, "symbol_bp": "BTC/USDC", "hold_seconds": 600},
+     {"state_id": 2, "symbol_bp": "ETH/USDC", "symbol_hl": "ETH/USDC", "amount": 0.01,
+      "direction": "Short_BP_Long_HL", "hold_seconds": 300}]
+"""
+import argparse
+import asyncio
+import concurrent.futures
+import heapq
+import itertools
+import json
+import logging
+import signal
+import time
+from collections import deque
+from dataclasses import asdict, dataclass
+from datetime import datetime
+
+from .execution import ExecutionService
+from .maker import MakerConfig, execute_maker_taker
+from .ordertracker import OrderTracker
+from .priority import Priority
+from .state import StateStore
+from .strategy import LONG_BP_SHORT_HL, SHORT_BP_LONG_HL
+from .trading import execute_dual_trade
+
+logger = logging.getLogger("vibetrader.timeloop")
+
+OPEN_TIME_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+
+@dataclass
+class LoopConfig:
+    state_id: int
+    symbol_bp: str = "BTC/USDC"
+    symbol_hl: str = "BTC/USDC"
+    amount: float = 0.001
+    direction: str = LONG_BP_SHORT_HL
+    hold_seconds: float = 600.0     # 持仓时长
+    pause_seconds: float = 2.0      # 平仓后隔多久开下一轮
+    retry_seconds: float = 5.0      # 下单失败后隔多久重试
+    start_delay: float = 0.0        # 首次开仓相对启动时刻的延迟 (用来错开各实例)
+    maker_venue: str = None         # 'bp' / 'hl'：在这边挂单、另一边吃单对冲；None 为两边都吃单
+    max_unhedged_ms: float = MakerConfig.max_unhedged_ms   # 挂单模式下裸敞口的上限
+
+
+def format_open_time(ts):
+    """epoch 秒 -> 'YYYY-mm-dd HH:MM:SS.mmm'"""
+    return datetime.fromtimestamp(ts).strftime(OPEN_TIME_FORMAT)[:-3]
+
+
+def parse_open_time(text):
+    """兼容 timetest.py 写的秒级时间字符串，解析失败返回 None"""
+    for fmt in (OPEN_TIME_FORMAT, "%Y-%m-%d %H:%M:%S"):
+        try:
+            return datetime.strptime(text, fmt).timestamp()
+        except (TypeError, ValueError):
+            continue
+    return None
+
+
+def close_direction(direction):
+    """平仓方向 = 开仓方向取反"""
+    return SHORT_BP_LONG_HL if "Long_BP" in direction else LONG_BP_SHORT_HL
+
+
+class TimeLoopScheduler:
+    def __init__(self, execution, store, loops, is_real=False, max_concurrent=8):
+        """
+        execution: ExecutionService；store: StateStore (每个实例用自己的 state_id 一行)
+        loops: LoopConfig 列表
+        max_concurrent: 最多同时有几笔双边交易在执行
+        """
+        self.execution = execution
+        self.store = store
+        self.loops = {loop.state_id: loop for loop in loops}
+        if len(self.loops) != len(loops):
+            raise ValueError("state_id 不能重复")
+        self.is_real = is_real
+        self.pool = concurrent.futures.ThreadPoolExecutor(max_workers=max_concurrent, thread_name_prefix="timeloop")
+        self.lateness_ms = deque(maxlen=1000)   # 最近的 “实际发单 - 计划时刻”
+        self.opens = 0
+        self.closes = 0
+        self.failures = 0
+        self._heap = []                          # (截止时间, 序号, state_id, 动作)
+        self._seq = itertools.count()
+        self._inflight = set()
+        self._wake = asyncio.Event()
+        self._stop = asyncio.Event()
+
+    def log(self, state_id, msg):
+        msg = f"[#{state_id}] {msg}"
+        logger.info(msg)
+        self.store.add_log(msg)
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    # --- 时间堆 ---
+    def schedule(self, at_ts, state_id, action):
+        """安排 state_id 在 at_ts (epoch 秒) 执行 OPEN / CLOSE"""
+        heapq.heappush(self._heap, (at_ts, next(self._seq), state_id, action))
+        if action == "CLOSE":
+            self.execution.schedule_warmup(at_ts)
+        self._wake.set()
+
+    def restore(self, now=None):
+        """按状态库恢复每个实例：持仓中的按原开仓时间安排平仓，空仓的安排开仓"""
+        now = time.time() if now is None else now
+        for loop in self.loops.values():
+            state = self.store.get_state(loop.state_id)
+            if state['status'] == "HOLDING":
+                opened = parse_open_time(state['open_time'])
+                close_at = opened + loop.hold_seconds if opened else now
+                if close_at < now:
+                    self.log(loop.state_id, "⌛ 停机期间已到平仓时间，立即平仓")
+                # 过期的平仓从现在算起，不计入发单延迟统计
+                self.schedule(max(close_at, now), loop.state_id, "CLOSE")
+            else:
+                self.schedule(now + loop.start_delay, loop.state_id, "OPEN")
+
+    # --- 执行 ---
+    def _trade(self, at_ts, loop, direction, amount, priority):
+        """在线程池里跑：记录发单延迟，然后双边下单"""
+        started = time.time()
+        self.lateness_ms.append((started - at_ts) * 1000)
+        if loop.maker_venue:
+            config = MakerConfig(maker_venue=loop.maker_venue, max_unhedged_ms=loop.max_unhedged_ms)
+            success, logs = execute_maker_taker(self.execution, direction, amount, loop.symbol_bp, loop.symbol_hl,
+                                                self.is_real, self.store, priority, loop.state_id, config)
+        else:
+            success, logs = execute_dual_trade(self.execution, direction, amount, loop.symbol_bp, loop.symbol_hl,
+                                               self.is_real, self.store, priority, loop.state_id)
+        return success, logs, started
+
+    async def _execute(self, at_ts, state_id, action):
+        loop = self.loops[state_id]
+        state = self.store.get_state(state_id)
+        if action == "OPEN":
+            direction, amount, priority = loop.direction, loop.amount, Priority.OPEN
+        else:
+            direction, amount, priority = close_direction(state['direction']), state['amount'] or loop.amount, Priority.CLOSE
+        try:
+            success, logs, started = await asyncio.get_running_loop().run_in_executor(
+                self.pool, self._trade, at_ts, loop, direction, amount, priority)
+        except Exception as e:
+            success, logs, started = False, [f"Error: {e}"], time.time()
+        for l in logs:
+            self.log(state_id, l)
+
+        if not success:
+            self.failures += 1
+            self.log(state_id, f"⚠️ {action} 失败，{loop.retry_seconds:g} 秒后重试")
+            self.schedule(time.time() + loop.retry_seconds, state_id, action)
+        elif action == "OPEN":
+            self.opens += 1
+            self.store.update_state("HOLDING", direction, amount=amount, open_time=format_open_time(started),
+                                    state_id=state_id)
+            self.schedule(started + loop.hold_seconds, state_id, "CLOSE")
+        else:
+            self.closes += 1
+            self.store.update_state("EMPTY", "NONE", state_id=state_id)
+            self.schedule(time.time() + loop.pause_seconds, state_id, "OPEN")
+
+    def _fire(self, at_ts, state_id, action):
+        task = asyncio.get_running_loop().create_task(self._execute(at_ts, state_id, action))
+        self._inflight.add(task)
+        task.add_done_callback(self._inflight.discard)
+
+    async def run(self):
+        self.restore()
+        try:
+            while not self._stop.is_set():
+                delay = None
+                if self._heap:
+                    delay = self._heap[0][0] - time.time()
+                    if delay <= 0:
+                        at_ts, _, state_id, action = heapq.heappop(self._heap)
+                        self._fire(at_ts, state_id, action)
+                        continue
+                # 睡到堆顶的截止时间；新安排的事件或 stop() 会提前叫醒
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            # 不主动平仓：持仓状态已落盘，下次启动按原计划平仓
+            if self._inflight:
+                await asyncio.gather(*self._inflight, return_exceptions=True)
+            self.pool.shutdown(wait=True)
+
+    # --- 统计 ---
+    def summary(self):
+        samples = sorted(self.lateness_ms)
+        holding = sum(self.store.get_state(i)['status'] == "HOLDING" for i in self.loops)
+        result = {
+            'instances': len(self.loops),
+            'holding': holding,
+            'opens': self.opens,
+            'closes': self.closes,
+            'failures': self.failures,
+        }
+        if samples:
+            result.update({
+                'lateness_p50_ms': samples[len(samples) // 2],
+                'lateness_p99_ms': samples[min(len(samples) - 1, int(len(samples) * 0.99))],
+                'lateness_max_ms': samples[-1],
+            })
+        return result
+
+
+def build_loops(args):
+    defaults = LoopConfig(
+        state_id=1,
+        symbol_bp=args.symbol_bp,
+        symbol_hl=args.symbol_hl,
+        amount=args.amount,
+        direction=args.direction,
+        hold_seconds=args.hold,
+        pause_seconds=args.pause,
+        maker_venue=args.maker,
+        max_unhedged_ms=args.max_unhedged_ms,
+    )
+    if args.config:
+        with open(args.config, encoding="utf-8") as f:
+            entries = json.load(f)
+    else:
+        entries = [{} for _ in range(args.instances)]
+    loops = []
+    for i, entry in enumerate(entries):
+        fields = dict(asdict(defaults), state_id=i + 1, start_delay=i * args.stagger)
+        fields.update(entry)
+        loops.append(LoopConfig(**fields))
+    return loops
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="多实例定时双开调度器")
+    parser.add_argument("--config", default="", metavar="JSON", help="实例列表 (字段同 LoopConfig)")
+    parser.add_argument("--instances", type=int, default=1, help="没有 --config 时，按下面的参数起 N 个相同的实例")
+    parser.add_argument("--symbol-bp", default=LoopConfig.symbol_bp)
+    parser.add_argument("--symbol-hl", default=LoopConfig.symbol_hl)
+    parser.add_argument("--amount", type=float, default=LoopConfig.amount)
+    parser.add_argument("--direction", default=LoopConfig.direction, choices=[LONG_BP_SHORT_HL, SHORT_BP_LONG_HL])
+    parser.add_argument("--hold", type=float, default=LoopConfig.hold_seconds, help="持仓时长 (秒)")
+    parser.add_argument("--pause", type=float, default=LoopConfig.pause_seconds, help="平仓后隔多久开下一轮 (秒)")
+    parser.add_argument("--maker", default=None, choices=["bp", "hl"], help="在这边挂单、另一边吃单对冲")
+    parser.add_argument("--max-unhedged-ms", type=float, default=LoopConfig.max_unhedged_ms,
+                        help="挂单模式下裸敞口的上限 (ms)")
+    parser.add_argument("--stagger", type=float, default=0.0, help="各实例首次开仓依次错开的秒数")
+    parser.add_argument("--max-concurrent", type=int, default=8, help="最多同时执行几笔双边交易")
+    parser.add_argument("--duration", type=float, default=0.0, help="运行多少秒后退出 (0 表示一直运行)")
+    parser.add_argument("--db", default="bot_state_timeloop.db")
+    parser.add_argument("--real", action="store_true", help="实盘模式 (消耗真实资金)")
+    parser.add_argument("--mock", action="store_true", help="连本地模拟交易所")
+    parser.add_argument("--mock-latency", default="fixed:0", help="如 lognormal:30:0.5")
+    parser.add_argument("--mock-faults", default="", help="如 rate_limit=0.02,timeout=0.01")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="[%(asctime)s] %(message)s", datefmt="%H:%M:%S")
+    loops = build_loops(args)
+    if args.mock:
+        from .mockexchange import mock_exchanges
+        exchanges = mock_exchanges(latency=args.mock_latency, faults=args.mock_faults)
+    else:
+        from .exchanges import init_exchanges
+        exchanges = init_exchanges()
+    is_real = args.real or args.mock   # 模拟交易所上照常真实下单
+
+    async def _main():
+        store = StateStore(args.db)
+        execution = ExecutionService(exchanges, workers_per_exchange=max(2, args.max_concurrent),
+                                     tracker=OrderTracker.from_exchanges(exchanges).start()).start_keepalive(30)
+        scheduler = TimeLoopScheduler(execution, store, loops, is_real, args.max_concurrent)
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, scheduler.stop)
+            except NotImplementedError:  # Windows
+                pass
+        if args.duration:
+            loop.call_later(args.duration, scheduler.stop)
+        mode = "🧪 模拟交易所" if args.mock else ("⚡ 实盘" if is_real else "🛡️ 模拟")
+        logger.info(f"⏳ 定时调度器启动 ({mode})：{len(loops)} 个实例")
+        started = time.process_time()
+        try:
+            await scheduler.run()
+        finally:
+            execution.shutdown()   # 连同私有推送一起停掉
+            store.close()
+        stats = scheduler.summary()
+        print(f"⏳ {stats['instances']} 个实例 | 开仓 {stats['opens']} | 平仓 {stats['closes']} | "
+              f"失败 {stats['failures']} | 持仓中 {stats['holding']} | CPU {time.process_time() - started:.2f}s")
+        if 'lateness_p50_ms' in stats:
+            print(f"🎯 发单相对计划时刻: p50 {stats['lateness_p50_ms']:.2f}ms | "
+                  f"p99 {stats['lateness_p99_ms']:.2f}ms | max {stats['lateness_max_ms']:.2f}ms")
+        maker = execution.maker.summary()
+        if maker['count']:
+            print(f"🪤 挂单+对冲 {maker['count']} 笔 | 完成 {maker['complete']} | 中止 {maker['aborted']}")
+            print(execution.maker.format_histograms())
+
+    asyncio.run(_main())
+
+
+if __name__ == "__main__":
+    main()
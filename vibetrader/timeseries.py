@@ -0,0 +1,121 @@
+"""
+定长时间序列缓冲区 + 画图降采样
+
+7_web_ui.py 用 list 存价差，超过 50 个点就 pop(0) (O(n))，每次刷新把整个 list 交给 st.line_chart。
+想看一整天的 100ms 行情 (86 万个点) 这样就完全不行了。
+
+RingBuffer 用预分配的 NumPy 数组做环形缓冲区，每个点在 i 和 i + capacity 各写一份 (镜像)，
+所以 “最近 n 个点” 永远是一段连续内存，直接返回视图，不用拼接拷贝；append 是 O(1)。
+
+画图时再按像素宽度降采样：
+- lttb()：Largest-Triangle-Three-Buckets，保留视觉形状，适合折线图；
+- minmax()：每个桶保留最小和最大值，尖刺一个都不会丢，全向量化最快。
+
+    buf = RingBuffer(864_000)             # 一天的 100ms tick
+    buf.append(time.time() * 1000, diff)
+    x, y = buf.downsample(800)            # 交给 st.line_chart
+"""
+import numpy as np
+
+
+class RingBuffer:
+    def __init__(self, capacity, dtype=np.float64):
+        self.capacity = int(capacity)
+        self._ts = np.zeros(2 * self.capacity, dtype=np.float64)
+        self._values = np.zeros(2 * self.capacity, dtype=dtype)
+        self._head = 0       # 下一个写入位置 (0..capacity-1)
+        self._size = 0
+        self.total = 0       # 累计写入的点数 (包括已经被覆盖的)
+
+    def __len__(self):
+        return self._size
+
+    def append(self, ts, value):
+        i = self._head
+        self._ts[i] = self._ts[i + self.capacity] = ts
+        self._values[i] = self._values[i + self.capacity] = value
+        self._head = (i + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+        self.total += 1
+
+    def extend(self, ts, values):
+        for t, v in zip(ts, values):
+            self.append(t, v)
+
+    def last(self, n=None):
+        """最近 n 个点 (ts, values)，按时间从旧到新，是只读视图"""
+        n = self._size if n is None else min(int(n), self._size)
+        end = self._head + self.capacity
+        ts, values = self._ts[end - n:end], self._values[end - n:end]
+        ts.flags.writeable = values.flags.writeable = False
+        return ts, values
+
+    def since(self, start_ts):
+        """start_ts 之后的点 (时间单调递增，二分查找定位)"""
+        ts, values = self.last()
+        i = int(np.searchsorted(ts, start_ts))
+        return ts[i:], values[i:]
+
+    def latest(self):
+        if not self._size:
+            return None, None
+        i = (self._head - 1) % self.capacity
+        return float(self._ts[i]), self._values[i].item()
+
+    def downsample(self, max_points=800, method="lttb", start_ts=None):
+        """按画图宽度降采样，返回 (ts, values)"""
+        ts, values = self.last() if start_ts is None else self.since(start_ts)
+        if method == "minmax":
+            return minmax(ts, values, max_points)
+        return lttb(ts, values, max_points)
+
+
+def lttb(x, y, threshold):
+    """
+    Largest-Triangle-Three-Buckets 降采样到 threshold 个点 (保留首尾)。
+    每个桶里选出和 “上一个选中点、下一个桶的平均点” 组成三角形面积最大的那个点。
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.asarray(x), np.asarray(y)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    # 中间 n-2 个点分成 threshold-2 个桶
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    # 每个桶的平均点 (给前一个桶当第三个顶点)，用前缀和一次算完
+    cx = np.concatenate(([0.0], np.cumsum(x)))
+    cy = np.concatenate(([0.0], np.cumsum(y)))
+    next_start = edges[1:]                 # 最后一个桶的 “下一个桶” 就是终点 n-1
+    next_end = np.append(edges[2:], n)
+    count = np.maximum(next_end - next_start, 1)
+    avg_x = (cx[next_end] - cx[next_start]) / count
+    avg_y = (cy[next_end] - cy[next_start]) / count
+    a = 0
+    for b in range(threshold - 2):
+        lo, hi = edges[b], edges[b + 1]
+        ax, ay = x[a], y[a]
+        area = np.abs((ax - avg_x[b]) * (y[lo:hi] - ay) - (ax - x[lo:hi]) * (avg_y[b] - ay))
+        a = lo + int(np.argmax(area))
+        selected[b + 1] = a
+    return x[selected], y[selected]
+
+
+def minmax(x, y, max_points):
+    """每个桶保留最小值和最大值两个点 (按时间顺序)，共约 max_points 个点"""
+    n = len(x)
+    buckets = max_points // 2
+    if n <= max_points or buckets < 1:
+        return np.asarray(x), np.asarray(y)
+    x = np.asarray(x)
+    y = np.asarray(y)
+    size = n // buckets
+    usable = size * buckets
+    block = y[n - usable:].reshape(buckets, size)   # 丢掉最旧的不足一桶的零头
+    offset = n - usable + np.arange(buckets) * size
+    lo = offset + np.argmin(block, axis=1)
+    hi = offset + np.argmax(block, axis=1)
+    idx = np.sort(np.concatenate((lo, hi)))
+    return x[idx], y[idx]
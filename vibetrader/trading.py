@@ -0,0 +1,114 @@
+"""并发双边下单，包含‘单边成交’的回滚保护"""
+import time
+
+from .priority import Priority
+from .strategy import split_direction
+
+VENUE_NAMES = {'bp': 'Backpack', 'hl': 'Hyperliquid'}
+
+
+def needs_reference_price(exchange):
+    """Hyperliquid 没有真正的市价单：ccxt 要拿参考价加滑点换算成 IOC 限价单，没给价格就不能下"""
+    return exchange.id == 'hyperliquid'
+
+
+def place_order_safe(exchange, symbol, side, amount, is_real, price=None, max_slippage=None, client_order_id=None):
+    """
+    单个下单函数的安全封装
+    price / max_slippage: Hyperliquid 市价单的参考价和最大滑点 (0.005 = 0.5%)，其他交易所忽略
+    client_order_id: 客户端订单号 (ordertracker.new_client_order_id)，用来对上私有推送
+    """
+    if not is_real:
+        return {"id": f"sim_{int(time.time()*1000)}", "status": "closed"}
+    params = {} if client_order_id is None else {'clientOrderId': client_order_id}
+    if price is not None and needs_reference_price(exchange):
+        if max_slippage is not None:
+            params['slippage'] = max_slippage
+        return exchange.create_order(symbol, 'market', side, amount, price, params)
+    return exchange.create_order(symbol, 'market', side, amount, None, params)
+
+
+def format_leg_timings(leg_bp, leg_hl):
+    """两腿的发单时差和各自从发出到回报的耗时；某一腿多发了请求时单独提示"""
+    gap_us = abs(leg_bp.send_ns - leg_hl.send_ns) / 1e3
+    text = (f"⏱️ 发单时差 {gap_us:.0f}µs | BP 回报 {leg_bp.network_ms:.1f}ms"
+            f" | HL 回报 {leg_hl.network_ms:.1f}ms")
+    if leg_bp.sign_ms or leg_hl.sign_ms:
+        text += f" | 签名 BP {leg_bp.sign_ms:.2f}ms / HL {leg_hl.sign_ms:.2f}ms"
+    extra = [f"{leg.venue.upper()} {leg.requests} 次" for leg in (leg_bp, leg_hl) if leg.requests > 1]
+    if extra:
+        text += f" | ⚠️ 下单路径上多了请求: {', '.join(extra)}"
+    return text
+
+
+def fill_price(order):
+    """订单回报里的成交均价 (没有就用委托价)"""
+    return order.get('average') or order.get('price') if order else None
+
+
+def _journal_rollback(store, trade_ref, result):
+    if store is None:
+        return
+    for order in result.orders:
+        store.record_fill(trade_ref, result.venue, result.symbol, result.side, order)
+
+
+def execute_dual_trade(service, direction, amount, symbol_bp, symbol_hl, is_real, store=None, priority=Priority.OPEN,
+                       state_id=1):
+    """
+    在常驻下单服务 (ExecutionService) 上并发执行双边交易，返回 (success, log_msgs)
+    direction: 'Long_BP_Short_HL' or 'Short_BP_Long_HL'
+    store: 传入 StateStore 时，把这笔交易和每一腿成交 (含回滚) 记入流水
+    priority: 开仓 Priority.OPEN，平仓 Priority.CLOSE；单边成交后的回滚总是 Priority.ROLLBACK
+    state_id: 流水记在哪个策略实例 (状态行) 名下
+    """
+    from .rollback import format_rollback   # rollback 依赖本模块，放在这里避免循环导入
+
+    side_bp, side_hl = split_direction(direction)
+
+    log_msgs = []
+    success = False
+
+    # 1. 并发下单 (两腿在各自交易所的常驻线程上对齐后同时发出)
+    leg_bp, leg_hl = service.place_pair(('bp', symbol_bp, side_bp, amount), ('hl', symbol_hl, side_hl, amount), is_real,
+                                        priority)
+    res_bp, err_bp = leg_bp.order, leg_bp.error
+    res_hl, err_hl = leg_hl.order, leg_hl.error
+    log_msgs.append(format_leg_timings(leg_bp, leg_hl))
+    trade_ref = None
+    if store is not None:
+        trade_ref = store.journal_trade(direction, [leg_bp, leg_hl], bool(res_bp and res_hl), state_id=state_id)
+
+    # 2. 结果判定与回滚逻辑 (回滚按实际成交量逐级加码，见 rollback.RollbackEngine)
+    reduce_only = priority == Priority.OPEN   # 回滚平仓腿等于把仓位开回去，不能带 reduceOnly
+    if res_bp and res_hl:
+        success = True
+        log_msgs.append(f"✅ 双边成交! BP:{res_bp['id']} | HL:{res_hl['id']}")
+        if is_real:
+            # 两腿都只成交了一部分且数量不一致：把多出来的那部分平掉
+            result = service.rollbacks.rebalance(leg_bp, leg_hl, reduce_only)
+            if result is not None:
+                log_msgs.append(f"⚖️ 两腿成交量不一致，平掉 {VENUE_NAMES[result.venue]} 多出的 {result.target:g}")
+                log_msgs.append(format_rollback(result, VENUE_NAMES[result.venue]))
+                _journal_rollback(store, trade_ref, result)
+
+    elif err_bp and err_hl:
+        log_msgs.append(f"❌ 双边失败 (资金安全)。BP Err: {err_bp} | HL Err: {err_hl}")
+
+    else:
+        # 单边成交 -> 立即平掉已成交的那一边 (只平实际成交的量)
+        log_msgs.append("🚨 严重警告：发生单边成交！正在执行回滚...")
+        filled_leg, failed_leg = (leg_bp, leg_hl) if res_bp else (leg_hl, leg_bp)
+        name = VENUE_NAMES[filled_leg.venue]
+        log_msgs.append(f"原因是: {failed_leg.venue.upper()}下单失败 ({failed_leg.error})")
+        if is_real:
+            try:
+                result = service.rollbacks.flatten_leg(filled_leg, reduce_only)
+                log_msgs.append(format_rollback(result, name))
+                _journal_rollback(store, trade_ref, result)
+            except Exception as e:
+                log_msgs.append(f"💀 致命错误：回滚 {name} 失败！请手动操作！{e}")
+        else:
+            log_msgs.append(f"✅ 回滚成功：{name} 仓位已平掉。")
+
+    return success, log_msgs